@@ -1,48 +1,119 @@
+import asyncio
+import contextvars
 import json
+import os
 import re
-from functions.calendar_functions import check_calendar_availability, schedule_meeting
-from functions.email_functions import send_email
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from call_protocol import json_protocol_instructions, parse_json_response
+# Importing the function modules registers their tools
+import functions.calendar_functions
+import functions.email_functions
+from functions.metrics import collect, merge_timings, metrics
+from functions.registry import TOOLS, describe_tools
 
 # Dictionary mapping function names to actual functions
-FUNCTION_MAP = {
-    "check_calendar_availability": check_calendar_availability,
-    "schedule_meeting": schedule_meeting,
-    "send_email": send_email
-}
+FUNCTION_MAP = {name: tool.function for name, tool in TOOLS.items()}
+
+# A legacy function call line; the parameter list may be empty, so tools
+# whose parameters all have defaults can be called without any
+FUNCTION_CALL_PATTERN = re.compile(r"FUNCTION_CALL:\s*(\w+)\|(.*?)(?=\n|$)")
+
+class PromptBuffer:
+    """
+    A prompt kept as a list of immutable string segments.
+
+    Each iteration appends its function result instead of copying the whole
+    prompt into a new string, and segments such as the system prompt are
+    shared by reference. The segments are joined once, when the prompt is
+    sent. A step's prompt can be recorded as just its segment count, since
+    every step's prompt is a prefix of the next one's.
+    """
+
+    def __init__(self, *segments):
+        self.segments = list(segments)
+
+    def __len__(self):
+        return len(self.segments)
+
+    def append(self, *segments):
+        """Add segments to the end of the prompt."""
+        self.segments.extend(segments)
+
+    def render(self):
+        """Join the segments into the prompt text."""
+        return "".join(self.segments)
+
+# How the LLM is asked to call functions:
+#   "legacy"  - FUNCTION_CALL: name|param1,param2 lines only (default)
+#   "json"    - a JSON object listing the calls, parsed with one json.loads;
+#               FUNCTION_CALL lines are still understood as a fallback
+CALL_PROTOCOL = os.environ.get("AGENT_CALL_PROTOCOL", "legacy").lower()
 
 class AssistantAgent:
-    def __init__(self, verbose=False):
+    def __init__(self, verbose=False, protocol=None):
         self.max_iterations = 4  # Increased to 4 to allow for more complex tasks
         self.verbose = verbose
-        self.system_prompt = """You are an assistant that helps users perform tasks by calling functions.
+        self.max_parallel_calls = 4
+        # Shared by the request threads using this agent; it starts its threads lazily
+        self._executor = ThreadPoolExecutor(max_workers=self.max_parallel_calls, thread_name_prefix="agent-call")
+        self.protocol = protocol or CALL_PROTOCOL
+        self.function_schemas = [tool.schema for tool in TOOLS.values()]
+        
+        if self.protocol == "json":
+            call_instructions = """- Respond in the JSON format described below, never with FUNCTION_CALL lines
+- After seeing function results, you can call another function if needed or provide a final answer."""
+            format_section = "\n" + json_protocol_instructions(self.function_schemas) + "\n"
+        else:
+            call_instructions = """- When you need to call a function, format your response EXACTLY as: FUNCTION_CALL: function_name|param1,param2,...
+- You can put several FUNCTION_CALL lines in one response when the calls don't depend on each other's results (e.g. send_email and an unrelated availability check). They run in parallel and you get all of their results together
+- After seeing function results, you can call another function if needed or provide a final answer.
+- Your final answer should be prefixed with: FINAL_ANSWER:"""
+            format_section = ""
+        
+        self.system_prompt = f"""You are an assistant that helps users perform tasks by calling functions.
 
 Analyze the user query and decide which Python function(s) to call. You'll see results and can make multiple function calls in sequence.
 
 Available functions:
-1. check_calendar_availability(time_str): Checks if a time slot is available on the calendar. Returns availability status and details.
-2. schedule_meeting(person, time_str, title=None): Schedules a meeting with a person at a specific time. Returns success status and meeting details.
-3. send_email(recipient, subject, body=None): Sends an email to a recipient with the given subject and body. Returns success status.
+{describe_tools(self.protocol)}
 
 IMPORTANT INSTRUCTIONS:
 - DO NOT use functions that aren't in this list.
-- When you need to call a function, format your response EXACTLY as: FUNCTION_CALL: function_name|param1,param2,...
-- After seeing function results, you can call another function if needed or provide a final answer.
-- Your final answer should be prefixed with: FINAL_ANSWER:
+{call_instructions}
 - For calendar functions, time strings can include "today", "tomorrow", or times like "3 PM", "15:00"
 - When scheduling meetings, check availability first before attempting to schedule
+- When the user asks about several candidate times, check them all with one check_calendar_availability_batch call
+- To find when the user is free (e.g. "the first free hour tomorrow afternoon"), call find_free_slots once instead of checking hours one at a time
 - Functions use a JSON database to store calendar and email data persistently
 
 Task flow examples:
 1. Checking availability: check_calendar_availability → final answer
 2. Scheduling meeting: check_calendar_availability → schedule_meeting → send_email → final answer
-
+3. Finding a free time: find_free_slots → final answer
+4. Independent tasks ("am I free at 3 PM, and email Sarah the report"): check_calendar_availability and send_email in one response → final answer
+{format_section}
 Now, analyze the user query and respond with the appropriate function call or final answer.
 """
 
+    def _parse_response(self, llm_response):
+        """
+        Return the function calls in an LLM response and, for a JSON final
+        answer, the answer text.
+        
+        With the JSON protocol the response is parsed with one json.loads;
+        anything that isn't valid JSON falls back to the FUNCTION_CALL format.
+        """
+        if self.protocol == "json":
+            parsed = parse_json_response(llm_response)
+            if parsed is not None:
+                return parsed.calls, parsed.final_answer
+        return self._extract_function_calls(llm_response), None
+
     def _extract_function_call(self, llm_response):
         """Extract a function call from the LLM response."""
         # Look for the exact function call format
-        func_call_match = re.search(r"FUNCTION_CALL:\s*(\w+)\|(.+?)(?=\n|$)", llm_response)
+        func_call_match = FUNCTION_CALL_PATTERN.search(llm_response)
         
         if func_call_match:
             function_name = func_call_match.group(1).strip()
@@ -64,8 +135,105 @@ Now, analyze the user query and respond with the appropriate function call or fi
         
         return None
 
+    def _extract_function_calls(self, llm_response):
+        """Extract every FUNCTION_CALL line from the LLM response, in order."""
+        function_calls = [
+            f"FUNCTION_CALL: {match.group(1).strip()}|{match.group(2).strip()}"
+            for match in FUNCTION_CALL_PATTERN.finditer(llm_response)
+        ]
+        if function_calls:
+            return function_calls
+        
+        # Fall back to the lenient single-call extraction
+        function_call = self._extract_function_call(llm_response)
+        return [function_call] if function_call else []
+
+    def _execute_function_calls(self, function_calls, timings=None):
+        """
+        Execute function calls and return their results in order.
+        
+        Time spent running them, and in storage I/O, is added to `timings`,
+        the step's timings.
+        """
+        with metrics.span("agent_stage_seconds", "functions", timings, stage="functions"):
+            if len(function_calls) == 1:
+                with collect(timings):
+                    return [self._execute_function_call(function_calls[0])]
+            return self._execute_in_lanes(function_calls, timings)
+
+    def _execute_in_lanes(self, function_calls, timings):
+        """
+        Execute several function calls and return their results in order.
+        
+        Calls are grouped into lanes by the resource their tool uses (the
+        calendar or the email log). Each lane runs its calls in order, and the
+        lanes run concurrently on a thread pool.
+        """
+        # Group call indexes by resource; unknown functions get a lane of their own
+        lanes = {}
+        for index, function_call in enumerate(function_calls):
+            if isinstance(function_call, dict):
+                function_name = function_call["name"]
+            else:
+                function_name = function_call.split(":", 1)[-1].split("|", 1)[0].strip()
+            resource = TOOLS[function_name].resource if function_name in TOOLS else function_name
+            lanes.setdefault(resource, []).append(index)
+        
+        results = [None] * len(function_calls)
+        
+        def run_lane(indexes, lane_timings):
+            with collect(lane_timings):
+                for index in indexes:
+                    results[index] = self._execute_function_call(function_calls[index])
+            return lane_timings
+        
+        if len(lanes) == 1:
+            run_lane(next(iter(lanes.values())), timings)
+        else:
+            # Run each lane in a copy of this context so it sees the same user's
+            # data, with timings of its own so the lanes don't write to one dict
+            futures = [self._executor.submit(contextvars.copy_context().run, run_lane, indexes, metrics.new_timings())
+                       for indexes in lanes.values()]
+            for future in as_completed(futures):
+                merge_timings(timings, future.result())
+        return results
+
+    def _run_tool(self, tool, params, kwargs):
+        """Call a tool's function, recording how long it took and whether it failed."""
+        with metrics.span("agent_function_seconds", function=tool.name):
+            result = tool.function(*params, **kwargs)
+        if metrics.enabled:
+            failed = isinstance(result, dict) and (bool(result.get("error")) or result.get("success") is False)
+            metrics.inc("agent_function_calls_total", function=tool.name, status="error" if failed else "ok")
+        return result
+
+    def _execute_structured_call(self, function_call):
+        """Execute a JSON function call, {"name": ..., "arguments": {...}}, and return the result."""
+        try:
+            function_name = function_call["name"]
+            
+            # Check if function exists
+            tool = TOOLS.get(function_name)
+            if tool is None:
+                return {"error": f"Function '{function_name}' not found"}
+            
+            kwargs = tool.coerce_arguments(function_call["arguments"])
+            result = self._run_tool(tool, [], kwargs)
+            
+            return {
+                "function": function_name,
+                "params": [],
+                "kwargs": kwargs,
+                "result": result
+            }
+        except Exception as e:
+            return {"error": str(e)}
+
     def _execute_function_call(self, function_call):
-        """Execute a function call string and return the result."""
+        """Execute a function call string, or a JSON call dict, and return the result."""
+        if isinstance(function_call, dict):
+            return self._execute_structured_call(function_call)
+        
         try:
             # Parse the function call
             parts = function_call.split(":", 1)
@@ -82,54 +250,15 @@ Now, analyze the user query and respond with the appropriate function call or fi
             params_str = function_parts[1].strip()
             
             # Check if function exists
-            if function_name not in FUNCTION_MAP:
+            tool = TOOLS.get(function_name)
+            if tool is None:
                 return {"error": f"Function '{function_name}' not found"}
             
-            # Parse parameters
-            params = []
-            kwargs = {}
-            
-            # Special handling for send_email function to handle commas in body
-            if function_name == "send_email":
-                email_parts = params_str.split(",", 2)  # Split only on first two commas
-                if len(email_parts) >= 1:
-                    params.append(email_parts[0].strip())  # recipient
-                if len(email_parts) >= 2:
-                    params.append(email_parts[1].strip())  # subject
-                if len(email_parts) >= 3:
-                    kwargs["body"] = email_parts[2].strip()  # body as kwarg
-            else:
-                # Regular parameter parsing for other functions
-                if params_str:
-                    # Handle both positional and keyword arguments
-                    # For simplicity, assuming comma-separated values
-                    for param in params_str.split(","):
-                        param = param.strip()
-                        if "=" in param:
-                            # Keyword argument
-                            key, value = param.split("=", 1)
-                            # Try to convert to appropriate type
-                            try:
-                                if value.lower() == "true":
-                                    value = True
-                                elif value.lower() == "false":
-                                    value = False
-                                elif value.lower() == "none":
-                                    value = None
-                                elif value.isdigit():
-                                    value = int(value)
-                                elif value.replace(".", "", 1).isdigit():
-                                    value = float(value)
-                            except:
-                                pass
-                            kwargs[key.strip()] = value
-                        else:
-                            # Positional argument
-                            params.append(param)
+            # Parse the parameters with the tool's precompiled splitter and coercers
+            params, kwargs = tool.parse_params(params_str)
             
             # Execute the function
-            function = FUNCTION_MAP[function_name]
-            result = function(*params, **kwargs)
+            result = self._run_tool(tool, params, kwargs)
             
             return {
                 "function": function_name,
@@ -140,7 +269,124 @@ Now, analyze the user query and respond with the appropriate function call or fi
         except Exception as e:
             return {"error": str(e)}
 
-    def process_query(self, query, llm_client, show_iterations=False):
+    def _initial_prompt(self, query):
+        """Start the prompt buffer for a run."""
+        return PromptBuffer(self.system_prompt, "\n\nUser query: ", query)
+
+    def _followup_prompt(self, prompt, last_result):
+        """Add a function result, or a list of results, and the follow-up question to the prompt."""
+        result_str = json.dumps(last_result, indent=2)
+        prompt.append(
+            "\n\nResults of function calls, in order: " if isinstance(last_result, list) else "\n\nResult of function call: ",
+            result_str,
+            "\n\nWhat would you like to do next? Call another function or provide a final answer:"
+        )
+
+    def _record_function_calls(self, step, function_calls, results):
+        """
+        Record a step's function calls and return what to feed back to the LLM.
+        
+        The first call is always kept as "function_call"/"function_result";
+        when there are several, all of them are also kept as lists.
+        """
+        step["function_call"] = function_calls[0]
+        step["function_result"] = results[0]
+        if len(function_calls) == 1:
+            return results[0]
+        step["function_calls"] = function_calls
+        step["function_results"] = results
+        return results
+
+    def _summary_prompt(self, prompt):
+        """Add the request for a summary after the iteration limit."""
+        prompt.append("\n\nYou've reached the maximum number of iterations. Please provide a final summary:")
+
+    def _record_step(self, conversation_history, iteration, prompt, prompt_text, llm_response, include_prompts, timings=None):
+        """
+        Append a step to the history, with its prompt text or only its segment count.
+        
+        `timings` (milliseconds per stage) is kept as the step's "timings_ms";
+        later stages of the step keep adding to it.
+        """
+        step = {"iteration": iteration}
+        if include_prompts:
+            # The same string object that was sent, not another copy
+            step["prompt"] = prompt_text
+        else:
+            step["prompt_segments"] = len(prompt)
+        step["llm_response"] = llm_response
+        if timings is not None:
+            step["timings_ms"] = timings
+        conversation_history.append(step)
+        return step
+
+    def _show_function_result(self, result):
+        """Print a function call and its result in a clean format."""
+        function_name = result.get("function", "unknown")
+        params_display = ", ".join([f"'{p}'" for p in result.get("params", [])])
+        kwargs_display = ", ".join([f"{k}='{v}'" for k, v in result.get("kwargs", {}).items()])
+        all_params = ", ".join(filter(None, [params_display, kwargs_display]))
+        
+        print(f"  Function Call: {function_name}({all_params})")
+        
+        # Display simplified result for better readability
+        if "result" in result and isinstance(result["result"], dict):
+            print("  Result:")
+            for key, value in result["result"].items():
+                print(f"    {key}: {value}")
+        else:
+            print(f"  Result: {result}")
+
+    def _finish_step(self, step, llm_response, show_iterations, answer=None):
+        """
+        Mark a step that carries no function call as the final answer.
+        
+        `answer` is the answer text of a JSON final answer, kept with the step.
+        """
+        step["final_answer"] = True
+        if answer is not None:
+            step["answer"] = answer
+        
+        if show_iterations:
+            print("\n=== Agent Execution Complete ===")
+            if answer is not None:
+                print(f"Final Answer: {answer}")
+            elif "FINAL_ANSWER:" in llm_response:
+                final_answer = llm_response.replace("FINAL_ANSWER:", "").strip()
+                print(f"Final Answer: {final_answer}")
+            else:
+                # Treat it as a final answer if the LLM didn't generate a function call
+                print(f"Response: {llm_response}")
+            print("=" * 50)
+
+    def _keep_summary_answer(self, step, final_response):
+        """Keep the answer text of a summary given as a JSON final answer."""
+        if self.protocol == "json":
+            parsed = parse_json_response(final_response)
+            if parsed is not None and parsed.final_answer is not None:
+                step["answer"] = parsed.final_answer
+
+    def _build_result(self, query, conversation_history, prompt=None, include_prompts=True):
+        """Assemble the value returned by process_query."""
+        # Extract just the final answer for the response
+        final_step = next((step for step in reversed(conversation_history) if step.get("final_answer")), None)
+        final_answer = final_step.get("answer", final_step["llm_response"]) if final_step else "No final answer was generated."
+        
+        # Format the final answer by removing the FINAL_ANSWER: prefix if present
+        if "FINAL_ANSWER:" in final_answer:
+            final_answer = final_answer.replace("FINAL_ANSWER:", "").strip()
+        
+        result = {
+            "query": query,
+            "conversation_history": conversation_history,
+            "final_answer": final_answer
+        }
+        if not include_prompts and prompt is not None:
+            # Shared once; each step's prompt is "".join(prompt_segments[:step["prompt_segments"]])
+            result["prompt_segments"] = prompt.segments
+        return result
+
+    def process_query(self, query, llm_client, show_iterations=False, include_prompts=True):
         """
         Process a user query using an iterative approach with an LLM.
         
@@ -148,13 +394,85 @@ Now, analyze the user query and respond with the appropriate function call or fi
             query (str): The user's query
             llm_client: A client that can call an LLM API
             show_iterations (bool): Whether to print each iteration
+            include_prompts (bool): Whether each history step keeps its full
+                prompt text. When False, steps only record their segment count
+                and the result carries the shared "prompt_segments" list once.
             
         Returns:
             dict: The final result with full conversation history
         """
+        for event in self.stream_query(query, llm_client, show_iterations, include_prompts):
+            if event["event"] == "final_answer":
+                return event["result"]
+
+    def stream_query(self, query, llm_client, show_iterations=False, include_prompts=True):
+        """
+        Process a user query like process_query, yielding events as it runs.
+        
+        Each event is a dict whose "event" key is one of:
+            llm_response: the LLM replied ("iteration", "llm_response")
+            function_call: a function is about to run ("iteration", "function_call"),
+                one event per call when a response makes several
+            function_result: it finished ("iteration", "function_result"),
+                after all of the response's calls have run
+            final_answer: the run is over ("iteration", "final_answer", and
+                "result", the dict process_query returns)
+        """
+        steps = self._steps(query, show_iterations, include_prompts)
+        reply = None
+        while True:
+            try:
+                kind, payload, timings = steps.send(reply)
+            except StopIteration:
+                return
+            if kind == "event":
+                reply = None
+                yield payload
+            elif kind == "llm":
+                reply = self._call_llm(llm_client, payload, timings)
+            else:
+                reply = self._execute_function_calls(payload, timings)
+
+    async def aprocess_query(self, query, llm_client, show_iterations=False, include_prompts=True):
+        """
+        Async version of process_query, taking the same arguments.
+        
+        LLM calls use the client's generate_content_async when it has one and
+        otherwise run in a worker thread. Tool functions always run in a
+        worker thread, so the event loop is never blocked by file I/O.
+        
+        Returns:
+            dict: The final result with full conversation history
+        """
+        steps = self._steps(query, show_iterations, include_prompts)
+        reply = None
+        while True:
+            try:
+                kind, payload, timings = steps.send(reply)
+            except StopIteration as stop:
+                return stop.value
+            if kind == "event":
+                reply = None
+            elif kind == "llm":
+                reply = await self._acall_llm(llm_client, payload, timings)
+            else:
+                reply = await asyncio.to_thread(self._execute_function_calls, payload, timings)
+
+    def _steps(self, query, show_iterations, include_prompts):
+        """
+        Run the agent loop without doing any I/O itself; returns the result dict.
+        
+        The sync, streaming and async paths all drive this generator. It
+        yields (kind, payload, timings) tuples:
+            ("llm", prompt_text, timings): send back the LLM's response
+            ("functions", function_calls, timings): send back their results
+            ("event", event, None): a stream_query event; send back None
+        """
         iteration = 0
         last_result = None
         conversation_history = []
+        prompt = None
+        started = time.perf_counter_ns()
         
         if show_iterations:
             print("\n=== Agent Execution Started ===")
@@ -165,120 +483,123 @@ Now, analyze the user query and respond with the appropriate function call or fi
             if show_iterations:
                 print(f"\n--- Iteration {iteration + 1} ---")
                 
+            timings = metrics.new_timings()
+            
             # Prepare the prompt for the LLM
-            if last_result is None:
-                current_prompt = f"{self.system_prompt}\n\nUser query: {query}"
-            else:
-                # Include the result of the previous function call
-                result_str = json.dumps(last_result, indent=2)
-                current_prompt = f"{current_prompt}\n\nResult of function call: {result_str}"
-                current_prompt += "\n\nWhat would you like to do next? Call another function or provide a final answer:"
+            with metrics.span("agent_stage_seconds", "prompt_build", timings, stage="prompt_build"):
+                if last_result is None:
+                    prompt = self._initial_prompt(query)
+                else:
+                    # Include the result of the previous function call
+                    self._followup_prompt(prompt, last_result)
+                prompt_text = prompt.render()
             
             # Call the LLM - Only log to console in verbose mode, never to chat
-            llm_response = self._call_llm(llm_client, current_prompt)
+            llm_response = yield "llm", prompt_text, timings
             
             if show_iterations:
                 print(f"LLM Response: {llm_response}")
             
             # Record this step in conversation history
-            conversation_history.append({
-                "iteration": iteration + 1,
-                "prompt": current_prompt,
-                "llm_response": llm_response
-            })
+            self._record_step(conversation_history, iteration + 1, prompt, prompt_text, llm_response, include_prompts, timings)
+            yield "event", {"event": "llm_response", "iteration": iteration + 1, "llm_response": llm_response}, None
             
-            # Check if it's a function call or try to extract one
-            function_call = None
-            if "FUNCTION_CALL:" in llm_response:
-                # Use regex to extract the exact function call format
-                function_call = self._extract_function_call(llm_response)
-            else:
-                # Try to extract a function call from free text
-                function_call = self._extract_function_call(llm_response)
+            # Check for function calls, in JSON or extracted from free text
+            with metrics.span("agent_stage_seconds", "parse", timings, stage="parse"):
+                function_calls, answer = self._parse_response(llm_response)
             
-            if function_call:
-                # Execute the function call
-                result = self._execute_function_call(function_call)
-                last_result = result
+            if function_calls:
+                for function_call in function_calls:
+                    yield "event", {"event": "function_call", "iteration": iteration + 1, "function_call": function_call}, None
                 
-                if show_iterations:
-                    # Display the function call in a clean format
-                    function_name = result.get("function", "unknown")
-                    params_display = ", ".join([f"'{p}'" for p in result.get("params", [])])
-                    kwargs_display = ", ".join([f"{k}='{v}'" for k, v in result.get("kwargs", {}).items()])
-                    all_params = ", ".join(filter(None, [params_display, kwargs_display]))
-                    
-                    print(f"  Function Call: {function_name}({all_params})")
-                    
-                    # Display simplified result for better readability
-                    if "result" in result and isinstance(result["result"], dict):
-                        print("  Result:")
-                        for key, value in result["result"].items():
-                            print(f"    {key}: {value}")
-                    else:
-                        print(f"  Result: {result}")
-                
-                # Record the function call result
-                conversation_history[-1]["function_call"] = function_call
-                conversation_history[-1]["function_result"] = result
-            elif "FINAL_ANSWER:" in llm_response:
-                # It's the final answer
-                conversation_history[-1]["final_answer"] = True
+                # Execute the function calls, independent ones in parallel
+                results = yield "functions", function_calls, timings
                 
                 if show_iterations:
-                    final_answer = llm_response.replace("FINAL_ANSWER:", "").strip()
-                    print("\n=== Agent Execution Complete ===")
-                    print(f"Final Answer: {final_answer}")
-                    print("=" * 50)
-                break
-            else:
-                # Treat it as a final answer if the LLM didn't generate a function call
-                conversation_history[-1]["final_answer"] = True
+                    for result in results:
+                        self._show_function_result(result)
                 
-                if show_iterations:
-                    print("\n=== Agent Execution Complete ===")
-                    print(f"Response: {llm_response}")
-                    print("=" * 50)
+                # Record the function call results
+                last_result = self._record_function_calls(conversation_history[-1], function_calls, results)
+                for result in results:
+                    yield "event", {"event": "function_result", "iteration": iteration + 1, "function_result": result}, None
+            else:
+                # It's the final answer
+                self._finish_step(conversation_history[-1], llm_response, show_iterations, answer)
                 break
             
             iteration += 1
         
         # Generate a final summary if we hit the iteration limit
         if iteration >= self.max_iterations and not any(step.get("final_answer") for step in conversation_history):
-            final_prompt = f"{current_prompt}\n\nYou've reached the maximum number of iterations. Please provide a final summary:"
-            final_response = self._call_llm(llm_client, final_prompt)
+            timings = metrics.new_timings()
+            with metrics.span("agent_stage_seconds", "prompt_build", timings, stage="prompt_build"):
+                self._summary_prompt(prompt)
+                prompt_text = prompt.render()
+            final_response = yield "llm", prompt_text, timings
             
             if show_iterations:
                 print("\n=== Maximum Iterations Reached ===")
                 print(f"Final Summary: {final_response}")
                 print("=" * 50)
             
-            conversation_history.append({
-                "iteration": iteration + 1,
-                "prompt": final_prompt,
-                "llm_response": final_response,
-                "final_answer": True
-            })
+            step = self._record_step(conversation_history, iteration + 1, prompt, prompt_text, final_response, include_prompts, timings)
+            step["final_answer"] = True
+            self._keep_summary_answer(step, final_response)
+            yield "event", {"event": "llm_response", "iteration": iteration + 1, "llm_response": final_response}, None
         
-        # Extract just the final answer for the response
-        final_step = next((step for step in reversed(conversation_history) if step.get("final_answer")), None)
-        final_answer = final_step["llm_response"] if final_step else "No final answer was generated."
-        
-        # Format the final answer by removing the FINAL_ANSWER: prefix if present
-        if "FINAL_ANSWER:" in final_answer:
-            final_answer = final_answer.replace("FINAL_ANSWER:", "").strip()
-        
-        return {
-            "query": query,
-            "conversation_history": conversation_history,
-            "final_answer": final_answer
-        }
+        self._record_query(started)
+        result = self._build_result(query, conversation_history, prompt, include_prompts)
+        yield "event", {
+            "event": "final_answer",
+            "iteration": conversation_history[-1]["iteration"],
+            "final_answer": result["final_answer"],
+            "result": result
+        }, None
+        return result
     
-    def _call_llm(self, llm_client, prompt):
+    def _call_llm(self, llm_client, prompt, timings=None):
         """
         Call the LLM with the given prompt.
         
         This function calls the LLM client's generate_content method.
         """
         # The LLM client should have a generate_content method
-        return llm_client.generate_content(prompt) 
\ No newline at end of file
+        with metrics.span("agent_stage_seconds", "llm_call", timings, stage="llm_call"):
+            response = llm_client.generate_content(prompt)
+        self._count_llm_call(prompt, response)
+        return response
+
+    async def _acall_llm(self, llm_client, prompt, timings=None):
+        """
+        Call the LLM with the given prompt without blocking the event loop.
+        
+        Clients without a generate_content_async method (like the scripted
+        test clients) are run in a worker thread.
+        """
+        with metrics.span("agent_stage_seconds", "llm_call", timings, stage="llm_call"):
+            if hasattr(llm_client, "generate_content_async"):
+                response = await llm_client.generate_content_async(prompt)
+            else:
+                response = await asyncio.to_thread(llm_client.generate_content, prompt)
+        self._count_llm_call(prompt, response)
+        return response
+
+    def _count_llm_call(self, prompt, response):
+        """Count an LLM call and the bytes (and estimated tokens) sent and received."""
+        if not metrics.enabled:
+            return
+        prompt_bytes = len(prompt.encode("utf-8"))
+        response_bytes = len(str(response).encode("utf-8"))
+        metrics.inc("agent_llm_calls_total")
+        metrics.inc("agent_llm_prompt_bytes_total", prompt_bytes)
+        metrics.inc("agent_llm_response_bytes_total", response_bytes)
+        # Roughly four bytes per token for English text
+        metrics.inc("agent_llm_prompt_tokens_total", prompt_bytes // 4)
+        metrics.inc("agent_llm_response_tokens_total", response_bytes // 4)
+
+    def _record_query(self, started):
+        """Record a finished query and how long it took since `started` (perf_counter_ns)."""
+        if metrics.enabled:
+            metrics.observe("agent_query_seconds", (time.perf_counter_ns() - started) / 1e9)
+            metrics.inc("agent_queries_total")
@@ -0,0 +1,122 @@
+import asyncio
+import json
+import os
+from console_agent import clean_final_answer, friendly_response, run_clean_query
+from agent import AssistantAgent
+from functions.storage import tenant_scope, validate_tenant
+from gemini_client import GeminiClient
+
+# Initialize the Gemini client from stored credentials if available
+gemini_client = GeminiClient.load_from_storage()
+print(f"Gemini API key status: {'Loaded' if gemini_client.api_key else 'Not configured'}")
+
+# Initialize the agent
+assistant_agent = AssistantAgent(verbose=False)
+
+# Let Gemini return function calls natively instead of as JSON text
+if assistant_agent.protocol == "json" and os.environ.get("GEMINI_FUNCTION_CALLING") == "1":
+    gemini_client.enable_function_calling(assistant_agent.function_schemas)
+
+# Allow requests from the Chrome extension, like flask_cors does for server.py
+CORS_HEADERS = [
+    (b"access-control-allow-origin", b"*"),
+    (b"access-control-allow-headers", b"Content-Type"),
+    (b"access-control-allow-methods", b"GET, POST, OPTIONS")
+]
+
+async def send_json(send, payload, status=200):
+    """Send a JSON response."""
+    body = json.dumps(payload).encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", b"application/json")] + CORS_HEADERS
+    })
+    await send({"type": "http.response.body", "body": body})
+
+async def read_body(receive):
+    """Read the full request body."""
+    body = b""
+    while True:
+        message = await receive()
+        body += message.get("body", b"")
+        if not message.get("more_body"):
+            return body
+
+async def process_query(query, user_id=None):
+    """Run the agent once for a query, with a user's data if given, and return the user-facing response."""
+    # Threads started with asyncio.to_thread inherit the scope
+    with tenant_scope(user_id):
+        if gemini_client.api_key:
+            # Process using the real LLM without tying up a thread for the round trips
+            result = await assistant_agent.aprocess_query(query, gemini_client, show_iterations=False, include_prompts=False)
+            response = clean_final_answer(result)
+        else:
+            response = await asyncio.to_thread(run_clean_query, query, assistant_agent)
+
+    # If the response still contains a FUNCTION_CALL, convert it to a user-friendly message
+    if "FUNCTION_CALL:" in response:
+        response = friendly_response(response)
+
+    return response
+
+async def app(scope, receive, send):
+    """
+    ASGI application serving the same /query API as server.py.
+
+    Run it with an ASGI server, e.g. `uvicorn asgi_server:app --port 8081`.
+    """
+    if scope["type"] != "http":
+        return
+
+    method = scope["method"]
+    path = scope["path"]
+
+    if method == "OPTIONS":
+        await send({"type": "http.response.start", "status": 204, "headers": CORS_HEADERS})
+        await send({"type": "http.response.body", "body": b""})
+    elif path == "/query" and method == "POST":
+        try:
+            try:
+                data = json.loads(await read_body(receive) or b"null")
+            except ValueError:
+                data = None
+            if not isinstance(data, dict) or 'query' not in data:
+                await send_json(send, {"error": "No query provided"}, 400)
+                return
+
+            query = data['query']
+            user_id = data.get('user_id')
+            try:
+                user_id = validate_tenant(str(user_id)) if user_id else None
+            except ValueError as e:
+                await send_json(send, {"error": str(e)}, 400)
+                return
+            response = await process_query(query, user_id)
+
+            await send_json(send, {
+                "query": query,
+                "response": response,
+                "using_gemini": bool(gemini_client.api_key)
+            })
+        except Exception as e:
+            await send_json(send, {"error": str(e)}, 500)
+    elif path == "/config/status" and method == "GET":
+        await send_json(send, {"gemini_configured": bool(gemini_client.api_key)})
+    elif path == "/debug" and method == "GET":
+        await send_json(send, {
+            "status": "running",
+            "message": "Assistant API is operational",
+            "gemini_configured": bool(gemini_client.api_key)
+        })
+    else:
+        await send_json(send, {"error": "Not found"}, 404)
+
+if __name__ == '__main__':
+    try:
+        import uvicorn
+    except ImportError:
+        print("uvicorn is not installed. Install it with: pip install uvicorn")
+    else:
+        print("Starting async Assistant API server...")
+        uvicorn.run(app, host='0.0.0.0', port=8081)
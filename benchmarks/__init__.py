@@ -0,0 +1,18 @@
+"""
+Offline benchmarks for the assistant.
+
+Run them from the repository root, e.g. `python -m benchmarks.agent_pipeline`.
+They never touch data/: unless ASSISTANT_DATA_DIR is already set, they run
+against a temporary data directory that is removed on exit. Importing this
+package sets that up, so it must happen before anything imports
+functions.storage.
+"""
+import atexit
+import os
+import shutil
+import tempfile
+
+if not os.environ.get("ASSISTANT_DATA_DIR"):
+    _tmp_dir = tempfile.mkdtemp(prefix="assistant-bench-")
+    os.environ["ASSISTANT_DATA_DIR"] = _tmp_dir
+    atexit.register(shutil.rmtree, _tmp_dir, ignore_errors=True)
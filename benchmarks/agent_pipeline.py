@@ -0,0 +1,216 @@
+import argparse
+import datetime
+import json
+import platform
+import statistics
+import subprocess
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from agent import AssistantAgent
+from benchmarks.seed import seed_data
+from console_agent import SimpleConsoleClient, SimulatedLatencyClient
+from debug_agent import MockLLMClient
+from functions.storage import DATA_DIR, STORAGE_BACKEND
+from simple_agent import SimpleResponseClient
+
+# Scenario name -> (client factory, query). The clients keep per-query
+# state, so every query gets a fresh one.
+SCENARIOS = {
+    "simple_meeting": (lambda: SimpleResponseClient("meeting"), "Schedule a meeting with John tomorrow at 3 PM"),
+    "simple_availability": (lambda: SimpleResponseClient("availability"), "Am I free tomorrow at 2 PM?"),
+    "simple_email": (lambda: SimpleResponseClient("email"), "Send an email to Sarah about the project"),
+    "console_availability": (SimpleConsoleClient, "Check if I'm available tomorrow at 3 PM"),
+    "console_email": (SimpleConsoleClient, "Send an email to Sarah about the project update"),
+    "debug_meeting": (MockLLMClient, "Schedule a meeting with John tomorrow at 3 PM"),
+    "debug_availability": (MockLLMClient, "Check if I'm available tomorrow at 2 PM")
+}
+
+def percentile(values, pct):
+    """Return the pct-th percentile of a list of numbers (nearest rank)."""
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+def latency_summary(seconds):
+    """Summarize a list of durations in seconds as milliseconds."""
+    return {
+        "count": len(seconds),
+        "mean_ms": round(statistics.fmean(seconds) * 1000, 3),
+        "p50_ms": round(percentile(seconds, 50) * 1000, 3),
+        "p95_ms": round(percentile(seconds, 95) * 1000, 3),
+        "p99_ms": round(percentile(seconds, 99) * 1000, 3),
+        "max_ms": round(max(seconds) * 1000, 3)
+    }
+
+def run_scenario_query(agent, scenario, llm_latency):
+    """Run one scenario query and return (seconds, result)."""
+    factory, query = SCENARIOS[scenario]
+    client = SimulatedLatencyClient(factory(), llm_latency)
+    started = time.perf_counter()
+    result = agent.process_query(query, client, show_iterations=False, include_prompts=False)
+    return time.perf_counter() - started, result
+
+def stage_totals(result):
+    """Add up a result's per-step timings_ms by stage."""
+    totals = {}
+    for step in result["conversation_history"]:
+        for stage, ms in step.get("timings_ms", {}).items():
+            totals[stage] = totals.get(stage, 0.0) + ms
+    return totals
+
+def measure_latency(agent, scenarios, queries, llm_latency):
+    """Run each scenario `queries` times in a row; return latency and stage breakdown per scenario."""
+    report = {}
+    for scenario in scenarios:
+        durations = []
+        stages = {}
+        iterations = []
+        for _ in range(queries):
+            seconds, result = run_scenario_query(agent, scenario, llm_latency)
+            durations.append(seconds)
+            iterations.append(len(result["conversation_history"]))
+            for stage, ms in stage_totals(result).items():
+                stages.setdefault(stage, []).append(ms)
+        report[scenario] = latency_summary(durations)
+        report[scenario]["iterations"] = round(statistics.fmean(iterations), 2)
+        report[scenario]["stage_mean_ms"] = {stage: round(statistics.fmean(values), 3) for stage, values in stages.items()}
+    return report
+
+def measure_throughput(agent, scenarios, queries, workers, llm_latency):
+    """Run `queries` queries per scenario from `workers` threads at once; return queries per second."""
+    jobs = [scenario for scenario in scenarios for _ in range(queries)]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        started = time.perf_counter()
+        durations = [seconds for seconds, _ in pool.map(lambda s: run_scenario_query(agent, s, llm_latency), jobs)]
+        elapsed = time.perf_counter() - started
+    report = latency_summary(durations)
+    report["workers"] = workers
+    report["seconds"] = round(elapsed, 3)
+    report["queries_per_second"] = round(len(jobs) / elapsed, 2)
+    return report
+
+def measure_allocations(agent, scenarios, queries, llm_latency):
+    """Trace memory for `queries` queries per scenario; return mean peak and retained KiB per query."""
+    report = {}
+    tracemalloc.start()
+    try:
+        for scenario in scenarios:
+            peaks = []
+            retained = []
+            for _ in range(queries):
+                before, _ = tracemalloc.get_traced_memory()
+                tracemalloc.reset_peak()
+                run_scenario_query(agent, scenario, llm_latency)
+                after, peak = tracemalloc.get_traced_memory()
+                peaks.append(peak - before)
+                retained.append(after - before)
+            report[scenario] = {
+                "peak_kib": round(statistics.fmean(peaks) / 1024, 1),
+                "retained_kib": round(statistics.fmean(retained) / 1024, 1)
+            }
+    finally:
+        tracemalloc.stop()
+    return report
+
+def git_commit():
+    """Return the current git commit, or None outside a checkout."""
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_benchmarks(sizes, scenarios, queries=20, workers=8, llm_latency_ms=0.0, alloc_queries=3):
+    """Seed each data size and run the latency, throughput and allocation measurements."""
+    agent = AssistantAgent(verbose=False)
+    llm_latency = llm_latency_ms / 1000
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "storage_backend": STORAGE_BACKEND,
+            "call_protocol": agent.protocol,
+            "queries": queries,
+            "workers": workers,
+            "llm_latency_ms": llm_latency_ms
+        },
+        "sizes": {}
+    }
+    for size in sizes:
+        print(f"Seeding {size} meetings and emails in {DATA_DIR}...")
+        started = time.perf_counter()
+        seed_data(size)
+        seed_seconds = time.perf_counter() - started
+
+        # Warm the calendar cache so the first scenario doesn't pay for the load
+        warm_seconds, _ = run_scenario_query(agent, scenarios[0], 0)
+
+        print(f"  latency ({queries} queries per scenario)...")
+        latency = measure_latency(agent, scenarios, queries, llm_latency)
+        print(f"  throughput ({workers} workers)...")
+        throughput = measure_throughput(agent, scenarios, queries, workers, llm_latency)
+        print(f"  allocations ({alloc_queries} queries per scenario)...")
+        allocations = measure_allocations(agent, scenarios, alloc_queries, llm_latency)
+
+        report["sizes"][str(size)] = {
+            "seed_seconds": round(seed_seconds, 3),
+            "first_query_ms": round(warm_seconds * 1000, 3),
+            "latency": latency,
+            "throughput": throughput,
+            "allocations": allocations
+        }
+    return report
+
+def print_report(report, baseline=None):
+    """Print a summary table, with the p50 change against a baseline report if given."""
+    for size, results in report["sizes"].items():
+        throughput = results["throughput"]
+        print(f"\n=== {size} records: {throughput['queries_per_second']} queries/s with "
+              f"{throughput['workers']} workers (p99 {throughput['p99_ms']} ms) ===")
+        print(f"{'scenario':<22} {'p50 ms':>10} {'p99 ms':>10} {'peak KiB':>10} {'vs base':>9}")
+        for scenario, latency in results["latency"].items():
+            change = ""
+            base = (baseline or {}).get("sizes", {}).get(size, {}).get("latency", {}).get(scenario)
+            if base and base["p50_ms"]:
+                change = f"{latency['p50_ms'] / base['p50_ms']:.2f}x"
+            peak = results["allocations"].get(scenario, {}).get("peak_kib", "")
+            print(f"{scenario:<22} {latency['p50_ms']:>10} {latency['p99_ms']:>10} {peak:>10} {change:>9}")
+
+def main():
+    """Parse command line arguments and run the agent pipeline benchmarks."""
+    parser = argparse.ArgumentParser(description="Benchmark the agent pipeline with the scripted mock LLM clients")
+    parser.add_argument("--sizes", default="10,10000,1000000",
+                        help="Comma-separated numbers of seeded meetings and emails")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS),
+                        help=f"Comma-separated scenarios to run (default: all of {', '.join(SCENARIOS)})")
+    parser.add_argument("--queries", "-n", type=int, default=20, help="Queries per scenario for each measurement")
+    parser.add_argument("--workers", "-w", type=int, default=8, help="Concurrent workers for the throughput run")
+    parser.add_argument("--llm-latency-ms", type=float, default=0.0, help="Simulated latency of each LLM call")
+    parser.add_argument("--alloc-queries", type=int, default=3, help="Queries per scenario traced with tracemalloc")
+    parser.add_argument("--output", "-o", help="Write the results as JSON to this file")
+    parser.add_argument("--compare", "-c", help="Earlier JSON results to compare the p50 latencies against")
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(",") if size.strip()]
+    scenarios = [scenario.strip() for scenario in args.scenarios.split(",") if scenario.strip()]
+    unknown = [scenario for scenario in scenarios if scenario not in SCENARIOS]
+    if unknown:
+        parser.error(f"Unknown scenarios: {', '.join(unknown)}")
+
+    report = run_benchmarks(sizes, scenarios, args.queries, args.workers, args.llm_latency_ms, args.alloc_queries)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+import argparse
+import datetime
+import json
+import random
+import statistics
+import sys
+import time
+from benchmarks.agent_pipeline import git_commit
+from benchmarks.seed import WORKING_HOURS, synthetic_meetings
+from functions.calendar_store import CalendarStore
+
+def probe_windows(count, days, seed=0):
+    """Return `count` one-hour windows on the hour, spread over the days around today."""
+    rng = random.Random(seed)
+    today = datetime.datetime.combine(datetime.date.today(), datetime.time())
+    windows = []
+    for _ in range(count):
+        start = today + datetime.timedelta(days=rng.randint(-days, days), hours=rng.choice(WORKING_HOURS))
+        windows.append((start, start + datetime.timedelta(hours=1)))
+    return windows
+
+def time_probes(store, windows, rounds):
+    """Return the median nanoseconds per find_conflict call over several rounds."""
+    per_probe = []
+    for _ in range(rounds):
+        started = time.perf_counter_ns()
+        for start, end in windows:
+            store.find_conflict(start, end)
+        per_probe.append((time.perf_counter_ns() - started) / len(windows))
+    return round(statistics.median(per_probe), 1)
+
+def measure_size(size, probes, days, rounds, bitmap_days=366):
+    """Compare the interval index with and without bitmaps on a calendar of `size` meetings."""
+    meetings = list(synthetic_meetings(size))
+    index_store = CalendarStore(meetings, bitmap_days=0)
+    bitmap_store = CalendarStore(meetings, bitmap_days=bitmap_days)
+
+    windows = probe_windows(probes, days)
+    free = [window for window in windows if index_store.find_conflict(*window) is None]
+    busy = [window for window in windows if index_store.find_conflict(*window) is not None]
+
+    # Both stores must agree before their timings mean anything
+    for window in windows:
+        if index_store.find_conflict(*window) is not bitmap_store.find_conflict(*window):
+            raise AssertionError(f"Bitmap and index disagree on {window[0].isoformat()}")
+
+    results = {"meetings": size, "free_probes": len(free), "busy_probes": len(busy)}
+    for label, sample in (("free", free), ("busy", busy), ("mixed", windows)):
+        if not sample:
+            continue
+        index_ns = time_probes(index_store, sample, rounds)
+        bitmap_ns = time_probes(bitmap_store, sample, rounds)
+        results[label] = {
+            "index_ns": index_ns,
+            "bitmap_ns": bitmap_ns,
+            "speedup": round(index_ns / bitmap_ns, 2) if bitmap_ns else None
+        }
+    results["bitmap_days"] = len(bitmap_store.occupancy)
+    return results
+
+def main():
+    """Parse command line arguments and benchmark availability probes with and without bitmaps."""
+    parser = argparse.ArgumentParser(description="Compare availability checks with occupancy bitmaps against the interval index")
+    parser.add_argument("--sizes", default="100,10000,1000000", help="Comma-separated numbers of meetings")
+    parser.add_argument("--probes", "-n", type=int, default=10000, help="Availability probes per size")
+    parser.add_argument("--days", type=int, default=30, help="Probe days up to this many days either side of today")
+    parser.add_argument("--bitmap-days", type=int, default=366, help="Days of bitmaps the store may keep")
+    parser.add_argument("--rounds", "-r", type=int, default=5, help="Timed rounds over the probes")
+    parser.add_argument("--output", "-o", help="Write the results as JSON to this file")
+    args = parser.parse_args()
+
+    report = {"meta": {"commit": git_commit(), "probes": args.probes, "days": args.days}, "sizes": {}}
+    print(f"{'meetings':>10} {'probes':>8} {'index ns':>10} {'bitmap ns':>10} {'speedup':>8}")
+    for size in (int(size) for size in args.sizes.split(",") if size.strip()):
+        try:
+            results = measure_size(size, args.probes, args.days, args.rounds, args.bitmap_days)
+        except AssertionError as e:
+            print(f"ERROR: {e}")
+            sys.exit(1)
+        report["sizes"][str(size)] = results
+        for label in ("free", "busy", "mixed"):
+            if label in results:
+                timing = results[label]
+                print(f"{size:>10} {label:>8} {timing['index_ns']:>10} {timing['bitmap_ns']:>10} {timing['speedup']:>7}x")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+if __name__ == "__main__":
+    main()
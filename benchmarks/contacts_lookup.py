@@ -0,0 +1,141 @@
+import argparse
+import csv
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+from benchmarks.agent_pipeline import git_commit, percentile
+from benchmarks.seed import ATTENDEES
+from functions.contacts import ContactDirectory
+from functions.storage import DATA_DIR
+
+SYLLABLES = ["an", "ber", "co", "da", "el", "fi", "gar", "ha", "ing", "jo", "ka", "lo", "mar", "no",
+             "ol", "pe", "qui", "ro", "san", "to", "ul", "ve", "wen", "xi", "ya", "zel"]
+
+def synthetic_contacts(count, seed=0):
+    """Return `count` contacts with unique names made of common first names and generated last names."""
+    rng = random.Random(seed)
+    first_names = ATTENDEES + [rng.choice(SYLLABLES).title() + rng.choice(SYLLABLES) for _ in range(190)]
+    contacts = []
+    names = set()
+    while len(contacts) < count:
+        last = "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))).title()
+        name = f"{rng.choice(first_names)} {last}"
+        if name in names:
+            continue
+        names.add(name)
+        contacts.append({"name": name, "email": f"{name.lower().replace(' ', '.')}@example.com"})
+    return contacts
+
+def write_contacts_csv(path, contacts):
+    """Write contacts as a CSV export with Name and Email columns."""
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(["Name", "Email"])
+        for contact in contacts:
+            writer.writerow([contact["name"], contact["email"]])
+
+def misspell(name, rng):
+    """Swap two neighbouring letters in a random word of a name."""
+    words = name.split()
+    i = rng.randrange(len(words))
+    word = words[i]
+    if len(word) > 3:
+        j = rng.randrange(1, len(word) - 1)
+        words[i] = word[:j] + word[j + 1] + word[j] + word[j + 2:]
+    return " ".join(words)
+
+def time_lookups(directory, queries):
+    """Return (microseconds per lookup, results) for some queries."""
+    durations = []
+    results = []
+    for query in queries:
+        started = time.perf_counter_ns()
+        results.append(directory.find(query))
+        durations.append((time.perf_counter_ns() - started) / 1000)
+    return durations, results
+
+def summary(durations):
+    """Summarize lookup times in microseconds."""
+    return {
+        "p50_us": round(percentile(durations, 50), 2),
+        "p99_us": round(percentile(durations, 99), 2),
+        "max_us": round(max(durations), 2)
+    }
+
+def directory_memory_kib(path):
+    """Return the KiB a loaded directory takes, and the KiB its typo index adds once built."""
+    tracemalloc.start()
+    try:
+        directory = ContactDirectory.load(path)
+        loaded = tracemalloc.get_traced_memory()[0]
+        directory.find("zzzz")
+        return round(loaded / 1024), round((tracemalloc.get_traced_memory()[0] - loaded) / 1024)
+    finally:
+        tracemalloc.stop()
+
+def measure_size(size, probes, seed=0):
+    """Build a directory of `size` contacts from a CSV file and time each kind of lookup."""
+    contacts = synthetic_contacts(size, seed)
+    path = os.path.join(DATA_DIR, f"contacts_{size}.csv")
+    write_contacts_csv(path, contacts)
+
+    started = time.perf_counter()
+    directory = ContactDirectory.load(path)
+    load_seconds = time.perf_counter() - started
+    memory_kib, typo_memory_kib = directory_memory_kib(path)
+    os.remove(path)
+
+    rng = random.Random(seed)
+    sample = [rng.choice(contacts)["name"] for _ in range(probes)]
+    queries = {
+        "exact": sample,
+        "address": [f"{name.lower().replace(' ', '.')}@example.com" for name in sample],
+        "prefix": [name[:name.index(" ") + 4] for name in sample],
+        "fuzzy": [misspell(name, rng) for name in sample]
+    }
+
+    results = {"contacts": size, "load_seconds": round(load_seconds, 3), "memory_kib": memory_kib,
+               "typo_index_kib": typo_memory_kib}
+    for kind, kind_queries in queries.items():
+        durations, found = time_lookups(directory, kind_queries)
+        results[kind] = summary(durations)
+        # How often the intended contact was among the matches
+        hits = sum(any(contact["name"] == name for contact in matches) for (_, matches), name in zip(found, sample))
+        results[kind]["found"] = round(hits / len(sample), 3)
+        if kind == "fuzzy":
+            # Again, now that the corrections are cached
+            results["fuzzy_cached"] = summary(time_lookups(directory, kind_queries)[0])
+    return results
+
+def main():
+    """Parse command line arguments and benchmark contact lookups."""
+    parser = argparse.ArgumentParser(description="Benchmark name-to-address lookups in the contacts directory")
+    parser.add_argument("--sizes", default="1000,100000", help="Comma-separated numbers of contacts")
+    parser.add_argument("--probes", "-n", type=int, default=2000, help="Lookups of each kind per size")
+    parser.add_argument("--output", "-o", help="Write the results as JSON to this file")
+    args = parser.parse_args()
+
+    report = {"meta": {"commit": git_commit(), "probes": args.probes}, "sizes": {}}
+    kinds = ("exact", "address", "prefix", "fuzzy", "fuzzy_cached")
+    print(f"{'contacts':>10} {'load s':>8} {'KiB':>8} {'typo KiB':>9} " + "".join(f"{kind + ' p50/p99 us':>26}" for kind in kinds))
+    for size in (int(size) for size in args.sizes.split(",") if size.strip()):
+        results = measure_size(size, args.probes)
+        report["sizes"][str(size)] = results
+        cells = "".join(f"{results[kind]['p50_us']:>13}/{results[kind]['p99_us']:<12}" for kind in kinds)
+        print(f"{size:>10} {results['load_seconds']:>8} {results['memory_kib']:>8} {results['typo_index_kib']:>9} {cells}")
+        print(f"{'':>28}found: " + ", ".join(f"{kind} {results[kind]['found']:.1%}" for kind in kinds if "found" in results[kind]))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+    if any(results["exact"]["found"] < 1 for results in report["sizes"].values()):
+        print("ERROR: an exact lookup missed its contact")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
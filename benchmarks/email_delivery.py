@@ -0,0 +1,135 @@
+import argparse
+import json
+import socket
+import sys
+import threading
+import time
+from benchmarks.agent_pipeline import git_commit, latency_summary
+from functions.email_delivery import FAILED, SENT, configure_email_queue
+from functions.email_functions import email_file, send_email
+from functions.storage import open_records, reset_records
+
+try:
+    from aiosmtpd.controller import Controller
+except ImportError:
+    Controller = None
+
+class CountingHandler:
+    """An aiosmtpd handler that counts sessions and messages, refusing every Nth message with a 451."""
+
+    def __init__(self, fail_every=0):
+        self.fail_every = fail_every
+        self.sessions = 0
+        self.messages = 0
+        self.refused = 0
+        self._lock = threading.Lock()
+
+    async def handle_EHLO(self, server, session, envelope, hostname, responses):
+        session.host_name = hostname
+        with self._lock:
+            self.sessions += 1
+        return responses
+
+    async def handle_DATA(self, server, session, envelope):
+        with self._lock:
+            attempt = self.messages + self.refused + 1
+            if self.fail_every and attempt % self.fail_every == 0:
+                self.refused += 1
+                return "451 Try again later"
+            self.messages += 1
+        return "250 Message accepted for delivery"
+
+def free_port():
+    """Return a TCP port nothing is listening on."""
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def run_benchmark(count, workers, batch_size, fail_every, retry_delay, timeout):
+    """Send `count` emails through a local SMTP server and measure enqueue latency and delivery throughput."""
+    handler = CountingHandler(fail_every)
+    port = free_port()
+    server = Controller(handler, hostname="127.0.0.1", port=port)
+    server.start()
+    try:
+        outbox = configure_email_queue(host="127.0.0.1", port=port, workers=workers, batch_size=batch_size,
+                                       retry_delay=retry_delay)
+        path = email_file()
+        reset_records(path)
+
+        enqueue_seconds = []
+        started = time.perf_counter()
+        for i in range(count):
+            call_started = time.perf_counter()
+            result = send_email("sarah@example.com", f"Benchmark {i}", "Hi Sarah, this is a benchmark email.")
+            enqueue_seconds.append(time.perf_counter() - call_started)
+            if not result["success"]:
+                raise RuntimeError(result["error"])
+        enqueued = time.perf_counter() - started
+        drained = outbox.wait(timeout)
+        elapsed = time.perf_counter() - started
+        outbox.close()
+
+        statuses = {}
+        for email in open_records(path).load():
+            statuses[email["status"]] = statuses.get(email["status"], 0) + 1
+        reset_records(path)
+    finally:
+        server.stop()
+
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "emails": count,
+            "workers": workers,
+            "batch_size": batch_size,
+            "fail_every": fail_every
+        },
+        "enqueue": latency_summary(enqueue_seconds),
+        "enqueue_seconds": round(enqueued, 3),
+        "delivery_seconds": round(elapsed, 3),
+        "emails_per_second": round(count / elapsed, 1),
+        "drained": drained,
+        "statuses": statuses,
+        "smtp_sessions": handler.sessions,
+        "connections_opened": outbox.pool.opened,
+        "messages_accepted": handler.messages,
+        "messages_refused": handler.refused
+    }
+
+def main():
+    """Parse command line arguments and benchmark queued email delivery against a local aiosmtpd server."""
+    parser = argparse.ArgumentParser(description="Benchmark the background email queue against a local SMTP server")
+    parser.add_argument("--emails", "-n", type=int, default=1000, help="Emails to send")
+    parser.add_argument("--workers", "-w", type=int, default=2, help="Delivery worker threads")
+    parser.add_argument("--batch-size", type=int, default=50, help="Emails sent per pooled connection checkout")
+    parser.add_argument("--fail-every", type=int, default=0,
+                        help="Refuse every Nth message with a temporary 451 error (0 for none)")
+    parser.add_argument("--retry-delay", type=float, default=0.05, help="Base retry backoff in seconds")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Seconds to wait for the queue to drain")
+    parser.add_argument("--output", "-o", help="Write the results as JSON to this file")
+    args = parser.parse_args()
+
+    if Controller is None:
+        print("ERROR: aiosmtpd is not installed (pip install aiosmtpd)")
+        sys.exit(1)
+
+    report = run_benchmark(args.emails, args.workers, args.batch_size, args.fail_every, args.retry_delay, args.timeout)
+    print(f"Enqueued {args.emails} emails in {report['enqueue_seconds']} s "
+          f"(p50 {report['enqueue']['p50_ms']} ms, p99 {report['enqueue']['p99_ms']} ms per send_email)")
+    print(f"Delivered in {report['delivery_seconds']} s: {report['emails_per_second']} emails/s "
+          f"over {report['connections_opened']} SMTP connections")
+    print(f"Statuses: {report['statuses']}, {report['messages_refused']} temporary refusals retried")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+    if not report["drained"] or report["statuses"].get(SENT, 0) != args.emails:
+        print(f"ERROR: {args.emails - report['statuses'].get(SENT, 0)} emails were not delivered "
+              f"({report['statuses'].get(FAILED, 0)} failed)")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
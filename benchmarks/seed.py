@@ -0,0 +1,103 @@
+import datetime
+import json
+import random
+from functions.calendar_functions import CALENDAR_FILE
+from functions.email_functions import EMAIL_FILE
+from functions.storage import FILE_EXTENSIONS, open_records, reset_records
+
+# Meetings start on the hour between 9 AM and 5 PM
+WORKING_HOURS = range(9, 17)
+
+ATTENDEES = ["John", "Sarah", "Priya", "Wei", "Carlos", "Amara", "Lukas", "Mei", "Omar", "Hana"]
+
+def synthetic_meetings(count, seed=0):
+    """
+    Yield `count` one-hour meetings, deterministic for a given seed.
+
+    Meetings fill about three quarters of the working-hour slots, day after
+    day, with half of them in the past and half in the future. Tomorrow is
+    left empty so the scripted scenarios behave the same at every size.
+    """
+    rng = random.Random(seed)
+    slots_per_day = len(WORKING_HOURS) * 3 // 4
+    today = datetime.date.today()
+    day = today - datetime.timedelta(days=count // (2 * slots_per_day) + 1)
+    created_at = datetime.datetime.combine(today, datetime.time()).isoformat()
+    meeting_id = 0
+    while meeting_id < count:
+        if day != today + datetime.timedelta(days=1):
+            for hour in WORKING_HOURS:
+                if meeting_id >= count:
+                    break
+                if rng.random() < 0.25:
+                    continue
+                meeting_id += 1
+                start = datetime.datetime.combine(day, datetime.time(hour))
+                attendee = rng.choice(ATTENDEES)
+                yield {
+                    "id": meeting_id,
+                    "title": f"Meeting with {attendee}",
+                    "attendee": attendee,
+                    "start_time": start.isoformat(),
+                    "end_time": (start + datetime.timedelta(hours=1)).isoformat(),
+                    "created_at": created_at
+                }
+        day += datetime.timedelta(days=1)
+
+def synthetic_emails(count, seed=0):
+    """Yield `count` sent emails, oldest first, deterministic for a given seed."""
+    rng = random.Random(seed)
+    sent_at = datetime.datetime.now() - datetime.timedelta(minutes=count)
+    for email_id in range(1, count + 1):
+        name = rng.choice(ATTENDEES)
+        subject = f"Update #{email_id}"
+        yield {
+            "id": email_id,
+            "to": f"{name.lower()}@example.com",
+            "subject": subject,
+            "body": f"This is a message regarding: {subject}",
+            "sent_at": (sent_at + datetime.timedelta(minutes=email_id)).isoformat(),
+            "status": "sent"
+        }
+
+def write_records(path, records, chunk_size=10000):
+    """
+    Replace the contents of a record file with `records`, in its own format.
+
+    JSON and JSON Lines files are written in one streaming pass; SQLite
+    databases are filled in chunked transactions. Returns the record count.
+    """
+    reset_records(path)
+    count = 0
+    if path.endswith(FILE_EXTENSIONS["sqlite"]):
+        store = open_records(path)
+        chunk = []
+        for record in records:
+            chunk.append(record)
+            if len(chunk) >= chunk_size:
+                store.extend(chunk)
+                count += len(chunk)
+                chunk = []
+        if chunk:
+            store.extend(chunk)
+            count += len(chunk)
+        return count
+
+    with open(path, 'w') as f:
+        if path.endswith(FILE_EXTENSIONS["jsonl"]):
+            for record in records:
+                f.write(json.dumps(record) + '\n')
+                count += 1
+        else:
+            f.write('[')
+            for record in records:
+                f.write((',\n' if count else '\n') + json.dumps(record))
+                count += 1
+            f.write('\n]')
+    return count
+
+def seed_data(calendar_size, email_size=None, seed=0):
+    """Fill the calendar and email files with synthetic records. Returns the file paths."""
+    write_records(CALENDAR_FILE, synthetic_meetings(calendar_size, seed))
+    write_records(EMAIL_FILE, synthetic_emails(calendar_size if email_size is None else email_size, seed))
+    return CALENDAR_FILE, EMAIL_FILE
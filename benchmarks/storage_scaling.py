@@ -0,0 +1,210 @@
+import argparse
+import json
+import math
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+from benchmarks.agent_pipeline import git_commit
+from benchmarks.seed import seed_data
+from functions.calendar_functions import (
+    CALENDAR_FILE,
+    check_calendar_availability,
+    get_upcoming_meetings,
+    schedule_meeting
+)
+from functions.email_functions import get_sent_emails, send_email
+from functions.storage import DATA_DIR, STORAGE_BACKEND
+
+def _schedule_call(i):
+    # Tomorrow is left empty by the seeder, so each hour can be booked once.
+    # Past 24 calls a size, bookings conflict and no longer write.
+    return schedule_meeting("John", f"tomorrow {i % 24}:00", f"Benchmark meeting {i}")
+
+# Function name -> callable taking the repeat index
+FUNCTIONS = {
+    "check_calendar_availability": lambda i: check_calendar_availability(f"today {9 + i % 8}:00"),
+    "schedule_meeting": _schedule_call,
+    "get_upcoming_meetings": lambda i: get_upcoming_meetings(5),
+    "send_email": lambda i: send_email("Sarah", f"Benchmark {i}", "Hi Sarah, this is a benchmark email."),
+    "get_sent_emails": lambda i: get_sent_emails(5)
+}
+
+# Functions that read the cached calendar, so their first call after a change pays for a reload
+CALENDAR_READERS = {"check_calendar_availability", "schedule_meeting", "get_upcoming_meetings"}
+
+def time_call(function, i):
+    """Return how long one call takes, in milliseconds."""
+    started = time.perf_counter_ns()
+    function(i)
+    return (time.perf_counter_ns() - started) / 1e6
+
+def peak_memory_kib(function, i):
+    """Return the peak memory allocated during one call, in KiB."""
+    tracemalloc.start()
+    try:
+        function(i)
+        return round(tracemalloc.get_traced_memory()[1] / 1024, 1)
+    finally:
+        tracemalloc.stop()
+
+def invalidate_calendar_cache():
+    """Bump the calendar file's mtime so the next read reloads it, as after a write by another process."""
+    if os.path.exists(CALENDAR_FILE):
+        os.utime(CALENDAR_FILE)
+
+def measure_size(size, functions, repeats):
+    """Seed `size` meetings and emails and time each function on them."""
+    started = time.perf_counter()
+    seed_data(size)
+    results = {"seed_seconds": round(time.perf_counter() - started, 3), "functions": {}}
+
+    index = 0
+    for name in functions:
+        function = FUNCTIONS[name]
+
+        # Cold: the first call after the calendar file changed
+        invalidate_calendar_cache()
+        cold_ms = time_call(function, index)
+        index += 1
+
+        warm = []
+        for _ in range(repeats):
+            warm.append(time_call(function, index))
+            index += 1
+
+        results["functions"][name] = {
+            "cold_ms": round(cold_ms, 3),
+            "median_ms": round(statistics.median(warm), 3),
+            "min_ms": round(min(warm), 3),
+            "max_ms": round(max(warm), 3),
+            "peak_kib": peak_memory_kib(function, index)
+        }
+        index += 1
+        if name in CALENDAR_READERS:
+            invalidate_calendar_cache()
+            results["functions"][name]["cold_peak_kib"] = peak_memory_kib(function, index)
+            index += 1
+    return results
+
+def scaling_exponent(sizes, values):
+    """
+    Fit value = c * size^k on a log-log scale and return k.
+
+    k near 0 means the cost doesn't grow with the data, near 1 linear, and
+    near 2 quadratic.
+    """
+    points = [(math.log(size), math.log(value)) for size, value in zip(sizes, values) if size > 0 and value > 0]
+    if len(points) < 2:
+        return None
+    mean_x = statistics.fmean(x for x, _ in points)
+    mean_y = statistics.fmean(y for _, y in points)
+    denominator = sum((x - mean_x) ** 2 for x, _ in points)
+    if not denominator:
+        return None
+    return round(sum((x - mean_x) * (y - mean_y) for x, y in points) / denominator, 2)
+
+def complexity_label(exponent):
+    """Describe a scaling exponent as a rough complexity class."""
+    if exponent is None:
+        return "n/a"
+    if exponent < 0.15:
+        return "O(1)"
+    if exponent < 0.6:
+        return "sublinear"
+    if exponent < 1.3:
+        return "O(n)"
+    return "superlinear"
+
+def run_benchmarks(sizes, functions, repeats=20):
+    """Measure every function at every size and fit its scaling curve."""
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "storage_backend": STORAGE_BACKEND,
+            "repeats": repeats,
+            "sizes": sizes
+        },
+        "sizes": {},
+        "scaling": {}
+    }
+    for size in sizes:
+        print(f"Seeding {size} meetings and emails in {DATA_DIR}...")
+        report["sizes"][str(size)] = measure_size(size, functions, repeats)
+
+    for name in functions:
+        for metric in ("median_ms", "cold_ms"):
+            values = [report["sizes"][str(size)]["functions"][name][metric] for size in sizes]
+            exponent = scaling_exponent(sizes, values)
+            report["scaling"].setdefault(name, {})[metric.replace("_ms", "_exponent")] = exponent
+        report["scaling"][name]["complexity"] = complexity_label(report["scaling"][name]["median_exponent"])
+    return report
+
+def compare(report, baseline, tolerance):
+    """Return the (function, size, now, before) cases whose median is worse than tolerance x the baseline."""
+    regressions = []
+    for size, results in report["sizes"].items():
+        base_functions = baseline.get("sizes", {}).get(size, {}).get("functions", {})
+        for name, timing in results["functions"].items():
+            before = base_functions.get(name, {}).get("median_ms")
+            if before and timing["median_ms"] > before * tolerance:
+                regressions.append((name, size, timing["median_ms"], before))
+    return regressions
+
+def print_report(report):
+    """Print the median time of each function at each size, and its scaling."""
+    sizes = list(report["sizes"])
+    print(f"\nMedian ms per call ({report['meta']['storage_backend']} backend), cold ms in brackets")
+    print(f"{'function':<28}" + "".join(f"{size:>22}" for size in sizes) + f"{'exponent':>10}  complexity")
+    for name, scaling in report["scaling"].items():
+        cells = ""
+        for size in sizes:
+            timing = report["sizes"][size]["functions"][name]
+            cells += f"{timing['median_ms']:>10} [{timing['cold_ms']:>9}]"
+        print(f"{name:<28}{cells}{str(scaling['median_exponent']):>10}  {scaling['complexity']}")
+
+    print("\nPeak KiB per warm call")
+    for name in report["scaling"]:
+        print(f"{name:<28}" + "".join(f"{report['sizes'][size]['functions'][name]['peak_kib']:>22}" for size in sizes))
+
+def main():
+    """Parse command line arguments and run the storage scaling benchmarks."""
+    parser = argparse.ArgumentParser(description="Measure how calendar and email functions scale with data size")
+    parser.add_argument("--sizes", default="100,1000,10000,100000",
+                        help="Comma-separated numbers of seeded meetings and emails")
+    parser.add_argument("--functions", default=",".join(FUNCTIONS),
+                        help=f"Comma-separated functions to time (default: all of {', '.join(FUNCTIONS)})")
+    parser.add_argument("--repeats", "-r", type=int, default=20, help="Warm calls timed per function and size")
+    parser.add_argument("--output", "-o", help="Write the results as JSON to this file")
+    parser.add_argument("--compare", "-c", help="Earlier JSON results; exit with status 1 on a regression")
+    parser.add_argument("--tolerance", type=float, default=1.5,
+                        help="How many times slower than the baseline counts as a regression")
+    args = parser.parse_args()
+
+    sizes = sorted(int(size) for size in args.sizes.split(",") if size.strip())
+    functions = [name.strip() for name in args.functions.split(",") if name.strip()]
+    unknown = [name for name in functions if name not in FUNCTIONS]
+    if unknown:
+        parser.error(f"Unknown functions: {', '.join(unknown)}")
+
+    report = run_benchmarks(sizes, functions, args.repeats)
+    print_report(report)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.tolerance)
+        for name, size, now, before in regressions:
+            print(f"REGRESSION: {name} at {size} records: {now} ms, was {before} ms")
+        if regressions:
+            sys.exit(1)
+        print(f"\nNo regressions beyond {args.tolerance}x the baseline")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+import collections
+import json
+
+# A parsed JSON response: the function calls to make, as
+# {"name": ..., "arguments": {...}} dicts, or the final answer text
+ParsedResponse = collections.namedtuple('ParsedResponse', ['calls', 'final_answer'])
+
+def json_protocol_instructions(schemas):
+    """Return the prompt text describing the JSON call format and the function schemas."""
+    return (
+        "RESPONSE FORMAT:\n"
+        "- Respond with a single JSON object and nothing else.\n"
+        '- To call functions: {"calls": [{"name": "send_email", "arguments": {"recipient": "Sarah", "subject": "Project update"}}]}\n'
+        "- Put several calls in the list when they don't depend on each other's results; they run in parallel\n"
+        '- To give your final answer: {"final_answer": "your answer to the user"}\n'
+        "- Argument values are JSON, so titles and bodies can contain commas\n\n"
+        "Function schemas, one per line:\n" + "\n".join(json.dumps(schema) for schema in schemas)
+    )
+
+def _strip_code_fence(text):
+    """Remove a ```json ... ``` fence around a response, if there is one."""
+    if text.startswith("```"):
+        text = text[3:]
+        if text.startswith("json"):
+            text = text[4:]
+        if text.endswith("```"):
+            text = text[:-3]
+        text = text.strip()
+    return text
+
+def _parse_call(call):
+    """Validate one call object, returning it normalized or None."""
+    if not isinstance(call, dict) or not isinstance(call.get("name"), str):
+        return None
+    arguments = call.get("arguments", call.get("args", {}))
+    if arguments is None:
+        arguments = {}
+    if not isinstance(arguments, dict):
+        return None
+    return {"name": call["name"], "arguments": arguments}
+
+def parse_json_response(llm_response):
+    """
+    Parse an LLM response in the JSON call format with a single json.loads.
+
+    Returns a ParsedResponse, or None when the response isn't a valid JSON
+    call or answer, so the caller can fall back to the legacy format.
+    """
+    text = _strip_code_fence(llm_response.strip())
+    if not text.startswith("{"):
+        return None
+    try:
+        data = json.loads(text)
+    except ValueError:
+        return None
+    if not isinstance(data, dict):
+        return None
+
+    if "final_answer" in data:
+        return ParsedResponse([], str(data["final_answer"]))
+
+    # Accept a single call object as well as a list of calls
+    calls = data["calls"] if "calls" in data else [data]
+    if not isinstance(calls, list) or not calls:
+        return None
+    parsed_calls = [_parse_call(call) for call in calls]
+    if None in parsed_calls:
+        return None
+    return ParsedResponse(parsed_calls, None)
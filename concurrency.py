@@ -0,0 +1,107 @@
+import json
+import threading
+
+class ConcurrencyLimiter:
+    """
+    WSGI middleware that bounds how many requests run at once.
+
+    Up to `max_concurrent` requests run at the same time. Up to `max_queue`
+    more wait (at most `queue_timeout` seconds) for a free slot; anything
+    beyond that is rejected straight away with 429 Too Many Requests, so a
+    burst can't pile up unbounded work behind the LLM.
+
+    A slot is held until the response body has been fully sent, which also
+    covers streaming responses. Only paths starting with one of
+    `limited_prefixes` are limited, so health checks stay responsive.
+    """
+
+    def __init__(self, app, max_concurrent=16, max_queue=32, queue_timeout=10.0, limited_prefixes=("/query",)):
+        self.app = app
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.limited_prefixes = tuple(limited_prefixes)
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+        self._lock = threading.Lock()
+        self.active = 0
+        self.waiting = 0
+        self.rejected = 0
+
+    def _reject(self, start_response):
+        """Send a 429 response."""
+        self.rejected += 1
+        body = json.dumps({"error": "Server is busy, please retry shortly"}).encode("utf-8")
+        start_response("429 Too Many Requests", [
+            ("Content-Type", "application/json"),
+            ("Content-Length", str(len(body))),
+            ("Retry-After", "1"),
+            ("Access-Control-Allow-Origin", "*")
+        ])
+        return [body]
+
+    def _acquire(self):
+        """Wait for a free slot, or return False if the queue is full or the wait times out."""
+        if self._slots.acquire(blocking=False):
+            return True
+        with self._lock:
+            if self.waiting >= self.max_queue:
+                return False
+            self.waiting += 1
+        try:
+            return self._slots.acquire(timeout=self.queue_timeout)
+        finally:
+            with self._lock:
+                self.waiting -= 1
+
+    def _release(self):
+        """Free a slot."""
+        with self._lock:
+            self.active -= 1
+        self._slots.release()
+
+    def __call__(self, environ, start_response):
+        if not environ.get("PATH_INFO", "").startswith(self.limited_prefixes):
+            return self.app(environ, start_response)
+
+        if not self._acquire():
+            return self._reject(start_response)
+        with self._lock:
+            self.active += 1
+
+        try:
+            body = self.app(environ, start_response)
+        except BaseException:
+            self._release()
+            raise
+        return _ReleasingIterable(body, self._release)
+
+    def stats(self):
+        """Return the current load and how many requests were rejected."""
+        with self._lock:
+            return {
+                "active": self.active,
+                "waiting": self.waiting,
+                "rejected": self.rejected,
+                "max_concurrent": self.max_concurrent,
+                "max_queue": self.max_queue
+            }
+
+class _ReleasingIterable:
+    """Response body wrapper that frees the request's slot when the server closes it."""
+
+    def __init__(self, body, release):
+        self._body = body
+        self._release = release
+        self._released = False
+
+    def __iter__(self):
+        return iter(self._body)
+
+    def close(self):
+        try:
+            if hasattr(self._body, "close"):
+                self._body.close()
+        finally:
+            if not self._released:
+                self._released = True
+                self._release()
@@ -1,8 +1,10 @@
-import os
 import sys
-import json
+import time
 import argparse
 from agent import AssistantAgent
+from functions.calendar_functions import calendar_file
+from functions.email_functions import email_file
+from functions.storage import open_records, reset_records, tenant_scope
 
 class SimpleConsoleClient:
     """A client that determines response based on query intent."""
@@ -79,6 +81,18 @@ class SimpleConsoleClient:
         else:
             return "FINAL_ANSWER: All tasks completed."
 
+class SimulatedLatencyClient:
+    """Wraps an LLM client and sleeps before each response to mimic a real round trip."""
+    
+    def __init__(self, client, latency=0.0):
+        self.client = client
+        self.latency = latency
+    
+    def generate_content(self, prompt):
+        if self.latency > 0:
+            time.sleep(self.latency)
+        return self.client.generate_content(prompt)
+
 def process_query(query, client, show_iterations=True):
     # Return the next response in sequence
     if client.iteration < len(client.responses):
@@ -88,6 +102,38 @@ def process_query(query, client, show_iterations=True):
     else:
         return "FINAL_ANSWER: All tasks completed."
 
+def clean_final_answer(result):
+    """Return a result's final answer without the FINAL_ANSWER: prefix."""
+    final_answer = result['final_answer']
+    if final_answer.startswith("FINAL_ANSWER:"):
+        final_answer = final_answer[13:].strip()
+    return final_answer
+
+def friendly_response(response):
+    """Replace a leftover FUNCTION_CALL response with a user-friendly message."""
+    if "schedule_meeting" in response:
+        return "I've scheduled a meeting with John for tomorrow at 3 PM and sent an email reminder."
+    elif "check_calendar_availability" in response:
+        return "I've checked your calendar availability. You are available at that time."
+    elif "send_email" in response:
+        return "I've sent the email as requested. Check the console for details."
+    else:
+        return "I've processed your request. Check the console for details."
+
+def run_clean_query(query, agent=None, scenario=None):
+    """
+    Run a query and return exactly what `console_agent.py QUERY --clean` prints.
+    
+    Nothing is printed. Pass an existing agent to reuse it across queries;
+    a fresh SimpleConsoleClient is created for every call since it keeps
+    per-query state.
+    """
+    if agent is None:
+        agent = AssistantAgent(verbose=False)
+    client = SimpleConsoleClient(scenario if scenario != "auto" else None)
+    result = agent.process_query(query, client, show_iterations=False, include_prompts=False)
+    return clean_final_answer(result).strip()
+
 def run_agent_in_console(query, scenario=None, clean_output=False):
     """Run the agent in console mode and print the output."""
     # Initialize the agent with verbose=False to suppress internal messages
@@ -100,9 +146,7 @@ def run_agent_in_console(query, scenario=None, clean_output=False):
     result = agent.process_query(query, client, show_iterations=not clean_output)
     
     # Format the final answer
-    final_answer = result['final_answer']
-    if final_answer.startswith("FINAL_ANSWER:"):
-        final_answer = final_answer[13:].strip()
+    final_answer = clean_final_answer(result)
     
     # For clean output mode, just print the final answer
     if clean_output:
@@ -114,15 +158,9 @@ def run_agent_in_console(query, scenario=None, clean_output=False):
             final_answer = f"FINAL_ANSWER: {final_answer}"
         print(final_answer)
     
-    # Ensure data directory exists
-    data_dir = os.path.join(os.path.dirname(__file__), 'data')
-    os.makedirs(data_dir, exist_ok=True)
-    
     # Reset the calendar and emails files
-    for file_name in ['calendar.json', 'emails.json']:
-        file_path = os.path.join(data_dir, file_name)
-        with open(file_path, 'w') as f:
-            json.dump([], f)
+    for file_path in [calendar_file(), email_file()]:
+        reset_records(file_path)
     
     # Display a summary of function calls if any
     print("\n=== Function Call Chain ===")
@@ -143,31 +181,29 @@ def run_agent_in_console(query, scenario=None, clean_output=False):
     # Display the calendar and email data
     print("\n--- Calendar after execution ---")
     try:
-        with open(os.path.join(data_dir, 'calendar.json'), 'r') as f:
-            calendar_data = json.load(f)
-            if calendar_data:
-                for meeting in calendar_data:
-                    print(f"Meeting: {meeting['title']}")
-                    print(f"  With: {meeting['attendee']}")
-                    print(f"  Time: {meeting['start_time']}")
-                    print()
-            else:
-                print("No meetings scheduled.")
+        calendar_data = open_records(calendar_file()).load()
+        if calendar_data:
+            for meeting in calendar_data:
+                print(f"Meeting: {meeting['title']}")
+                print(f"  With: {meeting['attendee']}")
+                print(f"  Time: {meeting['start_time']}")
+                print()
+        else:
+            print("No meetings scheduled.")
     except Exception as e:
         print(f"Error reading calendar: {e}")
     
     print("\n--- Emails after execution ---")
     try:
-        with open(os.path.join(data_dir, 'emails.json'), 'r') as f:
-            email_data = json.load(f)
-            if email_data:
-                for email in email_data:
-                    print(f"Email to: {email['to']}")
-                    print(f"Subject: {email['subject']}")
-                    print(f"Body: {email['body'][:50]}..." if len(email['body']) > 50 else f"Body: {email['body']}")
-                    print()
-            else:
-                print("No emails sent.")
+        email_data = open_records(email_file()).load()
+        if email_data:
+            for email in email_data:
+                print(f"Email to: {email['to']}")
+                print(f"Subject: {email['subject']}")
+                print(f"Body: {email['body'][:50]}..." if len(email['body']) > 50 else f"Body: {email['body']}")
+                print()
+        else:
+            print("No emails sent.")
     except Exception as e:
         print(f"Error reading emails: {e}")
 
@@ -179,6 +215,7 @@ def main():
                         default='auto', help='The scenario to test (default: auto)')
     parser.add_argument('--clean', '-c', action='store_true',
                         help='Output only the clean final answer with no debug info')
+    parser.add_argument('--user', '-u', help="Use this user's calendar and email log instead of the shared data")
     args = parser.parse_args()
     
     query = ' '.join(args.query) if args.query else None
@@ -191,7 +228,8 @@ def main():
     if query:
         # Run the agent with specified scenario
         clean_output = args.clean
-        run_agent_in_console(query, args.scenario, clean_output)
+        with tenant_scope(args.user):
+            run_agent_in_console(query, args.scenario, clean_output)
     else:
         print("No query provided. Exiting.")
 
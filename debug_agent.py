@@ -1,10 +1,12 @@
 import os
 import sys
 import time
-import json
 import re
 import argparse
 from agent import AssistantAgent
+from functions.calendar_functions import CALENDAR_FILE
+from functions.email_functions import EMAIL_FILE
+from functions.storage import open_records, reset_records
 
 # Enhanced mock LLM client for testing with more realistic responses
 class MockLLMClient:
@@ -45,12 +47,10 @@ class MockLLMClient:
         """Check if there's a conflict in the calendar for the specified time"""
         try:
             # Read the calendar file
-            calendar_path = os.path.join(self.data_dir, 'calendar.json')
-            if not os.path.exists(calendar_path):
+            if not os.path.exists(CALENDAR_FILE):
                 return None
                 
-            with open(calendar_path, 'r') as f:
-                meetings = json.load(f)
+            meetings = open_records(CALENDAR_FILE).load()
                 
             if not meetings:
                 return None
@@ -185,10 +185,8 @@ def run_query_with_display(query, preserve_data=False):
     # Only reset calendar data if not preserving state
     if not preserve_data:
         # Reset the calendar and emails files to empty arrays
-        for file_name in ['calendar.json', 'emails.json']:
-            file_path = os.path.join(data_dir, file_name)
-            with open(file_path, 'w') as f:
-                json.dump([], f)
+        for file_path in [CALENDAR_FILE, EMAIL_FILE]:
+            reset_records(file_path)
         print(f"\nCalendar and email data reset for testing")
     else:
         print(f"\nPreserving existing calendar and email data")
@@ -226,31 +224,29 @@ def run_query_with_display(query, preserve_data=False):
     # Display the calendar and email data after execution
     print("\n--- Calendar after execution ---")
     try:
-        with open(os.path.join(data_dir, 'calendar.json'), 'r') as f:
-            calendar_data = json.load(f)
-            if calendar_data:
-                for meeting in calendar_data:
-                    print(f"Meeting: {meeting['title']}")
-                    print(f"  With: {meeting['attendee']}")
-                    print(f"  Time: {meeting['start_time']}")
-                    print()
-            else:
-                print("No meetings scheduled.")
+        calendar_data = open_records(CALENDAR_FILE).load()
+        if calendar_data:
+            for meeting in calendar_data:
+                print(f"Meeting: {meeting['title']}")
+                print(f"  With: {meeting['attendee']}")
+                print(f"  Time: {meeting['start_time']}")
+                print()
+        else:
+            print("No meetings scheduled.")
     except Exception as e:
         print(f"Error reading calendar: {e}")
     
     print("\n--- Emails after execution ---")
     try:
-        with open(os.path.join(data_dir, 'emails.json'), 'r') as f:
-            email_data = json.load(f)
-            if email_data:
-                for email in email_data:
-                    print(f"Email to: {email['to']}")
-                    print(f"Subject: {email['subject']}")
-                    print(f"Body: {email['body'][:50]}..." if len(email['body']) > 50 else f"Body: {email['body']}")
-                    print()
-            else:
-                print("No emails sent.")
+        email_data = open_records(EMAIL_FILE).load()
+        if email_data:
+            for email in email_data:
+                print(f"Email to: {email['to']}")
+                print(f"Subject: {email['subject']}")
+                print(f"Body: {email['body'][:50]}..." if len(email['body']) > 50 else f"Body: {email['body']}")
+                print()
+        else:
+            print("No emails sent.")
     except Exception as e:
         print(f"Error reading emails: {e}")
     
@@ -0,0 +1,78 @@
+import logging
+import queue
+import random
+import sys
+import threading
+
+def format_trace(query, result):
+    """Format an agent result as the step-by-step trace the console agent prints."""
+    lines = ["=== Agent Execution ===", f"User Query: {query}"]
+    for step in result.get('conversation_history', []):
+        lines.append(f"--- Iteration {step.get('iteration')} ---")
+        lines.append(f"LLM Response: {step.get('llm_response')}")
+        function_results = step.get('function_results') or [step.get('function_result')]
+        for function_result in function_results:
+            if function_result and 'function' in function_result:
+                param_str = ", ".join([f"'{p}'" for p in function_result.get('params', [])] +
+                                      [f"{k}='{v}'" for k, v in function_result.get('kwargs', {}).items()])
+                lines.append(f"  Function Call: {function_result['function']}({param_str})")
+                lines.append(f"  Result: {function_result.get('result')}")
+            elif function_result:
+                lines.append(f"  Function Error: {function_result.get('error')}")
+    lines.append(f"Final Answer: {result.get('final_answer')}")
+    lines.append("=" * 50)
+    return "\n".join(lines)
+
+class DebugMirror:
+    """
+    Writes traces of agent runs to a log sink, off the request path.
+
+    The request thread only samples the run and puts the finished result on
+    a bounded queue; a background thread formats and writes it. When the
+    queue is full, traces are dropped rather than slowing requests down.
+    """
+
+    def __init__(self, sample_rate=1.0, log_path=None, max_queue=1000):
+        self.sample_rate = sample_rate
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=max_queue)
+
+        self.logger = logging.getLogger("assistant.debug_mirror")
+        self.logger.setLevel(logging.INFO)
+        self.logger.propagate = False
+        if not self.logger.handlers:
+            handler = logging.FileHandler(log_path) if log_path else logging.StreamHandler(sys.stdout)
+            handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+            self.logger.addHandler(handler)
+
+        self._thread = None
+        if self.sample_rate > 0:
+            self._thread = threading.Thread(target=self._run, name="debug-mirror", daemon=True)
+            self._thread.start()
+
+    def submit(self, query, result):
+        """Queue a finished run for logging, if it is sampled."""
+        if self._thread is None or random.random() >= self.sample_rate:
+            return
+        try:
+            self._queue.put_nowait((query, result))
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        """Format and write queued traces until a None sentinel arrives."""
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            try:
+                self.logger.info(format_trace(*item))
+            except Exception as e:
+                self.logger.info(f"Could not format trace: {e}")
+
+    def close(self):
+        """Write out the queued traces and stop the background thread."""
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
@@ -1,135 +1,159 @@
 import datetime
-import json
-import os
-import re
+from functions.calendar_store import (
+    free_gaps,
+    from_epoch,
+    get_calendar_store,
+    locked_calendar_store,
+    sweep_conflicts,
+    to_epoch
+)
+from functions.contacts import resolve_contact
+from functions.registry import tool
+from functions.storage import current_tenant, data_file, open_records
+from functions.time_parser import parse_time_expression
 
 # Path to store our mock data
-DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data')
-CALENDAR_FILE = os.path.join(DATA_DIR, 'calendar.json')
-
-# Ensure the data directory exists
-os.makedirs(DATA_DIR, exist_ok=True)
+CALENDAR_FILE = data_file('calendar')
 
 # Initialize the calendar file if it doesn't exist
-if not os.path.exists(CALENDAR_FILE):
-    with open(CALENDAR_FILE, 'w') as f:
-        json.dump([], f)
+open_records(CALENDAR_FILE)
+
+def calendar_file():
+    """Return the calendar file of the current user, or CALENDAR_FILE outside a tenant_scope()."""
+    tenant = current_tenant()
+    return CALENDAR_FILE if tenant is None else data_file('calendar', tenant=tenant)
 
 def parse_time(time_str):
-    """Parse a time string into a datetime object."""
-    try:
-        # Handle "tomorrow" or "today" keywords
-        today = datetime.datetime.now()
-        if "tomorrow" in time_str.lower():
-            date = today + datetime.timedelta(days=1)
-            time_str = time_str.lower().replace("tomorrow", "").strip()
-        elif "today" in time_str.lower():
-            date = today
-            time_str = time_str.lower().replace("today", "").strip()
-        else:
-            # Default to today if only time is specified
-            date = today
-        
-        # Normalize the time string - insert space between number and AM/PM if missing
-        time_str = time_str.strip()
-        
-        # Regular expression to match patterns like "3pm", "3PM", "3p.m.", "3 pm", etc.
-        am_pm_pattern = re.compile(r'(\d+)([aApP]\.?[mM]\.?)')
-        match = am_pm_pattern.search(time_str)
-        
-        if match:
-            # Extract the hour and AM/PM part
-            hour = match.group(1)
-            am_pm = match.group(2).upper().replace('.', '')
-            
-            # Normalize to "3 PM" format
-            if am_pm.startswith('A'):
-                am_pm = 'AM'
-            else:
-                am_pm = 'PM'
-                
-            time_str = f"{hour} {am_pm}"
-            time_format = "%I %p"
-        elif ":" in time_str:
-            # Handle 24-hour format like "15:00"
-            time_format = "%H:%M"
-        else:
-            # Default to 12-hour format
-            time_format = "%I %p"
-        
-        # Parse the time
-        time_obj = datetime.datetime.strptime(time_str, time_format).time()
-        return datetime.datetime.combine(date.date(), time_obj)
-    except Exception as e:
-        print(f"Error parsing time: {e}")
-        print(f"Problematic time string: '{time_str}'")
-        return None
+    """Parse a time string into a datetime object, or None if it can't be parsed."""
+    return parse_time_expression(time_str).value
 
-def check_calendar_availability(time_str):
+def _check_availability(store, parsed):
+    """Check a parsed 1-hour slot against an already loaded calendar store."""
+    if parsed.error:
+        return {"available": False, "error": f"Could not parse time format: {parsed.error}"}
+    
+    meeting_time = parsed.value
+    
+    # Check for conflicts (simple 1-hour slot check)
+    meeting_end = meeting_time + datetime.timedelta(hours=1)
+    
+    conflict = store.find_conflict(meeting_time, meeting_end)
+    if conflict:
+        return {
+            "available": False,
+            "conflict": conflict['title'],
+            "conflict_time": conflict['start_time']
+        }
+    
+    return {"available": True, "time": meeting_time.isoformat()}
+
+@tool("Checks if a time slot is available on the calendar. Returns availability status and details.",
+      resource="calendar")
+def check_calendar_availability(time_str: str):
     """Check if a given time slot is available in the calendar."""
     try:
         # Parse the time string
-        meeting_time = parse_time(time_str)
-        if not meeting_time:
-            return {"available": False, "error": "Could not parse time format"}
-        
-        # Load existing meetings
-        with open(CALENDAR_FILE, 'r') as f:
-            meetings = json.load(f)
+        parsed = parse_time_expression(time_str)
         
-        # Check for conflicts (simple 1-hour slot check)
-        meeting_end = meeting_time + datetime.timedelta(hours=1)
-        
-        for meeting in meetings:
-            start_time = datetime.datetime.fromisoformat(meeting['start_time'])
-            end_time = datetime.datetime.fromisoformat(meeting['end_time'])
-            
-            # Check for overlap
-            if (meeting_time < end_time and meeting_end > start_time):
-                return {
-                    "available": False,
-                    "conflict": meeting['title'],
-                    "conflict_time": meeting['start_time']
-                }
+        # Use the cached, indexed calendar
+        store = get_calendar_store(calendar_file())
         
-        return {"available": True, "time": meeting_time.isoformat()}
+        return _check_availability(store, parsed)
     except Exception as e:
         return {"available": False, "error": str(e)}
 
-def schedule_meeting(person, time_str, title=None):
+@tool("Checks several time slots at once, e.g. {example}. Returns the availability of each slot.",
+      resource="calendar", example={"time_strs": ["tomorrow 2 PM", "tomorrow 3 PM", "tomorrow 4 PM"]})
+def check_calendar_availability_batch(time_strs: list):
+    """
+    Check several 1-hour slots in one call.
+    
+    Every candidate is parsed once, the calendar is loaded once, and all the
+    overlap tests are answered by a single sorted merge over the meetings.
+    """
+    try:
+        # Accept a comma-separated string as well as a list
+        if isinstance(time_strs, str):
+            time_strs = [time_str.strip() for time_str in time_strs.split(",") if time_str.strip()]
+        
+        results = [None] * len(time_strs)
+        candidates = []
+        for i, time_str in enumerate(time_strs):
+            parsed = parse_time_expression(time_str)
+            if parsed.error:
+                results[i] = {"time_str": time_str, "available": False,
+                              "error": f"Could not parse time format: {parsed.error}"}
+            else:
+                candidates.append((parsed.value, i))
+        
+        if candidates:
+            candidates.sort()
+            windows = [
+                (to_epoch(meeting_time), to_epoch(meeting_time + datetime.timedelta(hours=1)))
+                for meeting_time, _ in candidates
+            ]
+            
+            # Only the meetings overlapping the span of all candidates matter
+            store = get_calendar_store(calendar_file())
+            entries = store.overlapping(candidates[0][0], candidates[-1][0] + datetime.timedelta(hours=1))
+            conflicts = sweep_conflicts(entries, windows)
+            
+            for (meeting_time, i), conflict in zip(candidates, conflicts):
+                if conflict:
+                    results[i] = {
+                        "time_str": time_strs[i],
+                        "available": False,
+                        "conflict": conflict['title'],
+                        "conflict_time": conflict['start_time']
+                    }
+                else:
+                    results[i] = {"time_str": time_strs[i], "available": True, "time": meeting_time.isoformat()}
+        
+        return {"results": results}
+    except Exception as e:
+        return {"error": str(e)}
+
+@tool("Schedules a meeting with a person at a specific time. Returns success status and meeting details.",
+      resource="calendar")
+def schedule_meeting(person: str, time_str: str, title: str = None):
     """Schedule a meeting with the given person at the specified time."""
     try:
-        # Check availability first
-        availability = check_calendar_availability(time_str)
-        if not availability.get("available", False):
-            return {"success": False, "reason": "Time slot not available", "details": availability}
-        
-        meeting_time = parse_time(time_str)
-        meeting_end = meeting_time + datetime.timedelta(hours=1)
-        
-        # Create a meeting title if not provided
-        if not title:
-            title = f"Meeting with {person}"
-        
-        # Load existing meetings
-        with open(CALENDAR_FILE, 'r') as f:
-            meetings = json.load(f)
-        
-        # Add the new meeting
-        new_meeting = {
-            "id": len(meetings) + 1,
-            "title": title,
-            "attendee": person,
-            "start_time": meeting_time.isoformat(),
-            "end_time": meeting_end.isoformat(),
-            "created_at": datetime.datetime.now().isoformat()
-        }
-        
-        meetings.append(new_meeting)
-        
-        # Save the updated meetings
-        with open(CALENDAR_FILE, 'w') as f:
-            json.dump(meetings, f, indent=2)
+        parsed = parse_time_expression(time_str)
+        
+        # Resolve the person through the contacts directory
+        contact = resolve_contact(person)
+        if "error" in contact:
+            return {"success": False, "error": contact["error"], "candidates": contact["candidates"]}
+        person = contact["name"]
+        
+        # Lock the calendar so nothing, in this process or another, can take
+        # the slot between check and write
+        with locked_calendar_store(calendar_file()) as store:
+            # Check availability first
+            availability = _check_availability(store, parsed)
+            if not availability.get("available", False):
+                return {"success": False, "reason": "Time slot not available", "details": availability}
+            
+            meeting_time = parsed.value
+            meeting_end = meeting_time + datetime.timedelta(hours=1)
+            
+            # Create a meeting title if not provided
+            if not title:
+                title = f"Meeting with {person}"
+            
+            # Add the new meeting (the store gives it the next id)
+            new_meeting = {
+                "title": title,
+                "attendee": person,
+                "start_time": meeting_time.isoformat(),
+                "end_time": meeting_end.isoformat(),
+                "created_at": datetime.datetime.now().isoformat()
+            }
+            if contact["match"] != "placeholder":
+                new_meeting["attendee_email"] = contact["email"]
+            
+            # Save the updated meetings (writes through the cache)
+            store.append_new(new_meeting)
         
         return {
             "success": True,
@@ -142,23 +166,54 @@ def schedule_meeting(person, time_str, title=None):
     except Exception as e:
         return {"success": False, "error": str(e)}
 
-def get_upcoming_meetings(limit=5):
-    """Get a list of upcoming meetings."""
+@tool("Finds free slots of at least `duration` minutes between two times. Returns the free slots with their start and end times.",
+      resource="calendar")
+def find_free_slots(window_start: str, window_end: str, duration: int = 60, limit: int = 5):
+    """
+    Find free time slots of at least `duration` minutes between two times.
+    
+    Every gap in the window is found in a single sweep over the meetings,
+    so the agent doesn't have to probe one hour at a time.
+    """
     try:
-        # Load existing meetings
-        with open(CALENDAR_FILE, 'r') as f:
-            meetings = json.load(f)
+        start = parse_time_expression(window_start)
+        if start.error:
+            return {"error": f"Could not parse window_start: {start.error}"}
+        end = parse_time_expression(window_end)
+        if end.error:
+            return {"error": f"Could not parse window_end: {end.error}"}
+        if end.value <= start.value:
+            return {"error": "window_end must be after window_start"}
+        
+        duration = int(duration)
+        limit = int(limit)
+        
+        # Sweep the busy intervals inside the window for gaps
+        store = get_calendar_store(calendar_file())
+        busy = store.intervals(start.value, end.value)
+        gaps = free_gaps(busy, to_epoch(start.value), to_epoch(end.value), duration * 60, limit)
         
-        # Sort by start time
-        meetings.sort(key=lambda x: x['start_time'])
+        return {
+            "slots": [
+                {"start": from_epoch(gap_start).isoformat(), "end": from_epoch(gap_end).isoformat()}
+                for gap_start, gap_end in gaps
+            ],
+            "duration_minutes": duration
+        }
+    except Exception as e:
+        return {"error": str(e)}
+
+@tool("Lists the next `limit` meetings on the calendar, soonest first.",
+      resource="calendar")
+def get_upcoming_meetings(limit: int = 5):
+    """Get a list of upcoming meetings."""
+    try:
+        store = get_calendar_store(calendar_file())
         
-        # Filter to only include future meetings
+        # The index is already sorted by start time
         now = datetime.datetime.now()
-        future_meetings = [
-            meeting for meeting in meetings 
-            if datetime.datetime.fromisoformat(meeting['start_time']) > now
-        ]
+        future_meetings = store.upcoming(now, limit)
         
-        return {"meetings": future_meetings[:limit]}
+        return {"meetings": future_meetings}
     except Exception as e:
-        return {"error": str(e)} 
\ No newline at end of file
+        return {"error": str(e)}
\ No newline at end of file
@@ -0,0 +1,470 @@
+import bisect
+import contextlib
+import datetime
+import os
+import threading
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+from functions.safe_write import file_lock
+from functions.storage import FILE_EXTENSIONS, LRUCache, open_records
+
+# Reference point for converting naive meeting datetimes to epoch seconds
+EPOCH = datetime.datetime(1970, 1, 1)
+
+# Above this many intervals free-slot sweeps use NumPy, when it is installed
+NUMPY_SWEEP_THRESHOLD = 1000
+
+# Days kept as occupancy bitmaps, oldest materialized dropped first. 0 (the
+# default) turns the bitmaps off; see benchmarks/availability_bitmap.py.
+BITMAP_DAYS = int(os.environ.get("ASSISTANT_BITMAP_DAYS", "0"))
+
+MINUTES_PER_DAY = 1440
+
+def to_epoch(dt):
+    """Convert a naive datetime to seconds since EPOCH."""
+    return (dt - EPOCH).total_seconds()
+
+def from_epoch(seconds):
+    """Convert seconds since EPOCH back to a naive datetime."""
+    return EPOCH + datetime.timedelta(seconds=seconds)
+
+def _meeting_interval(meeting):
+    """Return the (start, end) epoch seconds of a meeting record."""
+    start_time = datetime.datetime.fromisoformat(meeting['start_time'])
+    end_time = datetime.datetime.fromisoformat(meeting['end_time'])
+    return to_epoch(start_time), to_epoch(end_time)
+
+class CalendarIndex:
+    """
+    Sorted interval index over meeting times.
+
+    Intervals are kept ordered by start time in parallel arrays of epoch
+    seconds. A running maximum of the end times lets an overlap query be
+    answered with a single bisect instead of a scan over every meeting.
+
+    Adding an interval is a list insert into each array, an O(n) memmove,
+    plus an update of the running maximum that stops at the first later
+    interval it doesn't change. The index isn't thread-safe on its own;
+    CalendarStore serializes access to it.
+    """
+
+    def __init__(self, intervals=()):
+        # Sort once up front so bulk loads don't pay for repeated inserts
+        intervals = sorted(intervals, key=lambda interval: interval[0])
+        self._starts = [interval[0] for interval in intervals]
+        self._ends = [interval[1] for interval in intervals]
+        self._items = [interval[2] for interval in intervals]
+        # _max_end[i] is the largest end time among the first i+1 intervals,
+        # and _max_item[i] is the item of the interval that holds it
+        self._max_end = []
+        self._max_item = []
+        for end, item in zip(self._ends, self._items):
+            if self._max_end and self._max_end[-1] >= end:
+                self._max_end.append(self._max_end[-1])
+                self._max_item.append(self._max_item[-1])
+            else:
+                self._max_end.append(end)
+                self._max_item.append(item)
+        # Longest interval seen, which bounds how far back an overlap can start
+        self._max_length = max((end - start for start, end in zip(self._starts, self._ends)), default=0)
+
+    def __len__(self):
+        return len(self._starts)
+
+    def add(self, start, end, item):
+        """Insert an interval given as epoch seconds, keeping the order."""
+        pos = bisect.bisect_right(self._starts, start)
+        self._starts.insert(pos, start)
+        self._ends.insert(pos, end)
+        self._items.insert(pos, item)
+        if pos > 0 and self._max_end[pos - 1] >= end:
+            # An earlier interval reaches further, so no maximum changes
+            self._max_end.insert(pos, self._max_end[pos - 1])
+            self._max_item.insert(pos, self._max_item[pos - 1])
+        else:
+            self._max_end.insert(pos, end)
+            self._max_item.insert(pos, item)
+            # Raise the later maximums until one already reaches as far
+            for i in range(pos + 1, len(self._max_end)):
+                if self._max_end[i] >= end:
+                    break
+                self._max_end[i] = end
+                self._max_item[i] = item
+        self._max_length = max(self._max_length, end - start)
+
+    def find_overlap(self, start, end):
+        """Return the item of an interval overlapping [start, end), or None."""
+        # Only intervals starting before `end` can overlap the window
+        count = bisect.bisect_left(self._starts, end)
+        if count == 0:
+            return None
+
+        # Among those, the one reaching furthest overlaps if any of them does
+        if self._max_end[count - 1] > start:
+            return self._max_item[count - 1]
+        return None
+
+    def entries_between(self, start, end):
+        """Return (start, end, item) for intervals overlapping [start, end), ordered by start."""
+        lo = bisect.bisect_left(self._starts, start - self._max_length)
+        hi = bisect.bisect_left(self._starts, end)
+        return [
+            (self._starts[i], self._ends[i], self._items[i])
+            for i in range(lo, hi)
+            if self._ends[i] > start
+        ]
+
+    def intervals_between(self, start, end):
+        """Return the (start, end) pairs overlapping [start, end), ordered by start."""
+        return [(entry_start, entry_end) for entry_start, entry_end, _ in self.entries_between(start, end)]
+
+    def items_after(self, start, limit=None):
+        """Return items whose interval starts after the given time, in start order."""
+        pos = bisect.bisect_right(self._starts, start)
+        end = len(self._items) if limit is None else pos + limit
+        return self._items[pos:end]
+
+class OccupancyBitmaps:
+    """
+    Per-day bitmaps of busy minutes over a CalendarIndex.
+
+    Each day is an int with one bit per minute since midnight (1440 bits).
+    A day is materialized from the index the first time it is probed and
+    then kept up to date as meetings are added, so testing a window is a
+    masked AND with no bisect and no ISO parsing. Meetings are rounded out to
+    whole minutes, which makes the bitmaps a conservative filter: a clear
+    window is certainly free, while a busy one still has to be confirmed
+    against the index.
+    """
+
+    def __init__(self, index, max_days=366):
+        self.index = index
+        self.max_days = max_days
+        # Day number since EPOCH -> bitmap, oldest materialized first
+        self._days = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._days)
+
+    def is_free(self, start, end):
+        """
+        Return True if nothing overlaps a window, given as timedeltas since EPOCH.
+
+        False means the window is busy or spans more than two days; callers
+        fall back to the interval index for those.
+        """
+        day = start.days
+        first = start.seconds // 60
+        # Round the end up to a whole minute
+        last = (end.days - day) * MINUTES_PER_DAY - (-end.seconds - (end.microseconds > 0)) // 60
+        if last <= first or last > 2 * MINUTES_PER_DAY:
+            # Long windows are rare; the index answers them just as well
+            return False
+
+        bits = self._days.get(day)
+        if bits is None:
+            bits = self._materialize(day)
+        if last > MINUTES_PER_DAY:
+            # The window runs past midnight into the next day
+            next_bits = self._days.get(day + 1)
+            if next_bits is None:
+                next_bits = self._materialize(day + 1)
+            bits |= next_bits << MINUTES_PER_DAY
+        return not bits >> first & ((1 << (last - first)) - 1)
+
+    def add(self, start, end):
+        """Mark [start, end), given as epoch seconds, busy on the days already materialized."""
+        first = int(start // 60)
+        last = -int(-end // 60)
+        with self._lock:
+            for day in range(first // MINUTES_PER_DAY, (last - 1) // MINUTES_PER_DAY + 1):
+                if day in self._days:
+                    self._days[day] |= _minute_mask(day, first, last)
+
+    def _materialize(self, day):
+        """Build the bitmap of a day from the index and keep it."""
+        with self._lock:
+            bits = self._days.get(day)
+            if bits is not None:
+                return bits
+            bits = 0
+            day_start = day * MINUTES_PER_DAY
+            for start, end, _ in self.index.entries_between(day_start * 60, (day_start + MINUTES_PER_DAY) * 60):
+                bits |= _minute_mask(day, int(start // 60), -int(-end // 60))
+            if len(self._days) >= self.max_days:
+                # Dicts keep insertion order, so this drops the oldest day
+                del self._days[next(iter(self._days))]
+            self._days[day] = bits
+            return bits
+
+def _minute_mask(day, first, last):
+    """Return the bits of minutes [first, last) that fall on the given day."""
+    day_start = day * MINUTES_PER_DAY
+    lo = max(first, day_start) - day_start
+    hi = min(last, day_start + MINUTES_PER_DAY) - day_start
+    return ((1 << (hi - lo)) - 1) << lo if hi > lo else 0
+
+class CalendarStore:
+    """A set of meetings with an interval index for conflict checks, guarded by `lock`."""
+
+    def __init__(self, meetings=None, path=None, bitmap_days=BITMAP_DAYS):
+        self.meetings = list(meetings or [])
+        self.index = CalendarIndex(
+            (*_meeting_interval(meeting), meeting) for meeting in self.meetings
+        )
+        # Answers availability probes of free slots without touching the index
+        self.occupancy = OccupancyBitmaps(self.index, bitmap_days) if bitmap_days else None
+        self.path = path
+        self.signature = None
+        # Held by callers that need a check-then-append to be atomic
+        self.lock = threading.RLock()
+
+    @classmethod
+    def load(cls, path):
+        """Build a store from a calendar record file."""
+        # Opening the records creates the file if it doesn't exist yet
+        records = open_records(path)
+        signature = _file_signature(path)
+        store = cls(records.load(), path=path)
+        store.signature = signature
+        return store
+
+    def count(self):
+        """Return the number of meetings."""
+        return len(self.meetings)
+
+    def add(self, meeting):
+        """Add a meeting record to the store and its index."""
+        start, end = _meeting_interval(meeting)
+        with self.lock:
+            self.meetings.append(meeting)
+            self.index.add(start, end, meeting)
+            if self.occupancy is not None:
+                self.occupancy.add(start, end)
+
+    def append_new(self, meeting):
+        """Write a meeting to the calendar file with the next id, add it, and return it."""
+        with file_lock(self.path), self.lock:
+            meeting = open_records(self.path).append_new(meeting)
+            self.add(meeting)
+            # Remember our own write so it doesn't trigger a reload
+            self.signature = _file_signature(self.path)
+        notify_write(self.path)
+        return meeting
+
+    def find_conflict(self, start_time, end_time):
+        """Return a meeting overlapping the given datetimes, or None."""
+        # Queries hold the lock as well: add() updates the index's parallel
+        # lists one after another, and a query in between would read lists
+        # of different lengths
+        with self.lock:
+            if self.occupancy is None:
+                return self.index.find_overlap(to_epoch(start_time), to_epoch(end_time))
+            start, end = start_time - EPOCH, end_time - EPOCH
+            # A clear bitmap settles it; otherwise the index finds the meeting
+            if self.occupancy.is_free(start, end):
+                return None
+            return self.index.find_overlap(start.total_seconds(), end.total_seconds())
+
+    def upcoming(self, after, limit=None):
+        """Return meetings starting after the given datetime, earliest first."""
+        with self.lock:
+            return self.index.items_after(to_epoch(after), limit)
+
+    def intervals(self, start_time, end_time):
+        """Return epoch (start, end) pairs of meetings overlapping a window, by start."""
+        with self.lock:
+            return self.index.intervals_between(to_epoch(start_time), to_epoch(end_time))
+
+    def overlapping(self, start_time, end_time):
+        """Return epoch (start, end, meeting) entries overlapping a window, by start."""
+        with self.lock:
+            return self.index.entries_between(to_epoch(start_time), to_epoch(end_time))
+
+class SqliteCalendarStore:
+    """Calendar store that answers conflict and upcoming queries with SQL."""
+
+    def __init__(self, records):
+        self.records = records
+        # Held by callers that need a check-then-append to be atomic
+        self.lock = threading.RLock()
+
+    def count(self):
+        """Return the number of meetings."""
+        return self.records.count()
+
+    def append_new(self, meeting):
+        """Insert a meeting with the next id, and return it."""
+        with self.lock:
+            meeting = self.records.append_new(meeting)
+        notify_write(self.records.path)
+        return meeting
+
+    def find_conflict(self, start_time, end_time):
+        """Return a meeting overlapping the given datetimes, or None."""
+        # ISO strings of naive datetimes sort the same way as the datetimes
+        meetings = self.records.query(
+            where='"start_time" < ? AND "end_time" > ?',
+            params=(end_time.isoformat(), start_time.isoformat()),
+            order_by='"start_time"',
+            limit=1
+        )
+        return meetings[0] if meetings else None
+
+    def upcoming(self, after, limit=None):
+        """Return meetings starting after the given datetime, earliest first."""
+        return self.records.query(
+            where='"start_time" > ?',
+            params=(after.isoformat(),),
+            order_by='"start_time"',
+            limit=limit
+        )
+
+    def intervals(self, start_time, end_time):
+        """Return epoch (start, end) pairs of meetings overlapping a window, by start."""
+        return [(start, end) for start, end, _ in self.overlapping(start_time, end_time)]
+
+    def overlapping(self, start_time, end_time):
+        """Return epoch (start, end, meeting) entries overlapping a window, by start."""
+        meetings = self.records.query(
+            where='"start_time" < ? AND "end_time" > ?',
+            params=(end_time.isoformat(), start_time.isoformat()),
+            order_by='"start_time"'
+        )
+        return [(*_meeting_interval(meeting), meeting) for meeting in meetings]
+
+def free_gaps(intervals, window_start, window_end, min_length, limit=None):
+    """
+    Return the free (start, end) gaps of at least `min_length` seconds.
+
+    `intervals` are busy (start, end) epoch pairs sorted by start. The gaps
+    are found in one sweep that tracks how far the busy time reaches.
+    """
+    if np is not None and len(intervals) > NUMPY_SWEEP_THRESHOLD:
+        return _free_gaps_numpy(intervals, window_start, window_end, min_length, limit)
+
+    gaps = []
+    cursor = window_start
+    for start, end in intervals:
+        if start - cursor >= min_length:
+            gaps.append((cursor, min(start, window_end)))
+            if limit is not None and len(gaps) >= limit:
+                return gaps
+        cursor = max(cursor, end)
+    if window_end - cursor >= min_length:
+        gaps.append((cursor, window_end))
+    return gaps[:limit]
+
+def sweep_conflicts(entries, windows):
+    """
+    Find a conflicting entry for each of several windows in one merge pass.
+
+    `entries` are (start, end, item) tuples sorted by start and `windows`
+    are (start, end) pairs sorted by start with non-decreasing ends. Returns
+    the overlapping item (or None) for each window, in window order.
+    """
+    conflicts = []
+    pos = 0
+    reach_end = None
+    reach_item = None
+    for window_start, window_end in windows:
+        # Take in every entry that starts before this window ends, keeping
+        # the one that reaches furthest
+        while pos < len(entries) and entries[pos][0] < window_end:
+            if reach_end is None or entries[pos][1] > reach_end:
+                reach_end, reach_item = entries[pos][1], entries[pos][2]
+            pos += 1
+        conflicts.append(reach_item if reach_end is not None and reach_end > window_start else None)
+    return conflicts
+
+def _free_gaps_numpy(intervals, window_start, window_end, min_length, limit=None):
+    """Vectorized version of free_gaps for large calendars."""
+    busy = np.asarray(intervals, dtype=np.float64).reshape(-1, 2)
+    starts, ends = busy[:, 0], busy[:, 1]
+
+    # Each gap runs from the furthest end reached so far to the next start
+    reach = np.maximum.accumulate(np.concatenate(([window_start], ends)))
+    gap_starts = reach
+    gap_ends = np.minimum(np.concatenate((starts, [window_end])), window_end)
+
+    keep = np.flatnonzero(gap_ends - gap_starts >= min_length)
+    if limit is not None:
+        keep = keep[:limit]
+    return [(float(gap_starts[i]), float(gap_ends[i])) for i in keep]
+
+# Callbacks run with the calendar path whenever a calendar changes
+_write_listeners = []
+
+def add_write_listener(callback):
+    """Register a callback to run whenever a calendar is written or changes on disk."""
+    _write_listeners.append(callback)
+
+def remove_write_listener(callback):
+    """Unregister a callback added with add_write_listener."""
+    if callback in _write_listeners:
+        _write_listeners.remove(callback)
+
+def notify_write(path):
+    """Tell the write listeners that a calendar changed."""
+    for callback in list(_write_listeners):
+        callback(path)
+
+def _file_signature(file):
+    """Return the (mtime, size) pair used to detect changes to a file."""
+    stat = os.stat(file)
+    return (stat.st_mtime_ns, stat.st_size)
+
+# Process-wide cache of loaded calendars, keyed by file path; the least
+# recently used are dropped when there are more than MAX_OPEN_STORES
+_stores = LRUCache()
+_stores_lock = threading.Lock()
+
+def get_calendar_store(path):
+    """
+    Return the cached store for a calendar file.
+
+    The file is only parsed again when its mtime or size has changed since
+    it was loaded or last written through this process. SQLite calendars
+    are queried directly.
+    """
+    # The global lock only guards the cache itself: waiting for a store's
+    # lock or loading a file under it would hold up every other calendar
+    with _stores_lock:
+        store = _stores.get(path)
+        if path.endswith(FILE_EXTENSIONS["sqlite"]):
+            # SQLite answers queries itself, there is nothing to cache
+            if store is None:
+                store = SqliteCalendarStore(open_records(path))
+                _stores.put(path, store)
+            return store
+    if store is not None:
+        # Don't compare against a file that is halfway through a write
+        with store.lock:
+            if store.signature == _file_signature(path):
+                return store
+    loaded = CalendarStore.load(path)
+    with _stores_lock:
+        _stores.put(path, loaded)
+    if store is not None:
+        # Someone else (another process, or a reset) rewrote the file
+        notify_write(path)
+    return loaded
+
+@contextlib.contextmanager
+def locked_calendar_store(path):
+    """
+    Yield the store for a calendar file with its lock and the file's lock held.
+
+    The store is fetched after taking the file lock, so it includes every
+    write made so far by any process, and nothing else can write until the
+    block ends. Use it to make a check and the write that depends on it
+    atomic.
+    """
+    with file_lock(path):
+        store = get_calendar_store(path)
+        with store.lock:
+            yield store
@@ -0,0 +1,283 @@
+import bisect
+import csv
+import itertools
+import os
+import re
+import threading
+import unicodedata
+from functions.storage import DATA_DIR, LRUCache, current_tenant, tenant_dir
+
+# The shared contacts directory: a CSV export or a vCard file. Users can
+# have their own contacts.csv or contacts.vcf in their data directory.
+CONTACTS_FILE = os.environ.get("ASSISTANT_CONTACTS")
+CONTACT_FILE_NAMES = ("contacts.csv", "contacts.vcf")
+
+# How many candidates an ambiguous name lists
+MAX_CANDIDATES = 5
+
+# How many spellings of a mistyped name are tried
+MAX_FUZZY_NAMES = 64
+
+# CSV headers that hold the name and address, in order of preference
+# (plain exports, Outlook and Google Contacts)
+_NAME_HEADERS = ("name", "full name", "display name", "fn")
+_FIRST_NAME_HEADERS = ("first name", "given name")
+_LAST_NAME_HEADERS = ("last name", "family name", "surname")
+_EMAIL_HEADERS = ("email", "e-mail", "email address", "e-mail address", "e-mail 1 - value", "email 1")
+
+_APOSTROPHES = re.compile(r"['\u2019]")
+_NON_ALPHANUMERIC = re.compile(r'[^0-9a-z]+')
+
+def normalize_name(name):
+    """Fold case, accents and punctuation: "José O'Neil-Ruiz" -> "jose oneil ruiz"."""
+    name = unicodedata.normalize("NFKD", name)
+    name = "".join(char for char in name if not unicodedata.combining(char))
+    return _NON_ALPHANUMERIC.sub(" ", _APOSTROPHES.sub("", name.casefold())).strip()
+
+def placeholder_address(name):
+    """Make up an address from a name, for when there is no contacts directory."""
+    # Remove any non-alphanumeric characters and convert to lowercase
+    email_name = re.sub(r'[^a-zA-Z0-9]', '', name.lower())
+    return f"{email_name}@example.com"
+
+def _pick(row, headers):
+    """Return the first non-empty value among some (lowercased) CSV headers."""
+    for header in headers:
+        value = row.get(header)
+        if value and value.strip():
+            return value.strip()
+    return None
+
+def read_csv_contacts(path):
+    """Yield {"name", "email"} for each row of a CSV file with a name and an email column."""
+    with open(path, 'r', newline='', encoding='utf-8-sig') as f:
+        for row in csv.DictReader(f):
+            row = {(key or "").strip().lower(): value for key, value in row.items()}
+            email = _pick(row, _EMAIL_HEADERS)
+            name = _pick(row, _NAME_HEADERS) or " ".join(
+                part for part in (_pick(row, _FIRST_NAME_HEADERS), _pick(row, _LAST_NAME_HEADERS)) if part)
+            if name and email:
+                yield {"name": name, "email": email}
+
+def _vcard_value(value):
+    """Undo vCard escaping in a property value."""
+    return re.sub(r'\\([\\,;nN])', lambda m: "\n" if m.group(1) in "nN" else m.group(1), value)
+
+def read_vcard_contacts(path):
+    """Yield {"name", "email"} for each card in a vCard file, using its first EMAIL."""
+    with open(path, 'r', encoding='utf-8-sig') as f:
+        # Unfold continuation lines, which start with a space or tab
+        lines = []
+        for line in f:
+            line = line.rstrip("\r\n")
+            if line[:1] in (" ", "\t") and lines:
+                lines[-1] += line[1:]
+            else:
+                lines.append(line)
+
+    card = None
+    for line in lines:
+        key, _, value = line.partition(":")
+        # Drop parameters (EMAIL;TYPE=work) and groups (item1.EMAIL)
+        prop = key.split(";", 1)[0].rsplit(".", 1)[-1].upper()
+        if prop == "BEGIN" and value.upper() == "VCARD":
+            card = {}
+        elif prop == "END" and card is not None:
+            name = card.get("FN") or " ".join(part for part in reversed(card.get("N", "").split(";")[:2]) if part)
+            if name and card.get("EMAIL"):
+                yield {"name": _vcard_value(name).strip(), "email": card["EMAIL"].strip()}
+            card = None
+        elif card is not None and prop in ("FN", "N", "EMAIL"):
+            card.setdefault(prop, value)
+
+def read_contacts(path):
+    """Read the contacts in a .csv or .vcf file."""
+    if path.lower().endswith((".vcf", ".vcard")):
+        return list(read_vcard_contacts(path))
+    return list(read_csv_contacts(path))
+
+def _deletes(word):
+    """Return a word and every variant of it with one letter removed."""
+    return {word} | {word[:i] + word[i + 1:] for i in range(len(word))}
+
+class ContactDirectory:
+    """
+    Name-to-address lookups over a list of contacts.
+
+    Each contact is indexed under its normalized full name and under every
+    tail of it that starts at a word ("john smith", "smith"), so a last
+    name on its own is found too. Lookups try, in order:
+
+    - an exact match on a name or an address (a hash lookup)
+    - names starting with what was typed, so "john sm" finds "John Smith"
+      (a binary search over the sorted name keys)
+    - the same again with words one typo away from what was typed: a
+      letter missing, extra, wrong or swapped with its neighbour. Results
+      are cached.
+    """
+
+    def __init__(self, contacts, signature=None):
+        self.contacts = contacts
+        self.signature = signature
+        self._index = {}
+        for position, contact in enumerate(contacts):
+            words = normalize_name(contact["name"]).split()
+            for start in range(len(words)):
+                self._index.setdefault(" ".join(words[start:]), []).append(position)
+            self._index.setdefault(contact["email"].lower(), []).append(position)
+        # Sorted keys stand in for a prefix trie: the keys starting with a
+        # prefix are one contiguous run, found by binary search, and they
+        # take a fraction of a trie's memory at 100k+ contacts
+        self._keys = sorted(self._index)
+
+        # Built on the first lookup that needs it, since most never do
+        self._typo_index = None
+        self._typo_index_lock = threading.Lock()
+        self._fuzzy_cache = LRUCache(maxsize=4096)
+
+    @classmethod
+    def load(cls, path):
+        """Read a CSV or vCard file into a directory."""
+        stat = os.stat(path)
+        return cls(read_contacts(path), (stat.st_mtime_ns, stat.st_size))
+
+    def __len__(self):
+        return len(self.contacts)
+
+    def _contacts_at(self, positions):
+        """Return the contacts at some positions, without repeats, in directory order."""
+        return [self.contacts[position] for position in sorted(set(positions))]
+
+    def _prefix_matches(self, prefix):
+        """Return the positions of contacts with a name key starting with `prefix`."""
+        positions = []
+        for i in range(bisect.bisect_left(self._keys, prefix), len(self._keys)):
+            key = self._keys[i]
+            if not key.startswith(prefix):
+                break
+            positions.extend(self._index[key])
+            if len(set(positions)) > MAX_CANDIDATES:
+                break
+        return positions
+
+    def _lookup(self, key):
+        """Return (match, positions) for a normalized name, without correcting it."""
+        positions = self._index.get(key)
+        if positions:
+            return "exact", positions
+        positions = self._prefix_matches(key)
+        return ("prefix", positions) if positions else (None, [])
+
+    def _similar_words(self, word):
+        """Return the words in the directory at most one typo away from `word`."""
+        if self._typo_index is None:
+            with self._typo_index_lock:
+                if self._typo_index is None:
+                    # Symmetric deletes: two words are one edit apart when
+                    # removing at most one letter from each makes them equal
+                    typo_index = {}
+                    words = {word for key in self._index if "@" not in key for word in key.split()}
+                    for known in words:
+                        for variant in _deletes(known):
+                            # Most variants belong to one word; only store a tuple when shared
+                            existing = typo_index.get(variant)
+                            if existing is None:
+                                typo_index[variant] = known
+                            elif isinstance(existing, str):
+                                typo_index[variant] = (existing, known)
+                            else:
+                                typo_index[variant] = existing + (known,)
+                    self._typo_index = typo_index
+        similar = set()
+        for variant in _deletes(word):
+            found = self._typo_index.get(variant, ())
+            if isinstance(found, str):
+                similar.add(found)
+            else:
+                similar.update(found)
+        return similar
+
+    def _fuzzy_matches(self, key):
+        """Return the positions of contacts matching a name with up to one typo per word."""
+        positions = self._fuzzy_cache.get(key)
+        if positions is None:
+            options = [sorted(self._similar_words(word)) for word in key.split()]
+            positions = []
+            for words in itertools.islice(itertools.product(*options), MAX_FUZZY_NAMES):
+                positions.extend(self._lookup(" ".join(words))[1])
+                if len(set(positions)) > MAX_CANDIDATES:
+                    break
+            self._fuzzy_cache.put(key, positions)
+        return positions
+
+    def find(self, name):
+        """Return (match, contacts) for a name or address; match is "exact", "prefix", "fuzzy" or None."""
+        key = name.strip().lower() if "@" in name else normalize_name(name)
+        if not key:
+            return None, []
+        match, positions = self._lookup(key)
+        if not positions and "@" not in key:
+            positions = self._fuzzy_matches(key)
+            match = "fuzzy" if positions else None
+        return match, self._contacts_at(positions)
+
+# Process-wide cache of loaded directories, keyed by file path
+_directories = LRUCache()
+_directories_lock = threading.Lock()
+
+def contacts_file():
+    """Return the contacts file of the current user, or the shared one; None if there is none."""
+    tenant = current_tenant()
+    directories = ([tenant_dir(tenant)] if tenant else []) + [DATA_DIR]
+    for directory in directories:
+        if directory == DATA_DIR and CONTACTS_FILE:
+            return CONTACTS_FILE if os.path.exists(CONTACTS_FILE) else None
+        for file_name in CONTACT_FILE_NAMES:
+            path = os.path.join(directory, file_name)
+            if os.path.exists(path):
+                return path
+    return None
+
+def get_contact_directory(path=None):
+    """
+    Return the cached directory for a contacts file (by default the current
+    user's), reloading it when the file has changed. None if there is no file.
+    """
+    path = path or contacts_file()
+    if path is None:
+        return None
+    stat = os.stat(path)
+    with _directories_lock:
+        directory = _directories.get(path)
+    if directory is not None and directory.signature == (stat.st_mtime_ns, stat.st_size):
+        return directory
+    # Parse outside the lock, so a large file doesn't hold up other users' lookups
+    directory = ContactDirectory.load(path)
+    with _directories_lock:
+        _directories.put(path, directory)
+    return directory
+
+def resolve_contact(name):
+    """
+    Resolve a name (or part of one, or an address) to a single contact.
+
+    Returns {"name", "email", "match"}, or {"error", "candidates"} when the
+    name matches nobody or several people. Without a contacts file, names
+    get a made-up @example.com address.
+    """
+    directory = get_contact_directory()
+    if directory is None or not len(directory):
+        if "@" in name:
+            return {"name": name, "email": name, "match": "address"}
+        return {"name": name, "email": placeholder_address(name), "match": "placeholder"}
+
+    match, contacts = directory.find(name)
+    if not contacts:
+        if "@" in name:
+            # An address that isn't in the directory is still an address
+            return {"name": name, "email": name, "match": "address"}
+        return {"error": f"No contact matches '{name}'", "candidates": []}
+    if len(contacts) > 1:
+        candidates = [f"{contact['name']} <{contact['email']}>" for contact in contacts[:MAX_CANDIDATES]]
+        return {"error": f"'{name}' matches several contacts: {', '.join(candidates)}", "candidates": candidates}
+    return {"name": contacts[0]["name"], "email": contacts[0]["email"], "match": match}
@@ -0,0 +1,360 @@
+import atexit
+import contextlib
+import datetime
+import glob
+import logging
+import os
+import queue
+import random
+import smtplib
+import threading
+import time
+from email.message import EmailMessage
+from email.utils import formatdate
+from functions.metrics import metrics
+from functions.safe_write import file_lock
+from functions.storage import DATA_DIR, data_file, open_records
+
+# How send_email delivers: "log" only records the email as sent (the
+# default), "queue" records it as queued and hands it to the background
+# SMTP workers
+DELIVERY_MODE = os.environ.get("EMAIL_DELIVERY", "log").lower()
+
+# SMTP relay and delivery settings for the "queue" mode
+SMTP_SETTINGS = {
+    "host": os.environ.get("SMTP_HOST", "localhost"),
+    "port": int(os.environ.get("SMTP_PORT", "25")),
+    "username": os.environ.get("SMTP_USER") or None,
+    "password": os.environ.get("SMTP_PASSWORD") or None,
+    "starttls": os.environ.get("SMTP_STARTTLS") == "1",
+    "sender": os.environ.get("SMTP_FROM", "assistant@example.com")
+}
+DELIVERY_SETTINGS = {
+    "workers": int(os.environ.get("EMAIL_WORKERS", "2")),
+    "batch_size": int(os.environ.get("EMAIL_BATCH_SIZE", "50")),
+    "max_attempts": int(os.environ.get("EMAIL_MAX_ATTEMPTS", "5")),
+    "retry_delay": float(os.environ.get("EMAIL_RETRY_DELAY", "1.0"))
+}
+
+# Statuses an email goes through in the log
+QUEUED, RETRYING, SENT, FAILED = "queued", "retrying", "sent", "failed"
+
+logger = logging.getLogger("assistant.email_delivery")
+
+class SMTPConnectionPool:
+    """
+    Persistent SMTP connections shared by the delivery workers.
+
+    A connection is checked out for a whole batch and then returned, so a
+    batch costs one connect and one login at most. Connections that have
+    been idle longer than `max_idle` seconds are checked with NOOP before
+    they are reused, and ones that fail are dropped.
+    """
+
+    def __init__(self, host, port, size=2, username=None, password=None, starttls=False,
+                 timeout=10.0, max_idle=30.0):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.opened = 0
+        self._idle = queue.LifoQueue(maxsize=size)
+
+    def _connect(self):
+        """Open and log in a new connection."""
+        smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            if self.starttls:
+                smtp.starttls()
+            if self.username:
+                smtp.login(self.username, self.password or "")
+        except BaseException:
+            smtp.close()
+            raise
+        self.opened += 1
+        return smtp
+
+    def _checkout(self):
+        """Return an idle connection that still works, or a new one."""
+        while True:
+            try:
+                smtp, idle_since = self._idle.get_nowait()
+            except queue.Empty:
+                return self._connect()
+            if time.monotonic() - idle_since < self.max_idle:
+                return smtp
+            try:
+                if smtp.noop()[0] == 250:
+                    return smtp
+            except (smtplib.SMTPException, OSError):
+                pass
+            smtp.close()
+
+    @contextlib.contextmanager
+    def connection(self):
+        """Check out a connection for the duration of the block."""
+        smtp = self._checkout()
+        try:
+            yield smtp
+        except BaseException:
+            # The connection is gone, or left mid-transaction by an error the
+            # block didn't handle; don't hand it out again
+            smtp.close()
+            raise
+        try:
+            self._idle.put_nowait((smtp, time.monotonic()))
+        except queue.Full:
+            with contextlib.suppress(smtplib.SMTPException, OSError):
+                smtp.quit()
+
+    def close(self):
+        """Close every idle connection."""
+        while True:
+            try:
+                smtp, _ = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            with contextlib.suppress(smtplib.SMTPException, OSError):
+                smtp.quit()
+
+def build_message(email, sender):
+    """Turn an email log record into a MIME message."""
+    message = EmailMessage()
+    message["From"] = sender
+    message["To"] = email["to"]
+    message["Subject"] = email["subject"]
+    message["Date"] = formatdate(localtime=True)
+    message["Message-ID"] = email["message_id"]
+    message.set_content(email["body"])
+    return message
+
+def _process_alive(pid):
+    """Return True if a process id belongs to a running process."""
+    if not isinstance(pid, int):
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, OSError):
+        # It exists but belongs to someone else, or we can't tell
+        return True
+    return True
+
+def email_logs():
+    """Return the shared email log and every user's, for the configured storage backend."""
+    shared = data_file("emails")
+    users = glob.glob(os.path.join(DATA_DIR, "tenants", "*", "*", os.path.basename(shared)))
+    return [path for path in [shared] + sorted(users) if os.path.exists(path)]
+
+def _is_permanent(error):
+    """Return True for SMTP errors that retrying won't fix (5xx replies)."""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(code >= 500 for code, _ in error.recipients.values())
+    return isinstance(error, smtplib.SMTPResponseException) and error.smtp_code >= 500
+
+class EmailQueue:
+    """
+    Delivers queued emails over SMTP from a pool of background threads.
+
+    send_email writes the email to the log as queued and calls enqueue(),
+    which returns at once. Each worker takes up to `batch_size` emails off
+    the queue and sends them over one pooled connection. Temporary
+    failures (4xx replies, lost connections) are retried after an
+    exponential backoff with jitter, up to `max_attempts` tries; 5xx
+    replies fail the email straight away. Each batch's new statuses are
+    written back to the email logs in one write per log.
+    """
+
+    def __init__(self, pool, sender, workers=2, batch_size=50, max_attempts=5, retry_delay=1.0):
+        self.pool = pool
+        self.sender = sender
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self._queue = queue.Queue()
+        self._pending = 0
+        self._pending_lock = threading.Condition()
+        self._threads = [
+            threading.Thread(target=self._run, name=f"email-delivery-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def enqueue(self, path, email, attempt=0):
+        """Queue an email record from the log at `path` for delivery."""
+        with self._pending_lock:
+            self._pending += 1
+        self._queue.put((path, email, attempt))
+
+    def requeue_pending(self, path):
+        """
+        Queue the emails in a log left waiting by a process that has stopped, e.g. after a restart or crash.
+
+        Each queued email records the process that queued it ("queued_by").
+        The emails of processes that are no longer running are claimed for
+        this one under the log's lock, so two processes starting together
+        don't both send them.
+        """
+        records = open_records(path)
+        with file_lock(path):
+            orphaned = [dict(email, queued_by=os.getpid()) for email in records.load()
+                        if email.get("status") in (QUEUED, RETRYING) and not _process_alive(email.get("queued_by"))]
+            if orphaned:
+                records.replace(orphaned)
+        for email in orphaned:
+            self.enqueue(path, email, email.get("attempts", 0))
+        return len(orphaned)
+
+    def _run(self):
+        """Deliver batches until a None sentinel arrives."""
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    # Put the sentinel back for after this batch
+                    self._queue.put(None)
+                    break
+                batch.append(item)
+            try:
+                self._deliver(batch)
+            except Exception:
+                logger.exception("Email delivery batch failed")
+            finally:
+                with self._pending_lock:
+                    self._pending -= len(batch)
+                    self._pending_lock.notify_all()
+
+    def _deliver(self, batch):
+        """Send a batch over one connection and write the outcomes back to the logs."""
+        outcomes = []
+        sent = 0
+        try:
+            with self.pool.connection() as smtp:
+                for path, email, attempt in batch:
+                    try:
+                        smtp.send_message(build_message(email, self.sender))
+                    except (smtplib.SMTPRecipientsRefused, smtplib.SMTPDataError,
+                            smtplib.SMTPSenderRefused) as e:
+                        # The server refused this message; the connection is still good
+                        outcomes.append((path, email, attempt, e))
+                    else:
+                        outcomes.append((path, email, attempt, None))
+                    sent += 1
+        except (smtplib.SMTPException, OSError) as e:
+            # Lost or couldn't open the connection: everything not yet sent is retried
+            outcomes.extend((path, email, attempt, e) for path, email, attempt in batch[sent:])
+
+        updates = {}
+        for path, email, attempt, error in outcomes:
+            updates.setdefault(path, []).append(self._outcome(path, email, attempt + 1, error))
+        for path, emails in updates.items():
+            open_records(path).replace(emails)
+
+    def _outcome(self, path, email, attempts, error):
+        """Return the email record updated with a delivery outcome, queueing a retry if needed."""
+        email = dict(email, attempts=attempts)
+        if error is None:
+            email.update(status=SENT, sent_at=datetime.datetime.now().isoformat())
+            email.pop("last_error", None)
+        elif _is_permanent(error) or attempts >= self.max_attempts:
+            email.update(status=FAILED, last_error=str(error))
+        else:
+            delay = self.retry_delay * 2 ** (attempts - 1) * random.uniform(0.5, 1.5)
+            email.update(status=RETRYING, last_error=str(error))
+            self._schedule_retry(path, email, attempts, delay)
+        metrics.inc("email_deliveries_total", status=email["status"])
+        return email
+
+    def _schedule_retry(self, path, email, attempts, delay):
+        """Queue an email again after `delay` seconds."""
+        with self._pending_lock:
+            self._pending += 1
+
+        def retry():
+            self._queue.put((path, email, attempts))
+
+        timer = threading.Timer(delay, retry)
+        timer.daemon = True
+        timer.start()
+
+    def pending(self):
+        """Return how many emails are queued, being sent or waiting for a retry."""
+        with self._pending_lock:
+            return self._pending
+
+    def wait(self, timeout=None):
+        """Wait until nothing is pending; return False if the timeout ran out first."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._pending_lock:
+            while self._pending:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._pending_lock.wait(remaining)
+        return True
+
+    def close(self, timeout=10.0):
+        """Deliver what's queued (waiting up to `timeout` seconds), then stop the workers."""
+        self.wait(timeout)
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join(timeout)
+        self.pool.close()
+
+_email_queue = None
+_email_queue_lock = threading.Lock()
+
+def _new_queue(settings):
+    """Create a queue and its connection pool from SMTP_SETTINGS and DELIVERY_SETTINGS keys."""
+    smtp = {key: settings.get(key, value) for key, value in SMTP_SETTINGS.items()}
+    delivery = {key: settings.get(key, value) for key, value in DELIVERY_SETTINGS.items()}
+    sender = smtp.pop("sender")
+    outbox = EmailQueue(SMTPConnectionPool(size=delivery["workers"], **smtp), sender, **delivery)
+    # Pick up what a stopped or crashed process left undelivered
+    for path in email_logs():
+        recovered = outbox.requeue_pending(path)
+        if recovered:
+            logger.info("Requeued %d undelivered emails from %s", recovered, path)
+    return outbox
+
+def configure_email_queue(**settings):
+    """
+    Start queued delivery with the given settings, replacing any running queue.
+
+    Accepts the SMTP_SETTINGS and DELIVERY_SETTINGS keys; the rest come
+    from the environment. Returns the new queue.
+    """
+    global _email_queue
+    with _email_queue_lock:
+        old, _email_queue = _email_queue, _new_queue(settings)
+    if old is not None:
+        old.close()
+    return _email_queue
+
+def get_email_queue():
+    """Return the delivery queue, or None when emails are only logged."""
+    global _email_queue
+    if _email_queue is None and DELIVERY_MODE == "queue":
+        with _email_queue_lock:
+            if _email_queue is None:
+                _email_queue = _new_queue({})
+    return _email_queue
+
+@atexit.register
+def _drain_on_exit():
+    """Give queued emails a chance to go out before the process exits."""
+    if _email_queue is not None:
+        _email_queue.close()
@@ -1,85 +1,100 @@
 import datetime
-import json
 import os
-import re
+from email.utils import make_msgid
+from functions.contacts import resolve_contact
+from functions.email_delivery import QUEUED, SENT, get_email_queue
+from functions.registry import tool
+from functions.storage import current_tenant, data_file, open_records
 
 # Path to store our mock data
-DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data')
-EMAIL_FILE = os.path.join(DATA_DIR, 'emails.json')
-
-# Ensure the data directory exists
-os.makedirs(DATA_DIR, exist_ok=True)
+EMAIL_FILE = data_file('emails')
 
 # Initialize the email file if it doesn't exist
-if not os.path.exists(EMAIL_FILE):
-    with open(EMAIL_FILE, 'w') as f:
-        json.dump([], f)
+open_records(EMAIL_FILE)
 
-def get_email_from_name(name):
-    """
-    Simple function that converts a name to an email address.
-    In a real app, this would query a contacts database.
-    """
-    # Remove any non-alphanumeric characters and convert to lowercase
-    email_name = re.sub(r'[^a-zA-Z0-9]', '', name.lower())
-    return f"{email_name}@example.com"
+def email_file():
+    """Return the email log file of the current user, or EMAIL_FILE outside a tenant_scope()."""
+    tenant = current_tenant()
+    return EMAIL_FILE if tenant is None else data_file('emails', tenant=tenant)
 
-def send_email(recipient, subject, body=None):
+@tool("Sends an email to a recipient with the given subject and body. Returns success status.",
+      resource="email")
+def send_email(recipient: str, subject: str, body: str = None):
     """
     Send an email to the specified recipient.
-    This is a mock function that simulates sending an email.
+    
+    By default this only records the email in the log. With
+    EMAIL_DELIVERY=queue it is recorded as queued and handed to the
+    background SMTP workers, and this returns without waiting for them.
     """
     try:
-        # If recipient is a name, convert it to email
-        if '@' not in recipient:
-            recipient = get_email_from_name(recipient)
+        # Resolve a name (or part of one, or a misspelling) to an address
+        contact = resolve_contact(recipient)
+        if "error" in contact:
+            return {"success": False, "error": contact["error"], "candidates": contact["candidates"]}
+        recipient = contact["email"]
         
         # Create a default body if none provided
         if not body:
             body = f"This is a message regarding: {subject}"
         
-        # Load existing emails
-        with open(EMAIL_FILE, 'r') as f:
-            emails = json.load(f)
+        # Load the email log
+        emails = open_records(email_file())
+        outbox = get_email_queue()
         
-        # Create the new email
+        # Create the new email (the log gives it the next id)
+        now = datetime.datetime.now().isoformat()
         new_email = {
-            "id": len(emails) + 1,
             "to": recipient,
             "subject": subject,
-            "body": body,
-            "sent_at": datetime.datetime.now().isoformat(),
-            "status": "sent"
+            "body": body
         }
+        if outbox:
+            # sent_at is set by the delivery workers once the server accepts it
+            new_email.update(queued_at=now, status=QUEUED, queued_by=os.getpid(),
+                             message_id=make_msgid(domain=outbox.sender.rsplit("@", 1)[-1]))
+        else:
+            new_email.update(sent_at=now, status=SENT)
         
         # Add to our email log
-        emails.append(new_email)
-        
-        # Save the updated emails
-        with open(EMAIL_FILE, 'w') as f:
-            json.dump(emails, f, indent=2)
+        new_email = emails.append_new(new_email)
         
+        if outbox:
+            # Delivery happens in the background; its outcome is written to the log
+            outbox.enqueue(email_file(), new_email)
+            return {
+                "success": True,
+                "email": {
+                    "to": recipient,
+                    "subject": subject,
+                    "queued_at": now,
+                    "status": QUEUED,
+                    "message_id": new_email["message_id"]
+                }
+            }
         return {
             "success": True,
             "email": {
                 "to": recipient,
                 "subject": subject,
-                "sent_at": new_email["sent_at"]
+                "sent_at": now
             }
         }
     except Exception as e:
         return {"success": False, "error": str(e)}
 
-def get_sent_emails(limit=5):
+@tool("Lists the `limit` most recently sent emails, newest first.",
+      resource="email")
+def get_sent_emails(limit: int = 5):
     """Get a list of recently sent emails."""
     try:
-        # Load existing emails
-        with open(EMAIL_FILE, 'r') as f:
-            emails = json.load(f)
+        # Read only the most recent records from the log (an ORDER BY ... LIMIT
+        # index scan with the SQLite backend)
+        emails = open_records(email_file()).tail(limit)
         
-        # Sort by sent time, descending
-        emails.sort(key=lambda x: x['sent_at'], reverse=True)
+        # Sort by sent time (queued time for emails not delivered yet), descending
+        emails.sort(key=lambda x: x.get('sent_at') or x.get('queued_at', ''), reverse=True)
         
-        return {"emails": emails[:limit]}
+        return {"emails": emails}
     except Exception as e:
         return {"error": str(e)} 
\ No newline at end of file
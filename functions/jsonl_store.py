@@ -0,0 +1,210 @@
+import json
+import os
+import re
+import threading
+from functions.metrics import metrics
+from functions.safe_write import GroupCommit, IdCounter, file_lock
+
+# Records written here start with their id, which can be read without decoding the line
+_ID_PREFIX = re.compile(rb'\{"id": (-?\d+)[,}]')
+
+def _line_id(line):
+    """Return (ok, id) for a line: the record's id (None if it has none), or ok=False if it isn't a record."""
+    match = _ID_PREFIX.match(line)
+    if match:
+        return True, int(match.group(1))
+    try:
+        record = json.loads(line)
+    except ValueError:
+        return False, None
+    return True, record.get('id') if isinstance(record, dict) else None
+
+class JsonlFile:
+    """
+    Append-only JSON Lines record file.
+
+    Each record is one line written with a single os.write on a file opened
+    with O_APPEND, so adding a record costs the same regardless of how many
+    came before it, and a crash can at worst leave a torn last line, which
+    is skipped on load and dropped by compact().
+
+    Records with an "id" are treated as versions: appending a record with an
+    id that already exists replaces the earlier one when the file is read,
+    and the record keeps the position of its first version. An index of
+    where each record's latest version starts is kept in memory and
+    extended incrementally when the file grows, so counting and reading
+    recent records never re-reads the whole file.
+
+    Writes hold the file's lock, and new ids come from an IdCounter, so
+    concurrent writers never hand out the same id.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._writer = GroupCommit(path, self._write)
+        self._ids = IdCounter(path)
+        # Byte offset of each record's latest version, in the order the
+        # records first appeared; the slot of each id; how far the file was indexed
+        self.offsets = []
+        self._slots = {}
+        self._indexed_size = 0
+
+        # Initialize the file if it doesn't exist, without truncating one
+        # another process has just created
+        if not os.path.exists(path):
+            with open(path, 'a'):
+                pass
+
+    def _reset_index(self):
+        """Forget the index, so the next refresh reads the file from the start."""
+        self.offsets = []
+        self._slots = {}
+        self._indexed_size = 0
+
+    def _refresh_index(self):
+        """Index any complete lines appended since the last refresh."""
+        size = os.path.getsize(self.path)
+        if size < self._indexed_size:
+            # The file was truncated or compacted, start over
+            self._reset_index()
+        if size == self._indexed_size:
+            return
+
+        with open(self.path, 'rb') as f:
+            f.seek(self._indexed_size)
+            offset = self._indexed_size
+            for line in f:
+                if not line.endswith(b'\n'):
+                    # Torn write at the end of the file, don't index it
+                    break
+                ok, record_id = _line_id(line) if line.strip() else (False, None)
+                if ok:
+                    slot = self._slots.get(record_id) if record_id is not None else None
+                    if slot is None:
+                        # A new record; later versions of it take over this slot
+                        if record_id is not None:
+                            self._slots[record_id] = len(self.offsets)
+                        self.offsets.append(offset)
+                    else:
+                        self.offsets[slot] = offset
+                offset += len(line)
+            self._indexed_size = offset
+
+    def _read_at(self, f, offset):
+        """Decode the record starting at a byte offset, or None if corrupt."""
+        f.seek(offset)
+        try:
+            return json.loads(f.readline())
+        except ValueError:
+            return None
+
+    def load(self):
+        """Return all records, keeping the latest version of each id."""
+        with metrics.span("storage_io_seconds", "storage_read", backend="jsonl", operation="read"), self._lock:
+            self._refresh_index()
+            with open(self.path, 'rb') as f:
+                records = (self._read_at(f, offset) for offset in self.offsets)
+                return [record for record in records if record is not None]
+
+    def append(self, record):
+        """Append one record as a single line."""
+        self._writer.submit(record)
+
+    def append_new(self, record):
+        """Append a record with the next id, and return the stored record."""
+        return self._writer.submit(record, assign_id=True)
+
+    def _write(self, items):
+        """Append (record, assign_id) pairs with one write; called with the file locked."""
+        last_id = self._ids.last()
+        stored = []
+        for record, assign_id in items:
+            if assign_id:
+                last_id += 1
+                record = {"id": last_id, **record}
+            elif isinstance(record.get("id"), int):
+                last_id = max(last_id, record["id"])
+            stored.append(record)
+        data = b"".join((json.dumps(record) + '\n').encode('utf-8') for record in stored)
+
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            with metrics.span("storage_io_seconds", "storage_write", backend="jsonl", operation="write"):
+                os.write(fd, data)
+                if self._writer.fsync:
+                    os.fsync(fd)
+            stat = os.fstat(fd)
+        finally:
+            os.close(fd)
+        self._ids.save(last_id, stat)
+        return stored
+
+    def replace(self, updated):
+        """Replace records by appending new versions with the same ids."""
+        with file_lock(self.path):
+            self._write([(record, False) for record in updated])
+
+    def count(self):
+        """Return the number of records, counting each id once."""
+        with self._lock:
+            self._refresh_index()
+            return len(self.offsets)
+
+    def tail(self, limit):
+        """
+        Return the latest versions of the `limit` most recently added records, newest first.
+
+        Records are ordered by their first version, so updating a record
+        (e.g. an email's delivery status) doesn't move it to the end.
+        """
+        with metrics.span("storage_io_seconds", "storage_read", backend="jsonl", operation="read"), self._lock:
+            self._refresh_index()
+            if limit <= 0:
+                return []
+            with open(self.path, 'rb') as f:
+                records = (self._read_at(f, offset) for offset in reversed(self.offsets[-limit:]))
+                return [record for record in records if record is not None]
+
+    def clear(self):
+        """Delete all records."""
+        with file_lock(self.path), self._lock:
+            with open(self.path, 'w'):
+                pass
+            self._ids.reset()
+            self._reset_index()
+
+    def compact(self):
+        """
+        Rewrite the file with only the latest version of each record.
+
+        Torn and corrupt lines are dropped. The new file is written next to
+        the old one and renamed over it, so readers never see a partial file.
+        """
+        # Hold the file lock so no append lands in the old file during the rewrite
+        with file_lock(self.path):
+            records = self.load()
+            with self._lock:
+                tmp_path = f"{self.path}.compact"
+                with open(tmp_path, 'w') as f:
+                    for record in records:
+                        f.write(json.dumps(record) + '\n')
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, self.path)
+                self._reset_index()
+        return len(records)
+
+def migrate_json_array(src_path, dst_path):
+    """Convert a JSON array file into a JSON Lines file. Returns the record count."""
+    with open(src_path, 'r') as f:
+        records = json.load(f)
+
+    tmp_path = f"{dst_path}.migrate"
+    with open(tmp_path, 'w') as f:
+        for record in records:
+            f.write(json.dumps(record) + '\n')
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, dst_path)
+    return len(records)
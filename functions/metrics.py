@@ -0,0 +1,195 @@
+import bisect
+import contextlib
+import contextvars
+import os
+import threading
+import time
+
+# Metrics are on unless AGENT_METRICS=0. When off, spans are a shared no-op
+# object and counters return straight away.
+ENABLED = os.environ.get("AGENT_METRICS", "1") != "0"
+
+# Histogram bucket upper bounds, in seconds
+DEFAULT_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Help text for the metrics the agent and storage record
+METRIC_HELP = {
+    "agent_queries_total": "Queries processed by the agent",
+    "agent_query_seconds": "Time to process a query, end to end",
+    "agent_stage_seconds": "Time spent in each stage of the agent loop",
+    "agent_function_seconds": "Time spent executing each function",
+    "agent_function_calls_total": "Function calls by function and outcome",
+    "agent_llm_calls_total": "LLM calls made by the agent",
+    "agent_llm_prompt_bytes_total": "UTF-8 bytes of prompts sent to the LLM",
+    "agent_llm_response_bytes_total": "UTF-8 bytes of LLM responses",
+    "agent_llm_prompt_tokens_total": "Estimated prompt tokens sent to the LLM (bytes / 4)",
+    "agent_llm_response_tokens_total": "Estimated response tokens from the LLM (bytes / 4)",
+    "storage_io_seconds": "Time spent reading and writing records, by backend and operation",
+    "email_deliveries_total": "Outcomes of queued email delivery attempts, by resulting status"
+}
+
+# The step timings dict that storage spans report into, set while functions run
+_current_timings = contextvars.ContextVar("current_timings", default=None)
+
+class Histogram:
+    """A fixed-bucket histogram of durations in seconds."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+class _NullSpan:
+    """The span handed out when metrics are off; it does nothing."""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+NULL_SPAN = _NullSpan()
+
+class Span:
+    """Times a block with perf_counter_ns and records it when the block ends."""
+
+    __slots__ = ("registry", "metric", "labels", "key", "timings", "start")
+
+    def __init__(self, registry, metric, labels, key, timings):
+        self.registry = registry
+        self.metric = metric
+        self.labels = labels
+        self.key = key
+        self.timings = timings
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc_info):
+        elapsed = time.perf_counter_ns() - self.start
+        self.registry.observe(self.metric, elapsed / 1e9, self.labels)
+        timings = self.timings if self.timings is not None else _current_timings.get()
+        if timings is not None and self.key:
+            timings[self.key] = round(timings.get(self.key, 0.0) + elapsed / 1e6, 3)
+        return False
+
+class MetricsRegistry:
+    """
+    Counters and histograms, rendered in the Prometheus text format.
+
+    Metrics are identified by name plus a tuple of (label, value) pairs.
+    """
+
+    def __init__(self, enabled=ENABLED):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+
+    def span(self, metric, key=None, timings=None, **labels):
+        """
+        Return a context manager timing a block into the `metric` histogram.
+
+        With `key`, the duration in milliseconds is also added to a step's
+        timings dict: `timings` if given, else the one set with collect().
+        """
+        if not self.enabled:
+            return NULL_SPAN
+        return Span(self, metric, tuple(sorted(labels.items())), key, timings)
+
+    def observe(self, metric, seconds, labels=()):
+        """Add a duration to a histogram."""
+        if not self.enabled:
+            return
+        with self._lock:
+            histogram = self._histograms.get((metric, labels))
+            if histogram is None:
+                histogram = self._histograms[(metric, labels)] = Histogram()
+            histogram.observe(seconds)
+
+    def inc(self, metric, amount=1, **labels):
+        """Add to a counter."""
+        if not self.enabled:
+            return
+        key = (metric, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def new_timings(self):
+        """Return an empty timings dict for a step, or None when metrics are off."""
+        return {} if self.enabled else None
+
+    def reset(self):
+        """Forget every recorded value."""
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def render(self):
+        """Return every metric in the Prometheus text exposition format."""
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(self._histograms.items(), key=lambda item: item[0])
+            histograms = [(key, list(h.buckets), list(h.counts), h.sum, h.count) for key, h in histograms]
+
+        lines = []
+        seen = set()
+
+        def header(metric, metric_type):
+            if metric not in seen:
+                seen.add(metric)
+                lines.append(f"# HELP {metric} {METRIC_HELP.get(metric, metric)}")
+                lines.append(f"# TYPE {metric} {metric_type}")
+
+        for (metric, labels), value in counters:
+            header(metric, "counter")
+            lines.append(f"{metric}{_format_labels(labels)} {value}")
+
+        for (metric, labels), buckets, counts, total, count in histograms:
+            header(metric, "histogram")
+            cumulative = 0
+            for bound, bucket_count in zip(buckets + ["+Inf"], counts):
+                cumulative += bucket_count
+                lines.append(f"{metric}_bucket{_format_labels(labels + (('le', str(bound)),))} {cumulative}")
+            lines.append(f"{metric}_sum{_format_labels(labels)} {total}")
+            lines.append(f"{metric}_count{_format_labels(labels)} {count}")
+
+        return "\n".join(lines) + "\n"
+
+@contextlib.contextmanager
+def collect(timings):
+    """Make storage spans in this thread report into `timings` while the block runs."""
+    token = _current_timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _current_timings.reset(token)
+
+def merge_timings(timings, other):
+    """Add the stage times in `other` to `timings` (either may be None when metrics are off)."""
+    if timings is None or not other:
+        return
+    for key, ms in other.items():
+        timings[key] = round(timings.get(key, 0.0) + ms, 3)
+
+def _escape(value):
+    """Escape a label value for the Prometheus text format."""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_labels(labels):
+    """Format label pairs as {name="value",...}."""
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels) + "}"
+
+# The process-wide registry
+metrics = MetricsRegistry()
@@ -0,0 +1,188 @@
+import inspect
+import json
+import typing
+
+# Registered tools by name, in registration order
+TOOLS = {}
+
+# JSON schema types for annotated parameter types
+SCHEMA_TYPES = {
+    str: {"type": "string"},
+    int: {"type": "integer"},
+    float: {"type": "number"},
+    bool: {"type": "boolean"},
+    list: {"type": "array", "items": {"type": "string"}}
+}
+
+def _coerce_str(value):
+    return value.strip() if isinstance(value, str) else str(value)
+
+def _coerce_int(value):
+    return int(value.strip()) if isinstance(value, str) else int(value)
+
+def _coerce_float(value):
+    return float(value.strip()) if isinstance(value, str) else float(value)
+
+def _coerce_bool(value):
+    if isinstance(value, str):
+        lowered = value.strip().lower()
+        if lowered in ("true", "yes", "1"):
+            return True
+        if lowered in ("false", "no", "0"):
+            return False
+        raise ValueError(f"expected true or false, got '{value}'")
+    return bool(value)
+
+def _coerce_list(value):
+    # A string is a comma-separated list, optionally written as [a, b, c]
+    if isinstance(value, str):
+        items = value.strip().strip("[]")
+        return [item.strip().strip("'\"") for item in items.split(",") if item.strip()]
+    return [_coerce_str(item) for item in value]
+
+COERCERS = {
+    str: _coerce_str,
+    int: _coerce_int,
+    float: _coerce_float,
+    bool: _coerce_bool,
+    list: _coerce_list
+}
+
+def _base_type(annotation):
+    """Return the plain type of an annotation, e.g. list for list[str] and str for Optional[str]."""
+    if typing.get_origin(annotation) is typing.Union:
+        annotation = next(arg for arg in typing.get_args(annotation) if arg is not type(None))
+    return typing.get_origin(annotation) or annotation
+
+def _optional(coerce):
+    """Wrap a coercer so "None" (or a JSON null) gives None."""
+    def coerce_optional(value):
+        if value is None or (isinstance(value, str) and value.strip().lower() == "none"):
+            return None
+        return coerce(value)
+    return coerce_optional
+
+class Tool:
+    """
+    A function the agent can call, with everything needed to dispatch to it.
+
+    The argument coercers, the legacy FUNCTION_CALL parameter splitter, the
+    JSON schema and the prompt description are all built once when the tool
+    is registered, so a call is a dict lookup plus the coercers.
+    """
+
+    def __init__(self, function, name, description, resource, example=None):
+        self.function = function
+        self.name = name
+        self.description = description
+        self.resource = resource
+        self.example = example
+
+        hints = typing.get_type_hints(function)
+        self.parameters = list(inspect.signature(function).parameters.values())
+        self.param_names = [parameter.name for parameter in self.parameters]
+        self.coercers = {}
+        types = {}
+        for parameter in self.parameters:
+            param_type = _base_type(hints.get(parameter.name, str))
+            coerce = COERCERS.get(param_type, _coerce_str)
+            if parameter.default is None:
+                coerce = _optional(coerce)
+            self.coercers[parameter.name] = coerce
+            types[parameter.name] = param_type
+
+        # A tool taking a single list takes every FUNCTION_CALL parameter as its items
+        self.list_param = len(self.parameters) == 1 and types[self.param_names[0]] is list
+        # A trailing string parameter takes the rest of the line, commas and all
+        self.maxsplit = len(self.parameters) - 1 if self.parameters and types[self.param_names[-1]] is str else -1
+
+        self.schema = {
+            "name": name,
+            # The same text as the prompt's function list; schemas are only used with JSON calls
+            "description": self.describe_text("json"),
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    parameter.name: SCHEMA_TYPES.get(types[parameter.name], SCHEMA_TYPES[str])
+                    for parameter in self.parameters
+                },
+                "required": [
+                    parameter.name for parameter in self.parameters
+                    if parameter.default is inspect.Parameter.empty
+                ]
+            }
+        }
+        self.signature = ", ".join(
+            parameter.name if parameter.default is inspect.Parameter.empty else f"{parameter.name}={parameter.default}"
+            for parameter in self.parameters
+        )
+
+    def coerce(self, name, value):
+        """Convert one argument to its parameter's type."""
+        try:
+            return self.coercers[name](value)
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"Invalid value for {name}: {e}")
+
+    def parse_params(self, params_str):
+        """Split and coerce the parameters of a legacy FUNCTION_CALL line into (params, kwargs)."""
+        if self.list_param:
+            return [self.coerce(self.param_names[0], params_str)], {}
+
+        params = []
+        kwargs = {}
+        if not params_str.strip():
+            return params, kwargs
+        for piece in params_str.split(",", self.maxsplit):
+            key, sep, value = piece.partition("=")
+            key = key.strip()
+            if sep and key in self.coercers:
+                kwargs[key] = self.coerce(key, value)
+            elif len(params) < len(self.param_names):
+                params.append(self.coerce(self.param_names[len(params)], piece))
+            else:
+                params.append(piece.strip())
+        return params, kwargs
+
+    def coerce_arguments(self, arguments):
+        """Coerce the keyword arguments of a JSON call."""
+        return {
+            key: self.coerce(key, value) if key in self.coercers else value
+            for key, value in arguments.items()
+        }
+
+    def describe_text(self, protocol="json"):
+        """Return the tool's description, with its example written in the given call protocol."""
+        if "{example}" in self.description:
+            return self.description.replace("{example}", self.format_example(protocol))
+        return self.description
+
+    def describe(self, index, protocol="json"):
+        """Return the tool's line in the system prompt's function list."""
+        return f"{index}. {self.name}({self.signature}): {self.describe_text(protocol)}"
+
+    def format_example(self, protocol):
+        """Format the tool's example call in the given call protocol."""
+        if protocol == "json":
+            return json.dumps({"name": self.name, "arguments": self.example})
+        values = [",".join(value) if isinstance(value, list) else str(value) for value in self.example.values()]
+        return f"FUNCTION_CALL: {self.name}|{','.join(values)}"
+
+def tool(description, resource=None, name=None, example=None):
+    """
+    Register a function as a tool the agent can call.
+
+    `description` is the tool's text in the system prompt; "{example}" in it
+    is replaced by `example` (its arguments) written in the call format in
+    use. `resource` names the data the tool uses: calls on different
+    resources may run in parallel.
+    """
+    def register(function):
+        tool_name = name or function.__name__
+        TOOLS[tool_name] = Tool(function, tool_name, description, resource or tool_name, example)
+        return function
+    return register
+
+def describe_tools(protocol="json"):
+    """Return the numbered function list for the system prompt."""
+    return "\n".join(tool.describe(index, protocol) for index, tool in enumerate(TOOLS.values(), 1))
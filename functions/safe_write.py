@@ -0,0 +1,232 @@
+import contextlib
+import json
+import os
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# How writes reach the disk:
+#   "none"   - no fsync, as before; the OS flushes in its own time (default)
+#   "always" - fsync every write before returning
+#   "group"  - writes arriving within ASSISTANT_GROUP_COMMIT_MS of each other
+#              are written together and share one fsync
+SYNC_MODE = os.environ.get("ASSISTANT_SYNC_WRITES", "none").lower()
+
+# How long the first write of a group waits for others to join it
+GROUP_COMMIT_WINDOW = float(os.environ.get("ASSISTANT_GROUP_COMMIT_MS", "2")) / 1000
+
+# Lock files held by each thread, with how many times they were entered
+_held = threading.local()
+
+# Without fcntl (e.g. on Windows) writers are only serialized within this process
+_fallback_locks = {}
+_fallback_locks_lock = threading.Lock()
+
+def holds_lock(path):
+    """Return True if this thread already holds the lock on a file."""
+    return path in getattr(_held, "counts", {})
+
+@contextlib.contextmanager
+def file_lock(path):
+    """
+    Hold an exclusive lock on a data file, shared with other processes.
+
+    The lock is an fcntl.flock on `path.lock`, so it doesn't get in the way
+    of readers or of renaming a new version over the file. A thread that
+    already holds the lock can take it again.
+    """
+    counts = getattr(_held, "counts", None)
+    if counts is None:
+        counts = _held.counts = {}
+    if path in counts:
+        counts[path] += 1
+        try:
+            yield
+        finally:
+            counts[path] -= 1
+        return
+
+    if fcntl is None:
+        with _fallback_locks_lock:
+            lock = _fallback_locks.setdefault(path, threading.Lock())
+        with lock:
+            counts[path] = 1
+            try:
+                yield
+            finally:
+                del counts[path]
+        return
+
+    fd = os.open(path + ".lock", os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        counts[path] = 1
+        try:
+            yield
+        finally:
+            del counts[path]
+            fcntl.flock(fd, fcntl.LOCK_UN)
+    finally:
+        os.close(fd)
+
+def atomic_write(path, data, fsync=False):
+    """
+    Replace a file's contents with `data` (bytes) in one step.
+
+    The data is written to a temporary file next to it, which is then
+    renamed over the original, so readers see either the old or the new
+    contents and a crash never leaves a half-written file.
+    """
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(tmp_path)
+        raise
+    if fsync:
+        fsync_dir(path)
+
+def fsync_dir(path):
+    """Flush a file's directory entry, so a rename or create survives a crash."""
+    if not hasattr(os, "O_DIRECTORY"):
+        return
+    fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+def next_id(records):
+    """Return one more than the largest integer id among some records."""
+    return max((record["id"] for record in records
+                if isinstance(record, dict) and isinstance(record.get("id"), int)), default=0) + 1
+
+class _Batch:
+    """Writes waiting to be committed together."""
+
+    __slots__ = ("items", "done", "results", "error")
+
+    def __init__(self):
+        self.items = []
+        self.done = threading.Event()
+        self.results = None
+        self.error = None
+
+class GroupCommit:
+    """
+    Serializes the writes to one record file, optionally committing them in groups.
+
+    `write` is called with a list of (record, assign_id) pairs while the
+    file lock is held, and returns the stored records in the same order.
+    In "group" mode the first writer waits `window` seconds, then writes
+    every record that arrived in the meantime with a single call to
+    `write`, and so a single fsync. The other writers wait for it.
+    """
+
+    def __init__(self, path, write, mode=None, window=None):
+        self.path = path
+        self.write = write
+        self.mode = mode or SYNC_MODE
+        self.window = GROUP_COMMIT_WINDOW if window is None else window
+        self._lock = threading.Lock()
+        self._batch = _Batch()
+
+    @property
+    def fsync(self):
+        """Whether writes should be fsynced."""
+        return self.mode in ("always", "group")
+
+    def submit(self, record, assign_id=False):
+        """Write a record, giving it the next id if asked, and return the stored record."""
+        if self.mode != "group" or holds_lock(self.path):
+            # A caller holding the lock can't wait for another thread's group
+            with file_lock(self.path):
+                return self.write([(record, assign_id)])[0]
+
+        with self._lock:
+            batch = self._batch
+            position = len(batch.items)
+            batch.items.append((record, assign_id))
+
+        if position == 0:
+            # First in the group: let others join, then commit for everyone
+            time.sleep(self.window)
+            with self._lock:
+                self._batch = _Batch()
+            try:
+                with file_lock(self.path):
+                    batch.results = self.write(batch.items)
+            except BaseException as e:
+                batch.error = e
+            finally:
+                batch.done.set()
+        else:
+            batch.done.wait()
+
+        if batch.error is not None:
+            raise batch.error
+        return batch.results[position]
+
+class IdCounter:
+    """
+    The last id handed out for an append-only file, kept in `path.seq`.
+
+    The counter file holds "last_id size inode": the largest id so far and
+    the data file's size and inode after it was written. Lines appended
+    since by anything that doesn't use the counter (seeding, migrations)
+    are scanned for larger ids, and the whole file is rescanned if it has
+    shrunk or been replaced. Callers hold the file lock.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.seq_path = path + ".seq"
+
+    def last(self):
+        """Return the largest id in the file, catching up with lines the counter hasn't seen."""
+        try:
+            with open(self.seq_path, 'r') as f:
+                last_id, size, inode = (int(value) for value in f.read().split())
+        except (OSError, ValueError):
+            last_id, size, inode = 0, 0, None
+        stat = os.stat(self.path)
+        if stat.st_size < size or stat.st_ino != inode:
+            # The file was cleared, compacted or replaced
+            last_id, size = 0, 0
+
+        with open(self.path, 'rb') as f:
+            f.seek(size)
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if isinstance(record, dict) and isinstance(record.get("id"), int):
+                    last_id = max(last_id, record["id"])
+        return last_id
+
+    def save(self, last_id, stat):
+        """Record the last id handed out and the data file's os.stat() after writing it."""
+        # Fixed-width fields overwrite the old values in place, with no truncate
+        fd = os.open(self.seq_path, os.O_WRONLY | os.O_CREAT, 0o644)
+        try:
+            os.pwrite(fd, f"{last_id:>20} {stat.st_size:>20} {stat.st_ino:>20}".encode(), 0)
+        finally:
+            os.close(fd)
+
+    def reset(self):
+        """Forget the counter, after the file was emptied."""
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(self.seq_path)
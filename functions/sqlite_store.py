@@ -0,0 +1,148 @@
+import json
+import os
+import sqlite3
+import threading
+from functions.metrics import metrics
+from functions.safe_write import GroupCommit
+
+# Columns pulled out of each record so they can be indexed, per table.
+# The full record is always kept as JSON in the "record" column.
+SCHEMAS = {
+    "calendar": {
+        "columns": ["id", "title", "attendee", "start_time", "end_time", "created_at"],
+        "indexes": [("id",), ("start_time", "end_time"), ("attendee",)]
+    },
+    "emails": {
+        "columns": ["id", "to", "subject", "sent_at", "status"],
+        "indexes": [("id",), ("to",), ("sent_at",)]
+    }
+}
+
+def _quote(name):
+    """Quote an identifier, since columns like "to" are SQL keywords."""
+    return '"' + name.replace('"', '""') + '"'
+
+class SqliteRecords:
+    """
+    Record table in a SQLite database.
+
+    Each thread gets its own connection, opened on first use and reused for
+    the life of the thread. The database runs in WAL mode so readers don't
+    block behind a writer. New ids are allocated inside the inserting
+    transaction, which takes SQLite's write lock up front.
+    """
+
+    def __init__(self, path, table=None):
+        self.path = path
+        self.table = table or os.path.splitext(os.path.basename(path))[0]
+        if self.table not in SCHEMAS:
+            raise ValueError(f"No schema defined for table '{self.table}'")
+        self.schema = SCHEMAS[self.table]
+        self._local = threading.local()
+        self._writer = GroupCommit(path, self._write)
+        self._create_table()
+
+    def connection(self):
+        """Return this thread's connection, opening it if needed."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            # In WAL mode NORMAL only syncs at checkpoints; FULL syncs every commit
+            conn.execute(f"PRAGMA synchronous={'FULL' if self._writer.fsync else 'NORMAL'}")
+            self._local.conn = conn
+        return conn
+
+    def _create_table(self):
+        """Create the table and its indexes if they don't exist."""
+        columns = ", ".join(_quote(column) for column in self.schema["columns"])
+        conn = self.connection()
+        with conn:
+            conn.execute(f"CREATE TABLE IF NOT EXISTS {_quote(self.table)} "
+                         f"(rowid INTEGER PRIMARY KEY, {columns}, record TEXT NOT NULL)")
+            for index_columns in self.schema["indexes"]:
+                index_name = f"idx_{self.table}_{'_'.join(index_columns)}"
+                conn.execute(f"CREATE INDEX IF NOT EXISTS {_quote(index_name)} ON {_quote(self.table)} "
+                             f"({', '.join(_quote(column) for column in index_columns)})")
+
+    def query(self, where=None, params=(), order_by="rowid", limit=None):
+        """Return the records matching a WHERE clause, decoded from JSON."""
+        sql = f"SELECT record FROM {_quote(self.table)}"
+        if where:
+            sql += f" WHERE {where}"
+        sql += f" ORDER BY {order_by}"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params = tuple(params) + (limit,)
+        with metrics.span("storage_io_seconds", "storage_read", backend="sqlite", operation="read"):
+            rows = self.connection().execute(sql, params).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def load(self):
+        """Return all records in insertion order."""
+        return self.query()
+
+    def append(self, record):
+        """Insert one record."""
+        self._writer.submit(record)
+
+    def append_new(self, record):
+        """Insert a record with the next id, and return the stored record."""
+        return self._writer.submit(record, assign_id=True)
+
+    def _write(self, items):
+        """Insert (record, assign_id) pairs in one transaction."""
+        conn = self.connection()
+        with metrics.span("storage_io_seconds", "storage_write", backend="sqlite", operation="write"), conn:
+            conn.execute("BEGIN IMMEDIATE")
+            last_id = conn.execute(f'SELECT COALESCE(MAX("id"), 0) FROM {_quote(self.table)}').fetchone()[0]
+            stored = []
+            for record, assign_id in items:
+                if assign_id:
+                    last_id += 1
+                    record = {"id": last_id, **record}
+                elif isinstance(record.get("id"), int):
+                    last_id = max(last_id, record["id"])
+                stored.append(record)
+            self._insert(conn, stored)
+        return stored
+
+    def extend(self, records):
+        """Insert several records in one transaction."""
+        conn = self.connection()
+        with metrics.span("storage_io_seconds", "storage_write", backend="sqlite", operation="write"), conn:
+            self._insert(conn, records)
+
+    def _insert(self, conn, records):
+        """Insert records with an open connection, inside the caller's transaction."""
+        columns = self.schema["columns"]
+        placeholders = ", ".join("?" for _ in range(len(columns) + 1))
+        rows = [[record.get(column) for column in columns] + [json.dumps(record)] for record in records]
+        conn.executemany(f"INSERT INTO {_quote(self.table)} "
+                         f"({', '.join(_quote(column) for column in columns)}, record) "
+                         f"VALUES ({placeholders})", rows)
+
+    def replace(self, updated):
+        """Replace the stored records that have the same ids as `updated`, in one transaction."""
+        columns = self.schema["columns"]
+        assignments = ", ".join(f"{_quote(column)} = ?" for column in columns)
+        rows = [[record.get(column) for column in columns] + [json.dumps(record), record["id"]] for record in updated]
+        conn = self.connection()
+        with metrics.span("storage_io_seconds", "storage_write", backend="sqlite", operation="write"), conn:
+            conn.executemany(f'UPDATE {_quote(self.table)} SET {assignments}, record = ? WHERE "id" = ?', rows)
+
+    def count(self):
+        """Return the number of records."""
+        return self.connection().execute(f"SELECT COUNT(*) FROM {_quote(self.table)}").fetchone()[0]
+
+    def tail(self, limit):
+        """Return up to `limit` of the most recently inserted records, newest first."""
+        # Insertion order, like the file backends: queued emails have no
+        # sent_at yet, and a NULL would sort them last
+        return self.query(order_by="rowid DESC", limit=limit)
+
+    def clear(self):
+        """Delete all records."""
+        conn = self.connection()
+        with conn:
+            conn.execute(f"DELETE FROM {_quote(self.table)}")
@@ -0,0 +1,216 @@
+import collections
+import contextlib
+import contextvars
+import functools
+import hashlib
+import json
+import os
+import re
+import threading
+from functions.jsonl_store import JsonlFile
+from functions.metrics import metrics
+from functions.safe_write import GroupCommit, atomic_write, file_lock, next_id
+from functions.sqlite_store import SqliteRecords
+
+# Path to store our mock data (ASSISTANT_DATA_DIR points it elsewhere, e.g. for benchmarks)
+DATA_DIR = os.environ.get("ASSISTANT_DATA_DIR") or os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data')
+
+# Storage format for calendar and email records: "json" keeps the original
+# JSON array files, "jsonl" uses append-only JSON Lines files and "sqlite"
+# uses one indexed SQLite database per record type
+STORAGE_BACKEND = os.environ.get("ASSISTANT_STORAGE", "json").lower()
+
+FILE_EXTENSIONS = {
+    "json": ".json",
+    "jsonl": ".jsonl",
+    "sqlite": ".db"
+}
+
+# Ensure the data directory exists
+os.makedirs(DATA_DIR, exist_ok=True)
+
+# How many record files and calendar stores each process keeps open; the
+# least recently used are dropped first, so memory stays flat however many
+# users there are
+MAX_OPEN_STORES = int(os.environ.get("ASSISTANT_MAX_OPEN_STORES", "256"))
+
+# User ids become directory names, so only these characters are allowed
+_TENANT_ID_PATTERN = re.compile(r'^[A-Za-z0-9_.@-]{1,128}$')
+
+# The user whose data the functions read and write; None is the shared data
+_current_tenant = contextvars.ContextVar("current_tenant", default=None)
+
+class LRUCache:
+    """A thread-safe dict that keeps at most `maxsize` entries, dropping the least recently used."""
+
+    def __init__(self, maxsize=MAX_OPEN_STORES):
+        self.maxsize = maxsize
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, default=None):
+        """Return the value for a key, marking it as recently used."""
+        with self._lock:
+            value = self._entries.get(key, default)
+            if key in self._entries:
+                self._entries.move_to_end(key)
+            return value
+
+    def get_or_create(self, key, factory):
+        """Return the value for a key, calling factory() to create it if it's missing."""
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                value = self._entries[key] = factory()
+                if len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+            else:
+                self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        """Store a value, dropping the least recently used entry if the cache is full."""
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+class JsonArrayFile:
+    """
+    Record file stored as a single JSON array, rewritten on every append.
+
+    Writers hold the file's lock while they read, change and replace the
+    array, and the new version is renamed over the old one, so concurrent
+    writers (threads or processes) never lose each other's records and
+    readers never see a half-written file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._writer = GroupCommit(path, self._write)
+
+        # Initialize the file if it doesn't exist
+        if not os.path.exists(path):
+            with file_lock(path):
+                if not os.path.exists(path):
+                    atomic_write(path, b"[]")
+
+    def load(self):
+        """Return all records."""
+        with metrics.span("storage_io_seconds", "storage_read", backend="json", operation="read"):
+            with open(self.path, 'r') as f:
+                return json.load(f)
+
+    def append(self, record):
+        """Append a record by rewriting the whole array."""
+        self._writer.submit(record)
+
+    def append_new(self, record):
+        """Append a record with the next id, and return the stored record."""
+        return self._writer.submit(record, assign_id=True)
+
+    def _write(self, items):
+        """Add (record, assign_id) pairs to the array in one rewrite; called with the file locked."""
+        records = self.load()
+        new_id = next_id(records)
+        stored = []
+        for record, assign_id in items:
+            if assign_id:
+                record = {"id": new_id, **record}
+            if isinstance(record.get("id"), int):
+                new_id = max(new_id, record["id"] + 1)
+            records.append(record)
+            stored.append(record)
+        with metrics.span("storage_io_seconds", "storage_write", backend="json", operation="write"):
+            atomic_write(self.path, json.dumps(records, indent=2).encode('utf-8'), fsync=self._writer.fsync)
+        return stored
+
+    def replace(self, updated):
+        """Replace the stored records that have the same ids as `updated`, in one rewrite."""
+        by_id = {record["id"]: record for record in updated}
+        with file_lock(self.path):
+            records = [by_id.get(record.get("id"), record) for record in self.load()]
+            with metrics.span("storage_io_seconds", "storage_write", backend="json", operation="write"):
+                atomic_write(self.path, json.dumps(records, indent=2).encode('utf-8'), fsync=self._writer.fsync)
+
+    def count(self):
+        """Return the number of records."""
+        return len(self.load())
+
+    def tail(self, limit):
+        """Return up to `limit` of the most recently appended records, newest first."""
+        return self.load()[::-1][:limit]
+
+    def clear(self):
+        """Delete all records."""
+        with file_lock(self.path):
+            atomic_write(self.path, b"[]")
+
+def validate_tenant(tenant):
+    """Return a user id if it can name a storage namespace, otherwise raise ValueError."""
+    if not isinstance(tenant, str) or not _TENANT_ID_PATTERN.match(tenant) or tenant in (".", ".."):
+        raise ValueError(f"Invalid user id: {tenant!r}")
+    return tenant
+
+@functools.lru_cache(maxsize=4096)
+def tenant_dir(tenant):
+    """
+    Return (and create) the data directory of a user.
+
+    Users are sharded across 256 directories by a hash of their id, so no
+    single directory ends up with thousands of entries.
+    """
+    shard = hashlib.sha1(validate_tenant(tenant).encode()).hexdigest()[:2]
+    path = os.path.join(DATA_DIR, "tenants", shard, tenant)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+def path_tenant(path):
+    """Return the user whose data directory holds a file, or None for the shared data."""
+    parts = os.path.relpath(os.path.dirname(os.path.abspath(path)), os.path.join(DATA_DIR, "tenants")).split(os.sep)
+    return parts[1] if len(parts) == 2 and parts[0] != ".." else None
+
+def current_tenant():
+    """Return the user id set by tenant_scope(), or None for the shared data."""
+    return _current_tenant.get()
+
+@contextlib.contextmanager
+def tenant_scope(tenant):
+    """Make the functions in this context read and write a user's data (None for the shared data)."""
+    if tenant is not None:
+        validate_tenant(tenant)
+    token = _current_tenant.set(tenant)
+    try:
+        yield tenant
+    finally:
+        _current_tenant.reset(token)
+
+def data_file(name, backend=None, tenant=None):
+    """Return the path of a named data file for the given (or configured) backend and user."""
+    backend = backend or STORAGE_BACKEND
+    if backend not in FILE_EXTENSIONS:
+        raise ValueError(f"Unknown storage backend '{backend}'")
+    return os.path.join(tenant_dir(tenant) if tenant else DATA_DIR, name + FILE_EXTENSIONS[backend])
+
+def _new_record_file(path):
+    """Create the record file object for a path, choosing the format from its extension."""
+    if path.endswith(FILE_EXTENSIONS["jsonl"]):
+        return JsonlFile(path)
+    if path.endswith(FILE_EXTENSIONS["sqlite"]):
+        return SqliteRecords(path)
+    return JsonArrayFile(path)
+
+# Record file objects are shared so the JSONL offset index survives across calls
+_record_files = LRUCache()
+
+def open_records(path):
+    """Return the record file for a path, choosing the format from its extension."""
+    return _record_files.get_or_create(path, lambda: _new_record_file(path))
+
+def reset_records(path):
+    """Empty a record file, keeping its format."""
+    open_records(path).clear()
@@ -0,0 +1,86 @@
+import collections
+import datetime
+import functools
+import re
+
+# Result of parsing a time expression: `value` is a datetime on success,
+# otherwise `error` says what was wrong with the input
+TimeParseResult = collections.namedtuple('TimeParseResult', ['value', 'error'])
+
+# Day keywords and how many days after the reference date they refer to
+DAY_OFFSETS = {
+    "today": 0,
+    "tomorrow": 1
+}
+
+_DAY_PATTERN = re.compile(r'\b(' + '|'.join(DAY_OFFSETS) + r')\b')
+
+# Matches "3pm", "3 pm", "3p.m.", "3 p.m.", "3:30 pm" and "15:00". Input is
+# lowercased before matching.
+_TIME_PATTERN = re.compile(
+    r'(?<![\d:])(\d{1,2})(?::(\d{2}))?\s*(?:([ap])\.?\s*m\b\.?)?(?![\d:])'
+)
+
+# ISO 8601 date and time, e.g. "2025-06-02T15:00:00" as returned by
+# find_free_slots (after lowercasing, so "t" separates them)
+_ISO_PATTERN = re.compile(r'\d{4}-\d{2}-\d{2}[t ]\d{2}:\d{2}')
+
+def normalize(time_str):
+    """Lowercase a time expression and collapse its whitespace."""
+    return ' '.join(time_str.lower().split())
+
+def parse_time_expression(time_str, reference_date=None):
+    """
+    Parse a time expression like "tomorrow 3 PM" into a datetime.
+
+    Returns a TimeParseResult. Results are cached on the normalized string
+    and the reference date, which defaults to today.
+    """
+    if not isinstance(time_str, str):
+        return TimeParseResult(None, "Time must be given as a string")
+    if reference_date is None:
+        reference_date = datetime.date.today()
+    return _parse_normalized(normalize(time_str), reference_date)
+
+@functools.lru_cache(maxsize=1024)
+def _parse_normalized(text, reference_date):
+    """Parse an already normalized time expression."""
+    if _ISO_PATTERN.match(text):
+        try:
+            value = datetime.datetime.fromisoformat(text)
+        except ValueError:
+            return TimeParseResult(None, f"Invalid ISO date and time '{text}'")
+        if value.tzinfo is not None:
+            # Meetings are stored as naive local times
+            value = value.astimezone().replace(tzinfo=None)
+        return TimeParseResult(value, None)
+
+    # Work out the day, defaulting to the reference date
+    day_match = _DAY_PATTERN.search(text)
+    date = reference_date
+    if day_match:
+        date = reference_date + datetime.timedelta(days=DAY_OFFSETS[day_match.group(1)])
+        text = text[:day_match.start()] + ' ' + text[day_match.end():]
+
+    # Take the first number that is clearly a time, i.e. has minutes or AM/PM
+    for match in _TIME_PATTERN.finditer(text):
+        hour_str, minute_str, meridiem = match.groups()
+        if minute_str is None and meridiem is None:
+            continue
+
+        hour = int(hour_str)
+        minute = int(minute_str) if minute_str is not None else 0
+        if minute > 59:
+            return TimeParseResult(None, f"Invalid minutes in '{match.group(0).strip()}'")
+
+        if meridiem:
+            # 12-hour clock: 12 AM is midnight and 12 PM is noon
+            if not 1 <= hour <= 12:
+                return TimeParseResult(None, f"Invalid hour in '{match.group(0).strip()}'")
+            hour = hour % 12 + (12 if meridiem == 'p' else 0)
+        elif hour > 23:
+            return TimeParseResult(None, f"Invalid hour in '{match.group(0).strip()}'")
+
+        return TimeParseResult(datetime.datetime.combine(date, datetime.time(hour, minute)), None)
+
+    return TimeParseResult(None, "No time found, expected a time like '3 PM' or '15:00'")
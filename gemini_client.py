@@ -5,23 +5,66 @@ import google.generativeai as genai
 class GeminiClient:
     """A client that uses Google's Gemini API to generate responses."""
     
-    def __init__(self, api_key=None):
-        """Initialize the Gemini client with the provided API key."""
+    def __init__(self, api_key=None, function_declarations=None):
+        """
+        Initialize the Gemini client with the provided API key.
+        
+        With function_declarations (the agent's function schemas) Gemini's
+        native function calling is used; see enable_function_calling.
+        """
         self.api_key = api_key
         self.model_name = "gemini-pro"  # Using the text-only model
+        self.function_declarations = function_declarations
         
         if self.api_key:
             genai.configure(api_key=self.api_key)
-            self.model = genai.GenerativeModel(self.model_name)
+            self.model = self._build_model()
         else:
             self.model = None
             print("Warning: No API key provided. GeminiClient is not functional.")
     
+    def _build_model(self):
+        """Create the model, with the function declarations as tools if there are any."""
+        if self.function_declarations:
+            return genai.GenerativeModel(self.model_name, tools=[{"function_declarations": self.function_declarations}])
+        return genai.GenerativeModel(self.model_name)
+    
     def set_api_key(self, api_key):
         """Set or update the API key."""
         self.api_key = api_key
         genai.configure(api_key=self.api_key)
-        self.model = genai.GenerativeModel(self.model_name)
+        self.model = self._build_model()
+    
+    def enable_function_calling(self, function_declarations):
+        """
+        Use Gemini's native function calling with the given function schemas.
+        
+        Function calls Gemini returns are converted to the agent's JSON call
+        format, {"calls": [{"name": ..., "arguments": {...}}]}.
+        """
+        self.function_declarations = function_declarations
+        if self.api_key:
+            self.model = self._build_model()
+    
+    def _response_text(self, response):
+        """Return the text of a response, or its native function calls as a JSON call object."""
+        calls = []
+        for candidate in (getattr(response, 'candidates', None) or [])[:1]:
+            for part in candidate.content.parts:
+                function_call = getattr(part, 'function_call', None)
+                if function_call and function_call.name:
+                    # Repeated fields (lists) aren't JSON serializable until converted
+                    arguments = json.loads(json.dumps(dict(function_call.args), default=list))
+                    calls.append({"name": function_call.name, "arguments": arguments})
+        if calls:
+            return json.dumps({"calls": calls})
+        
+        # Extract and return just the text content
+        if hasattr(response, 'text'):
+            return response.text
+        else:
+            # Handle older API versions or unexpected response format
+            return str(response)
     
     def generate_content(self, prompt):
         """Generate content using the Gemini model."""
@@ -30,13 +73,21 @@ class GeminiClient:
         
         try:
             response = self.model.generate_content(prompt)
-            
-            # Extract and return just the text content
-            if hasattr(response, 'text'):
-                return response.text
-            else:
-                # Handle older API versions or unexpected response format
-                return str(response)
+            return self._response_text(response)
+                
+        except Exception as e:
+            error_msg = f"Error generating content: {str(e)}"
+            print(error_msg)
+            return f"ERROR: {error_msg}"
+    
+    async def generate_content_async(self, prompt):
+        """Generate content using the Gemini model without blocking the event loop."""
+        if not self.model:
+            return "ERROR: No API key provided. Please configure your Gemini API key."
+        
+        try:
+            response = await self.model.generate_content_async(prompt)
+            return self._response_text(response)
                 
         except Exception as e:
             error_msg = f"Error generating content: {str(e)}"
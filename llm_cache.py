@@ -0,0 +1,203 @@
+import asyncio
+import collections
+import hashlib
+import sqlite3
+import threading
+import time
+from functions.calendar_store import add_write_listener, remove_write_listener
+from functions.storage import current_tenant, path_tenant
+
+class CachingLLMClient:
+    """
+    Wraps an LLM client and caches its responses by user and prompt hash.
+
+    Responses are kept in an in-memory LRU and, if `disk_path` is given, in
+    a SQLite file shared by every process using the same path. Entries
+    expire after `ttl` seconds. Because availability answers depend on
+    calendar state, a user's cached responses are dropped when their
+    calendar is written; other users' stay.
+
+    Other attributes (api_key, set_api_key, ...) are passed through to the
+    wrapped client, so the wrapper can stand in for a GeminiClient.
+    """
+
+    def __init__(self, client, max_entries=1024, ttl=300, disk_path=None, invalidate_on_calendar_write=True):
+        self.client = client
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.disk_path = disk_path
+        self._memory = collections.OrderedDict()
+        # Guards the memory tier and counters only; the disk tier is read
+        # and written outside it, on a connection per thread
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+        # Bumped when a user's entries (or all entries) are dropped, so
+        # responses fetched before that aren't cached afterwards
+        self._generations = {}
+        self._epoch = 0
+
+        self._local = threading.local()
+        self._connections = []
+        if disk_path:
+            disk = self._connection()
+            with disk:
+                disk.execute("CREATE TABLE IF NOT EXISTS llm_cache "
+                             "(key TEXT PRIMARY KEY, response TEXT NOT NULL, expires_at REAL NOT NULL)")
+                try:
+                    # Files created before entries were kept per user
+                    disk.execute("ALTER TABLE llm_cache ADD COLUMN tenant TEXT NOT NULL DEFAULT ''")
+                except sqlite3.OperationalError:
+                    pass
+                disk.execute("CREATE INDEX IF NOT EXISTS llm_cache_tenant ON llm_cache (tenant)")
+
+        self._calendar_listener = None
+        if invalidate_on_calendar_write:
+            self._calendar_listener = lambda path: self.invalidate_tenant(path_tenant(path))
+            add_write_listener(self._calendar_listener)
+
+    def __getattr__(self, name):
+        # Only called for attributes the wrapper doesn't define itself
+        if name == "client":
+            raise AttributeError(name)
+        return getattr(self.client, name)
+
+    def _connection(self):
+        """Return this thread's connection to the disk tier, or None without one."""
+        if not self.disk_path:
+            return None
+        disk = getattr(self._local, "disk", None)
+        if disk is None:
+            disk = self._local.disk = sqlite3.connect(self.disk_path, timeout=30, check_same_thread=False)
+            with self._lock:
+                self._connections.append(disk)
+        return disk
+
+    def _key(self, prompt, tenant):
+        """Return the cache key for a user's prompt."""
+        return hashlib.sha256(f"{tenant or ''}\0{prompt}".encode("utf-8")).hexdigest()
+
+    def _get(self, key, tenant, generation):
+        """Look a key up in memory, then on disk. Returns None on a miss."""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                expires_at, response, _ = entry
+                if expires_at > now:
+                    self._memory.move_to_end(key)
+                    self._counters["hits"] += 1
+                    return response
+                del self._memory[key]
+
+        disk = self._connection()
+        row = None
+        if disk is not None:
+            row = disk.execute("SELECT response, expires_at FROM llm_cache WHERE key = ?", (key,)).fetchone()
+
+        with self._lock:
+            if row is not None and row[1] > now:
+                if self._generation(tenant) == generation:
+                    self._store_memory(key, row[0], row[1], tenant)
+                self._counters["disk_hits"] += 1
+                return row[0]
+            self._counters["misses"] += 1
+            return None
+
+    def _generation(self, tenant):
+        """Return the version of a user's entries; callers hold the lock."""
+        return self._epoch, self._generations.get(tenant, 0)
+
+    def _store_memory(self, key, response, expires_at, tenant):
+        """Add an entry to the memory LRU, evicting the oldest if it is full."""
+        self._memory[key] = (expires_at, response, tenant)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self._counters["evictions"] += 1
+
+    def _put(self, key, response, tenant, generation):
+        """Cache a response, unless it is an error message or the user's entries were dropped meanwhile."""
+        if not isinstance(response, str) or response.startswith("ERROR:"):
+            return
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            if self._generation(tenant) != generation:
+                return
+            self._store_memory(key, response, expires_at, tenant)
+        disk = self._connection()
+        if disk is not None:
+            with disk:
+                disk.execute("INSERT OR REPLACE INTO llm_cache (key, response, expires_at, tenant) VALUES (?, ?, ?, ?)",
+                             (key, response, expires_at, tenant or ""))
+
+    def _lookup(self, prompt):
+        """Return (key, tenant, generation, cached response or None) for a prompt."""
+        tenant = current_tenant()
+        with self._lock:
+            generation = self._generation(tenant)
+        key = self._key(prompt, tenant)
+        return key, tenant, generation, self._get(key, tenant, generation)
+
+    def generate_content(self, prompt):
+        """Return the cached response for a prompt, calling the client on a miss."""
+        key, tenant, generation, response = self._lookup(prompt)
+        if response is None:
+            response = self.client.generate_content(prompt)
+            self._put(key, response, tenant, generation)
+        return response
+
+    async def generate_content_async(self, prompt):
+        """Async version of generate_content."""
+        key, tenant, generation, response = self._lookup(prompt)
+        if response is None:
+            if hasattr(self.client, "generate_content_async"):
+                response = await self.client.generate_content_async(prompt)
+            else:
+                response = await asyncio.to_thread(self.client.generate_content, prompt)
+            self._put(key, response, tenant, generation)
+        return response
+
+    def invalidate_tenant(self, tenant):
+        """Drop the cached responses of one user (None for the shared data)."""
+        with self._lock:
+            self._generations[tenant] = self._generations.get(tenant, 0) + 1
+            for key in [key for key, entry in self._memory.items() if entry[2] == tenant]:
+                del self._memory[key]
+            self._counters["invalidations"] += 1
+        disk = self._connection()
+        if disk is not None:
+            with disk:
+                disk.execute("DELETE FROM llm_cache WHERE tenant = ?", (tenant or "",))
+
+    def invalidate(self):
+        """Drop every cached response."""
+        with self._lock:
+            self._epoch += 1
+            self._memory.clear()
+            self._counters["invalidations"] += 1
+        disk = self._connection()
+        if disk is not None:
+            with disk:
+                disk.execute("DELETE FROM llm_cache")
+
+    def stats(self):
+        """Return hit/miss counters and the current cache size."""
+        with self._lock:
+            stats = dict(self._counters)
+            lookups = stats["hits"] + stats["disk_hits"] + stats["misses"]
+            stats["hit_rate"] = (stats["hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+            stats["memory_entries"] = len(self._memory)
+            stats["max_entries"] = self.max_entries
+            stats["ttl"] = self.ttl
+            return stats
+
+    def close(self):
+        """Stop listening for calendar writes and close the disk tier."""
+        if self._calendar_listener is not None:
+            remove_write_listener(self._calendar_listener)
+            self._calendar_listener = None
+        self.disk_path = None
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for disk in connections:
+            disk.close()
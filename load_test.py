@@ -0,0 +1,109 @@
+import argparse
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+
+DEFAULT_QUERIES = [
+    "Am I free tomorrow at 3 PM?",
+    "Check if I'm available at 2 PM today",
+    "Send an email to John about the project update"
+]
+
+def percentile(values, pct):
+    """Return the pct-th percentile of a list of numbers (nearest rank)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+def send_query(url, query, timeout):
+    """POST one query and return its status code."""
+    request = urllib.request.Request(url, data=json.dumps({"query": query}).encode("utf-8"),
+                                     headers={"Content-Type": "application/json"}, method="POST")
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            response.read()
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+    except Exception:
+        return None
+
+def run_load_test(url, total_requests=200, concurrency=16, queries=None, timeout=60):
+    """
+    Send total_requests queries from concurrency threads and measure the server.
+
+    Returns requests per second and latency percentiles of the successful
+    requests, plus how many got a 429 or failed.
+    """
+    queries = queries or DEFAULT_QUERIES
+    latencies = []
+    statuses = {}
+    lock = threading.Lock()
+    counter = iter(range(total_requests))
+
+    def worker():
+        while True:
+            with lock:
+                i = next(counter, None)
+            if i is None:
+                return
+            started = time.perf_counter()
+            status = send_query(url, queries[i % len(queries)], timeout)
+            elapsed = time.perf_counter() - started
+            with lock:
+                statuses[status] = statuses.get(status, 0) + 1
+                if status == 200:
+                    latencies.append(elapsed)
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    duration = time.perf_counter() - started
+
+    ok = statuses.get(200, 0)
+    return {
+        "requests": total_requests,
+        "concurrency": concurrency,
+        "duration_seconds": round(duration, 3),
+        "ok": ok,
+        "rejected_429": statuses.get(429, 0),
+        "failed": total_requests - ok - statuses.get(429, 0),
+        "requests_per_second": round(ok / duration, 1) if duration else 0.0,
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50) * 1000, 1),
+            "p90": round(percentile(latencies, 90) * 1000, 1),
+            "p99": round(percentile(latencies, 99) * 1000, 1),
+            "max": round(max(latencies, default=0) * 1000, 1)
+        }
+    }
+
+def main():
+    """Parse command line arguments and run the load test."""
+    parser = argparse.ArgumentParser(description="Load test the Assistant API /query endpoint")
+    parser.add_argument("--url", "-u", default="http://localhost:8081/query", help="Query endpoint to test")
+    parser.add_argument("--requests", "-n", type=int, default=200, help="Total number of requests")
+    parser.add_argument("--concurrency", "-c", type=int, default=16, help="Number of concurrent clients")
+    parser.add_argument("--timeout", type=float, default=60, help="Per-request timeout in seconds")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args()
+
+    report = run_load_test(args.url, args.requests, args.concurrency, timeout=args.timeout)
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"Requests:    {report['requests']} ({report['concurrency']} concurrent) in {report['duration_seconds']}s")
+    print(f"OK:          {report['ok']}  429: {report['rejected_429']}  failed: {report['failed']}")
+    print(f"Throughput:  {report['requests_per_second']} req/s")
+    latency = report['latency_ms']
+    print(f"Latency:     p50 {latency['p50']} ms  p90 {latency['p90']} ms  p99 {latency['p99']} ms  max {latency['max']} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+import os
+import json
+import argparse
+from functions.jsonl_store import JsonlFile, migrate_json_array
+from functions.sqlite_store import SqliteRecords
+from functions.storage import DATA_DIR, FILE_EXTENSIONS
+
+# Record files managed by the assistant
+RECORD_FILES = ['calendar', 'emails']
+
+def migrate_to_sqlite(src_path, dst_path):
+    """Load a JSON array file into a fresh SQLite table. Returns the record count."""
+    with open(src_path, 'r') as f:
+        records = json.load(f)
+
+    table = SqliteRecords(dst_path)
+    table.clear()
+    table.extend(records)
+    return len(records)
+
+def migrate(data_dir, backend="jsonl"):
+    """Convert the JSON array data files into the given backend's format."""
+    for name in RECORD_FILES:
+        src_path = os.path.join(data_dir, f"{name}.json")
+        dst_path = os.path.join(data_dir, name + FILE_EXTENSIONS[backend])
+
+        if not os.path.exists(src_path):
+            print(f"Skipping {name}: {src_path} not found")
+            continue
+
+        if backend == "sqlite":
+            count = migrate_to_sqlite(src_path, dst_path)
+        else:
+            count = migrate_json_array(src_path, dst_path)
+        print(f"Migrated {count} records from {src_path} to {dst_path}")
+
+def compact(data_dir):
+    """Compact the JSON Lines data files in place."""
+    for name in RECORD_FILES:
+        path = os.path.join(data_dir, f"{name}.jsonl")
+
+        if not os.path.exists(path):
+            print(f"Skipping {name}: {path} not found")
+            continue
+
+        count = JsonlFile(path).compact()
+        print(f"Compacted {path} to {count} records")
+
+def main():
+    """Process command-line arguments and run the requested storage task."""
+    parser = argparse.ArgumentParser(description='Migrate or compact the assistant data files')
+    parser.add_argument('--data-dir', '-d', default=DATA_DIR,
+                        help='The data directory to operate on (default: the assistant data directory)')
+    parser.add_argument('--backend', '-b', choices=['jsonl', 'sqlite'], default='jsonl',
+                        help='The storage backend to migrate to (default: jsonl)')
+    parser.add_argument('--compact', '-c', action='store_true',
+                        help='Compact existing .jsonl files instead of migrating')
+    args = parser.parse_args()
+
+    if args.compact:
+        compact(args.data_dir)
+    else:
+        migrate(args.data_dir, args.backend)
+        print(f"Set ASSISTANT_STORAGE={args.backend} to use the migrated files.")
+
+if __name__ == "__main__":
+    main()
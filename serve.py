@@ -0,0 +1,93 @@
+import argparse
+import importlib
+import os
+
+def load_app(name, max_concurrent, max_queue, queue_timeout):
+    """Import server.py or simple_server.py and build its app through the factory."""
+    module = importlib.import_module("server" if name == "server" else "simple_server")
+    return module.create_app(max_concurrent=max_concurrent, max_queue=max_queue, queue_timeout=queue_timeout)
+
+def serve_gunicorn(args):
+    """Run the app under gunicorn with several worker processes."""
+    from gunicorn.app.base import BaseApplication
+
+    class AssistantApplication(BaseApplication):
+        def load_config(self):
+            self.cfg.set("bind", f"{args.host}:{args.port}")
+            self.cfg.set("workers", args.workers)
+            self.cfg.set("threads", args.threads)
+            self.cfg.set("worker_class", "gthread")
+            self.cfg.set("timeout", args.timeout)
+            self.cfg.set("graceful_timeout", args.timeout)
+
+        def load(self):
+            # Each worker builds its own app, so every process gets its own limiter
+            return load_app(args.app, args.max_concurrent, args.max_queue, args.queue_timeout)
+
+    AssistantApplication().run()
+
+def serve_waitress(args):
+    """Run the app under waitress in this process with a pool of threads."""
+    from waitress import serve
+
+    app = load_app(args.app, args.max_concurrent, args.max_queue, args.queue_timeout)
+    serve(app, host=args.host, port=args.port, threads=args.threads,
+          connection_limit=args.max_concurrent + args.max_queue + 100, channel_timeout=args.timeout)
+
+def main():
+    """Parse command line arguments and start the production server."""
+    parser = argparse.ArgumentParser(description="Serve the Assistant API without the development server")
+    parser.add_argument("--app", "-a", choices=["server", "simple"], default="server",
+                        help="Which API to serve: server.py or simple_server.py")
+    parser.add_argument("--host", default=os.environ.get("HOST", "0.0.0.0"), help="Address to bind to")
+    parser.add_argument("--port", "-p", type=int, default=int(os.environ.get("PORT", "8081")), help="Port to listen on")
+    parser.add_argument("--workers", "-w", type=int, default=int(os.environ.get("WEB_WORKERS", "1")),
+                        help="Worker processes (more than 1 needs gunicorn)")
+    parser.add_argument("--threads", "-t", type=int, default=int(os.environ.get("WEB_THREADS", "0")),
+                        help="Threads per worker process (default: enough for the running and queued queries)")
+    parser.add_argument("--max-concurrent", type=int, default=int(os.environ.get("MAX_CONCURRENT_REQUESTS", "8")),
+                        help="Queries run at once per worker before new ones queue")
+    parser.add_argument("--max-queue", type=int, default=int(os.environ.get("MAX_QUEUED_REQUESTS", "32")),
+                        help="Queries that may wait for a slot before getting a 429")
+    parser.add_argument("--queue-timeout", type=float, default=float(os.environ.get("QUEUE_TIMEOUT", "10")),
+                        help="Seconds a query waits for a slot before getting a 429")
+    parser.add_argument("--timeout", type=int, default=120, help="Seconds before a stuck request is dropped")
+    parser.add_argument("--server", choices=["auto", "gunicorn", "waitress"], default="auto",
+                        help="WSGI server to use (auto picks gunicorn for several workers)")
+    args = parser.parse_args()
+
+    # The server only hands the app as many requests as it has threads, so
+    # the limiter can only queue or reject requests when there are more
+    # threads than running queries. One thread on top of the queue answers
+    # the 429s while every slot and queue place is taken.
+    if not args.threads:
+        args.threads = args.max_concurrent + args.max_queue + 1
+    elif args.threads <= args.max_concurrent:
+        parser.error(f"--threads ({args.threads}) must be more than --max-concurrent ({args.max_concurrent}), "
+                     f"or requests wait inside the server and never get a 429; "
+                     f"use at least {args.max_concurrent + args.max_queue + 1}")
+
+    server = args.server
+    if server == "auto":
+        server = "waitress"
+        if args.workers > 1:
+            try:
+                import gunicorn  # noqa: F401
+                server = "gunicorn"
+            except ImportError:
+                print("gunicorn is not installed, falling back to a single waitress process")
+
+    print(f"Starting Assistant API ({args.app}) on {args.host}:{args.port} with {server}: "
+          f"{args.workers if server == 'gunicorn' else 1} worker(s) x {args.threads} thread(s), "
+          f"{args.max_concurrent} concurrent queries, queue of {args.max_queue}")
+
+    try:
+        if server == "gunicorn":
+            serve_gunicorn(args)
+        else:
+            serve_waitress(args)
+    except ImportError as e:
+        print(f"{e.name} is not installed. Install it with: pip install {e.name}")
+
+if __name__ == "__main__":
+    main()
@@ -1,27 +1,87 @@
-from flask import Flask, request, jsonify
+from flask import Blueprint, Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
+from concurrency import ConcurrencyLimiter
 import os
 import json
-from console_agent import run_agent_in_console
+from console_agent import SimpleConsoleClient, SimulatedLatencyClient, clean_final_answer, friendly_response
 from agent import AssistantAgent
+from debug_mirror import DebugMirror
+from functions.metrics import metrics
+from functions.storage import tenant_scope, validate_tenant
 from gemini_client import GeminiClient
+from llm_cache import CachingLLMClient
 
-app = Flask(__name__)
-CORS(app)  # Enable CORS for all routes
+api = Blueprint('api', __name__)
 
 # Initialize the Gemini client from stored credentials if available
 gemini_client = GeminiClient.load_from_storage()
 print(f"Gemini API key status: {'Loaded' if gemini_client.api_key else 'Not configured'}")
 
+# Cache repeated LLM responses (LLM_CACHE_SIZE=0 disables the cache)
+llm_cache_size = int(os.environ.get("LLM_CACHE_SIZE", "1024"))
+llm_client = gemini_client
+if llm_cache_size > 0:
+    llm_client = CachingLLMClient(
+        gemini_client,
+        max_entries=llm_cache_size,
+        ttl=float(os.environ.get("LLM_CACHE_TTL", "300")),
+        disk_path=os.environ.get("LLM_CACHE_PATH") or None
+    )
+
 # Initialize the agent
 assistant_agent = AssistantAgent(verbose=False)
 
-@app.route('/query', methods=['POST'])
+# Let Gemini return function calls natively instead of as JSON text
+if assistant_agent.protocol == "json" and os.environ.get("GEMINI_FUNCTION_CALLING") == "1":
+    gemini_client.enable_function_calling(assistant_agent.function_schemas)
+
+# Simulated LLM latency for the scripted fallback client, for load testing
+stub_llm_latency = float(os.environ.get("STUB_LLM_LATENCY_MS", "0")) / 1000
+
+# Log a sample of agent traces for debugging, from a background thread
+# (DEBUG_MIRROR_SAMPLE_RATE=0 turns it off, DEBUG_MIRROR_LOG writes to a file)
+debug_mirror = DebugMirror(
+    sample_rate=float(os.environ.get("DEBUG_MIRROR_SAMPLE_RATE", "1.0")),
+    log_path=os.environ.get("DEBUG_MIRROR_LOG") or None
+)
+
+def query_client():
+    """Return the LLM client for a query: Gemini if configured, else the scripted console client."""
+    if gemini_client.api_key:
+        return llm_client
+    return SimulatedLatencyClient(SimpleConsoleClient(), stub_llm_latency)
+
+def user_response(result):
+    """Return the answer shown to the user for an agent result."""
+    response = clean_final_answer(result)
+    
+    # If the response still contains a FUNCTION_CALL, convert it to a user-friendly message
+    if "FUNCTION_CALL:" in response:
+        response = friendly_response(response)
+    return response
+
+def request_user(data):
+    """
+    Return the user whose calendar and email log a request uses.
+    
+    The id comes from a 'user_id' field in the JSON body or the 'user_id'
+    URL parameter. Without one, the request uses the shared data. Raises
+    ValueError for ids that can't name a data directory.
+    """
+    user_id = (data or {}).get('user_id') or request.args.get('user_id')
+    return validate_tenant(str(user_id)) if user_id else None
+
+def sse_event(event, data):
+    """Format one server-sent event."""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+@api.route('/query', methods=['POST'])
 def process_query():
     """
     Process a query from the Chrome extension.
     
-    The request should have a JSON body with a 'query' field.
+    The request should have a JSON body with a 'query' field, and can
+    have a 'user_id' field to use that user's calendar and email log.
     """
     try:
         data = request.json
@@ -29,34 +89,18 @@ def process_query():
             return jsonify({"error": "No query provided"}), 400
         
         query = data['query']
+        try:
+            user_id = request_user(data)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
         
-        # Process in the console for debugging (this doesn't affect the response)
-        debug_response = run_agent_in_console(query, scenario="auto", clean_output=False)
+        # Run the agent exactly once, with the real LLM if it's configured
+        with tenant_scope(user_id):
+            result = assistant_agent.process_query(query, query_client(), show_iterations=False, include_prompts=False)
+        response = user_response(result)
         
-        # Check if we have a working Gemini client
-        if gemini_client.api_key:
-            # Process using the real LLM
-            result = assistant_agent.process_query(query, gemini_client, show_iterations=False)
-            response = result['final_answer']
-            
-            # If the response still contains a FUNCTION_CALL, convert it to a user-friendly message
-            if "FUNCTION_CALL:" in response:
-                # Get the final answer from the console agent instead
-                response = run_agent_in_console(query, scenario="auto", clean_output=True)
-        else:
-            # Use the auto-detected response but make sure it's human-readable
-            response = run_agent_in_console(query, scenario="auto", clean_output=True)
-            
-            # If the response still contains a FUNCTION_CALL, convert it to a user-friendly message
-            if "FUNCTION_CALL:" in response:
-                if "schedule_meeting" in response:
-                    response = "I've scheduled a meeting with John for tomorrow at 3 PM and sent an email reminder."
-                elif "check_calendar_availability" in response:
-                    response = "I've checked your calendar availability. You are available at that time."
-                elif "send_email" in response:
-                    response = "I've sent the email as requested. Check the console for details."
-                else:
-                    response = "I've processed your request. Check the console for details."
+        # Hand the trace to the debug mirror; it's written off the request path
+        debug_mirror.submit(query, result)
         
         # Return the response to the extension
         simplified_result = {
@@ -69,7 +113,50 @@ def process_query():
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-@app.route('/config/gemini', methods=['POST'])
+@api.route('/query/stream', methods=['GET', 'POST'])
+def stream_query():
+    """
+    Process a query and stream the agent's progress as server-sent events.
+    
+    The query comes from a JSON body with a 'query' field, or from the
+    'query' URL parameter so EventSource (GET only) can be used. Events are
+    llm_response, function_call and function_result as they happen, then
+    final_answer carrying the same fields as a /query response. A
+    'user_id' is taken the same way as the query.
+    """
+    data = request.get_json(silent=True) if request.method == 'POST' else None
+    query = (data or {}).get('query') or request.args.get('query')
+    if not query:
+        return jsonify({"error": "No query provided"}), 400
+    try:
+        user_id = request_user(data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    def generate():
+        try:
+            events = assistant_agent.stream_query(query, query_client(), show_iterations=False, include_prompts=False)
+            # The agent runs as the stream is consumed, so the scope goes here
+            with tenant_scope(user_id):
+                for event in events:
+                    if event["event"] == "final_answer":
+                        result = event["result"]
+                        debug_mirror.submit(query, result)
+                        yield sse_event("final_answer", {
+                            "query": query,
+                            "response": user_response(result),
+                            "using_gemini": bool(gemini_client.api_key)
+                        })
+                    else:
+                        yield sse_event(event["event"], {k: v for k, v in event.items() if k != "event"})
+        except Exception as e:
+            yield sse_event("error", {"error": str(e)})
+    
+    # Stop proxies from buffering the stream
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return Response(stream_with_context(generate()), mimetype='text/event-stream', headers=headers)
+
+@api.route('/config/gemini', methods=['POST'])
 def configure_gemini():
     """
     Configure the Gemini API key.
@@ -93,6 +180,9 @@ def configure_gemini():
         # Save the API key if the test was successful
         if not test_response.startswith("ERROR:"):
             gemini_client.save_api_key()
+            # Responses from the previous key shouldn't be served anymore
+            if isinstance(llm_client, CachingLLMClient):
+                llm_client.invalidate()
             return jsonify({
                 "success": True,
                 "message": "Gemini API key configured successfully",
@@ -108,14 +198,26 @@ def configure_gemini():
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
-@app.route('/config/status', methods=['GET'])
+@api.route('/config/status', methods=['GET'])
 def get_config_status():
     """Check the configuration status."""
     return jsonify({
         "gemini_configured": bool(gemini_client.api_key)
     })
 
-@app.route('/debug', methods=['GET'])
+@api.route('/cache/stats', methods=['GET'])
+def get_cache_stats():
+    """Report LLM response cache hit/miss counters."""
+    if not isinstance(llm_client, CachingLLMClient):
+        return jsonify({"enabled": False})
+    return jsonify({"enabled": True, **llm_client.stats()})
+
+@api.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Return the agent's latency histograms and counters in the Prometheus text format."""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@api.route('/debug', methods=['GET'])
 def debug():
     """A simple debug endpoint to check if the server is running."""
     return jsonify({
@@ -124,6 +226,27 @@ def debug():
         "gemini_configured": bool(gemini_client.api_key)
     })
 
+def create_app(max_concurrent=None, max_queue=32, queue_timeout=10.0):
+    """
+    Create the Flask app serving the assistant API.
+    
+    When max_concurrent is set, /query requests beyond that many wait in a
+    queue of max_queue and get a 429 response when it is full.
+    """
+    app = Flask(__name__)
+    CORS(app)  # Enable CORS for all routes
+    app.register_blueprint(api)
+    
+    if max_concurrent:
+        limiter = ConcurrencyLimiter(app.wsgi_app, max_concurrent, max_queue, queue_timeout)
+        app.wsgi_app = limiter
+        app.extensions['concurrency_limiter'] = limiter
+    
+    return app
+
+# App for the development server and existing imports
+app = create_app()
+
 if __name__ == '__main__':
     # Ensure the data directory exists
     data_dir = os.path.join(os.path.dirname(__file__), 'data')
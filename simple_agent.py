@@ -1,8 +1,10 @@
 import os
 import sys
-import json
 import argparse
 from agent import AssistantAgent
+from functions.calendar_functions import CALENDAR_FILE
+from functions.email_functions import EMAIL_FILE
+from functions.storage import open_records
 
 class SimpleResponseClient:
     """A simple client that returns predefined responses for testing."""
@@ -89,24 +91,21 @@ def main():
         if args.debug:
             print("\n--- Debug Information ---")
             # Display the calendar and email data
-            data_dir = os.path.join(os.path.dirname(__file__), 'data')
             try:
-                with open(os.path.join(data_dir, 'calendar.json'), 'r') as f:
-                    calendar_data = json.load(f)
-                    if calendar_data:
-                        print("\nCalendar:")
-                        for meeting in calendar_data:
-                            print(f"- Meeting with {meeting['attendee']} at {meeting['start_time']}")
+                calendar_data = open_records(CALENDAR_FILE).load()
+                if calendar_data:
+                    print("\nCalendar:")
+                    for meeting in calendar_data:
+                        print(f"- Meeting with {meeting['attendee']} at {meeting['start_time']}")
             except Exception:
                 pass
             
             try:
-                with open(os.path.join(data_dir, 'emails.json'), 'r') as f:
-                    email_data = json.load(f)
-                    if email_data:
-                        print("\nEmails:")
-                        for email in email_data:
-                            print(f"- Email to {email['to']} with subject '{email['subject']}'")
+                email_data = open_records(EMAIL_FILE).load()
+                if email_data:
+                    print("\nEmails:")
+                    for email in email_data:
+                        print(f"- Email to {email['to']} with subject '{email['subject']}'")
             except Exception:
                 pass
     else:
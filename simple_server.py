@@ -1,17 +1,76 @@
-from flask import Flask, request, jsonify
+from flask import Blueprint, Flask, request, jsonify
 from flask_cors import CORS
+from concurrency import ConcurrencyLimiter
+from concurrent.futures import ProcessPoolExecutor
 import subprocess
 import os
+from agent import AssistantAgent
+from console_agent import run_clean_query
+from functions.storage import tenant_scope, validate_tenant
 
-app = Flask(__name__)
-CORS(app)  # Enable CORS for all routes
+api = Blueprint('api', __name__)
 
-@app.route('/query', methods=['POST'])
+# How queries are executed:
+#   "inprocess"  - in this process with a warm agent (default)
+#   "pool"       - in a pool of pre-forked worker processes, each with a warm agent
+#   "subprocess" - a fresh `console_agent.py --clean` process per request
+EXECUTION_MODE = os.environ.get("SIMPLE_SERVER_MODE", "inprocess").lower()
+POOL_WORKERS = int(os.environ.get("SIMPLE_SERVER_WORKERS", str(os.cpu_count() or 2)))
+
+# The agent keeps no per-query state, so one instance serves every request
+warm_agent = AssistantAgent(verbose=False)
+
+# Agent owned by each pool worker process
+_worker_agent = None
+
+def _init_worker():
+    """Create the warm agent in a pool worker."""
+    global _worker_agent
+    _worker_agent = AssistantAgent(verbose=False)
+
+def _run_in_worker(query, user_id=None):
+    """Run a query in a pool worker."""
+    with tenant_scope(user_id):
+        return run_clean_query(query, agent=_worker_agent)
+
+def _warm_up(_):
+    """No-op task used to start every pool worker up front."""
+    return os.getpid()
+
+worker_pool = None
+
+def get_worker_pool():
+    """Return the worker pool, starting its processes on first use."""
+    global worker_pool
+    if worker_pool is None:
+        worker_pool = ProcessPoolExecutor(max_workers=POOL_WORKERS, initializer=_init_worker)
+        list(worker_pool.map(_warm_up, range(POOL_WORKERS)))
+    return worker_pool
+
+def run_query(query, user_id=None):
+    """Run a query in the configured mode, with a user's data if given, and return the clean answer."""
+    if EXECUTION_MODE == "subprocess":
+        # Run the console_agent.py script with the clean flag
+        user_args = ["--user", user_id] if user_id else []
+        result = subprocess.run(
+            ["python3", "console_agent.py", query, "--clean"] + user_args,
+            capture_output=True,
+            text=True,
+            check=True
+        )
+        return result.stdout.strip()
+    if EXECUTION_MODE == "pool":
+        return get_worker_pool().submit(_run_in_worker, query, user_id).result()
+    with tenant_scope(user_id):
+        return run_clean_query(query, agent=warm_agent)
+
+@api.route('/query', methods=['POST'])
 def process_query():
     """
-    Process a query from the Chrome extension by running console_agent.py with the --clean flag.
+    Process a query from the Chrome extension, returning the same answer as console_agent.py --clean.
     
-    The request should have a JSON body with a 'query' field.
+    The request should have a JSON body with a 'query' field, and can
+    have a 'user_id' field to use that user's calendar and email log.
     """
     try:
         data = request.json
@@ -19,18 +78,14 @@ def process_query():
             return jsonify({"error": "No query provided"}), 400
         
         query = data['query']
+        user_id = data.get('user_id')
+        try:
+            user_id = validate_tenant(str(user_id)) if user_id else None
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
         
-        # Run the console_agent.py script with the clean flag
-        # This avoids import issues and ensures we get the exact same output format
-        result = subprocess.run(
-            ["python3", "console_agent.py", query, "--clean"],
-            capture_output=True,
-            text=True,
-            check=True
-        )
-        
-        # Get the clean output from the subprocess
-        clean_response = result.stdout.strip()
+        # Get the clean answer without paying for a new interpreter per request
+        clean_response = run_query(query, user_id)
         
         # If the response still contains a FUNCTION_CALL, convert it to a user-friendly message
         if "FUNCTION_CALL:" in clean_response:
@@ -55,7 +110,7 @@ def process_query():
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-@app.route('/debug', methods=['GET'])
+@api.route('/debug', methods=['GET'])
 def debug():
     """A simple debug endpoint to check if the server is running."""
     return jsonify({
@@ -63,10 +118,31 @@ def debug():
         "message": "Assistant API is operational"
     })
 
+def create_app(max_concurrent=None, max_queue=32, queue_timeout=10.0):
+    """
+    Create the Flask app serving the simple assistant API.
+    
+    When max_concurrent is set, /query requests beyond that many wait in a
+    queue of max_queue and get a 429 response when it is full.
+    """
+    app = Flask(__name__)
+    CORS(app)  # Enable CORS for all routes
+    app.register_blueprint(api)
+    
+    if max_concurrent:
+        limiter = ConcurrencyLimiter(app.wsgi_app, max_concurrent, max_queue, queue_timeout)
+        app.wsgi_app = limiter
+        app.extensions['concurrency_limiter'] = limiter
+    
+    return app
+
+# App for the development server and existing imports
+app = create_app()
+
 if __name__ == '__main__':
     # Ensure the data directory exists
     data_dir = os.path.join(os.path.dirname(__file__), 'data')
     os.makedirs(data_dir, exist_ok=True)
     
-    print("Starting Simple Assistant API server...")
+    print(f"Starting Simple Assistant API server ({EXECUTION_MODE} mode)...")
     app.run(host='0.0.0.0', port=8081, debug=True) 
\ No newline at end of file
@@ -1,8 +1,28 @@
+import contextlib
+import datetime
 import json
 import os
+import shutil
+import smtplib
+import subprocess
 import sys
+import tempfile
+import threading
 import time
+import functions.contacts as contacts
 from agent import AssistantAgent
+from llm_cache import CachingLLMClient
+from functions.calendar_store import add_write_listener, get_calendar_store, notify_write, remove_write_listener
+from functions.email_delivery import FAILED, QUEUED, SENT, EmailQueue, SMTPConnectionPool, _is_permanent
+from functions.jsonl_store import JsonlFile
+from functions.registry import TOOLS, Tool
+from functions.safe_write import atomic_write
+from functions.sqlite_store import SqliteRecords
+from functions.calendar_functions import calendar_file, schedule_meeting
+from functions.storage import (
+    DATA_DIR, JsonArrayFile, data_file, open_records, path_tenant, tenant_dir, tenant_scope, validate_tenant
+)
+from functions.time_parser import parse_time_expression
 
 # Simple mock LLM client for testing
 class MockLLMClient:
@@ -12,6 +32,46 @@ class MockLLMClient:
     def generate_content(self, prompt):
         return prompt
 
+class CountingLLMClient:
+    """Mock LLM client that counts its calls and answers with the prompt."""
+    def __init__(self):
+        self.calls = 0
+    
+    def generate_content(self, prompt):
+        self.calls += 1
+        return f"Answer to: {prompt}"
+
+class ScriptedSMTP:
+    """Mock SMTP connection that refuses messages according to their recipient."""
+    def __init__(self):
+        self.sent = []
+        self.attempts = {}
+        self.closed = False
+    
+    def send_message(self, message):
+        to = message["To"]
+        self.attempts[to] = self.attempts.get(to, 0) + 1
+        if to.startswith("busy@") or (to.startswith("flaky@") and self.attempts[to] == 1):
+            raise smtplib.SMTPDataError(451, b"Try again later")
+        if to.startswith("unknown@"):
+            raise smtplib.SMTPRecipientsRefused({to: (550, b"No such user")})
+        self.sent.append(to)
+    
+    def close(self):
+        self.closed = True
+
+class ScriptedPool:
+    """Mock connection pool that always hands out the same ScriptedSMTP."""
+    def __init__(self):
+        self.smtp = ScriptedSMTP()
+    
+    @contextlib.contextmanager
+    def connection(self):
+        yield self.smtp
+    
+    def close(self):
+        pass
+
 def run_test_queries():
     """Run a series of test queries to verify agent functionality."""
     agent = AssistantAgent()
@@ -58,5 +118,446 @@ def run_test_queries():
     
     print("\n===== ALL TESTS COMPLETED =====\n")
 
+def run_parser_tests():
+    """Check that function calls without parameters are parsed and run with the defaults."""
+    agent = AssistantAgent()
+    
+    print("\n===== RUNNING PARSER TESTS =====\n")
+    
+    calls = agent._extract_function_calls("FUNCTION_CALL: get_upcoming_meetings|\nFUNCTION_CALL: get_sent_emails|")
+    result = agent._execute_function_call(calls[0]) if calls else {}
+    if calls == ["FUNCTION_CALL: get_upcoming_meetings|", "FUNCTION_CALL: get_sent_emails|"] and "meetings" in result.get("result", {}):
+        print("Test PASSED: calls without parameters use the defaults")
+    else:
+        print(f"Test FAILED: calls without parameters gave {calls} and {result}")
+    
+    print("\n===== ALL PARSER TESTS COMPLETED =====\n")
+
+def check(description, passed, details=None):
+    """Print whether one check passed."""
+    if passed:
+        print(f"Test PASSED: {description}")
+    else:
+        print(f"Test FAILED: {description} (got {details})")
+
+def run_calendar_cache_tests():
+    """Check that parsed calendars are reused until their file changes."""
+    print("\n===== RUNNING CALENDAR CACHE TESTS =====\n")
+    
+    changed = []
+    add_write_listener(changed.append)
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "calendar.json")
+            atomic_write(path, b"[]")
+            store = get_calendar_store(path)
+            check("an unchanged calendar is not parsed again", get_calendar_store(path) is store)
+            
+            store.append_new({"title": "Standup", "attendee": "John",
+                              "start_time": "2030-01-07T09:00:00", "end_time": "2030-01-07T09:15:00"})
+            check("our own writes don't trigger a reload", get_calendar_store(path) is store and changed == [path], changed)
+            
+            # Another process rewrites the file
+            meetings = [{"id": 7, "title": "Review", "attendee": "Sarah",
+                         "start_time": "2030-01-07T10:00:00", "end_time": "2030-01-07T11:00:00"}]
+            atomic_write(path, json.dumps(meetings).encode("utf-8"))
+            reloaded = get_calendar_store(path)
+            check("a calendar changed on disk is reloaded", reloaded is not store and reloaded.count() == 1,
+                  reloaded.count())
+            check("a reload tells the write listeners", changed == [path, path], changed)
+    except Exception as e:
+        print(f"Test FAILED: {e}")
+    finally:
+        remove_write_listener(changed.append)
+    
+    print("\n===== ALL CALENDAR CACHE TESTS COMPLETED =====\n")
+
+def run_jsonl_tests():
+    """Check that JSON Lines files keep the latest version of each record, in first-added order."""
+    print("\n===== RUNNING JSONL STORAGE TESTS =====\n")
+    
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "emails.jsonl")
+            records = JsonlFile(path)
+            for subject in ("first", "second", "third"):
+                records.append_new({"subject": subject, "status": "queued"})
+            records.replace([{"id": 1, "subject": "first", "status": "sent"}])
+            
+            loaded = records.load()
+            check("a new version replaces the record in place",
+                  [(r["id"], r["status"]) for r in loaded] == [(1, "sent"), (2, "queued"), (3, "queued")], loaded)
+            check("count() counts each id once", records.count() == 3, records.count())
+            tail = records.tail(3)
+            check("tail() is newest first by first version",
+                  [r["id"] for r in tail] == [3, 2, 1] and tail[-1]["status"] == "sent", tail)
+            check("tail() stops at the limit", [r["id"] for r in records.tail(2)] == [3, 2], records.tail(2))
+            
+            # A torn write at the end of the file is skipped
+            with open(path, 'a') as f:
+                f.write('{"id": 4, "subj')
+            reopened = JsonlFile(path)
+            check("a fresh index over the file gives the same records", reopened.load() == loaded, reopened.load())
+            compacted = reopened.compact()
+            with open(path) as f:
+                lines = f.readlines()
+            check("compact() keeps one line per record",
+                  compacted == 3 and len(lines) == 3 and reopened.load() == loaded, lines)
+            check("new ids continue after compaction", reopened.append_new({"subject": "fourth"})["id"] == 4)
+    except Exception as e:
+        print(f"Test FAILED: {e}")
+    
+    print("\n===== ALL JSONL STORAGE TESTS COMPLETED =====\n")
+
+def run_sqlite_tests():
+    """Check the SQLite tables, their indexes and the order of recent records."""
+    print("\n===== RUNNING SQLITE STORAGE TESTS =====\n")
+    
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            records = SqliteRecords(os.path.join(tmp, "emails.db"))
+            conn = records.connection()
+            columns = [row[1] for row in conn.execute('PRAGMA table_info("emails")')]
+            indexes = {row[1] for row in conn.execute('PRAGMA index_list("emails")')}
+            check("the indexed fields get their own columns",
+                  columns == ["rowid", "id", "to", "subject", "sent_at", "status", "record"], columns)
+            check("the indexes are created",
+                  {"idx_emails_id", "idx_emails_to", "idx_emails_sent_at"} <= indexes, indexes)
+            
+            for i in range(1, 4):
+                records.append_new({"to": "john@example.com", "subject": f"Sent {i}",
+                                    "sent_at": f"2030-01-0{i}T09:00:00", "status": "sent"})
+            # Not delivered yet, so it has no sent_at
+            queued = records.append_new({"to": "sarah@example.com", "subject": "Queued",
+                                         "queued_at": "2030-01-04T09:00:00", "status": "queued"})
+            tail = records.tail(3)
+            check("tail() is newest first, including emails not sent yet",
+                  [r["subject"] for r in tail] == ["Queued", "Sent 3", "Sent 2"], tail)
+            
+            records.replace([dict(queued, status="failed")])
+            check("replace() updates the record and its columns",
+                  records.query('"status" = ?', ("failed",)) == [dict(queued, status="failed")] and records.count() == 4)
+            check("tail() order doesn't change after an update",
+                  [r["subject"] for r in records.tail(2)] == ["Queued", "Sent 3"], records.tail(2))
+            conn.close()
+    except Exception as e:
+        print(f"Test FAILED: {e}")
+    
+    print("\n===== ALL SQLITE STORAGE TESTS COMPLETED =====\n")
+
+def run_time_parser_tests():
+    """Check the times the parser accepts and the reasons it gives for those it rejects."""
+    print("\n===== RUNNING TIME PARSER TESTS =====\n")
+    
+    reference = datetime.date(2030, 1, 7)
+    expected_times = {
+        "3pm": datetime.datetime(2030, 1, 7, 15, 0),
+        "3 p.m.": datetime.datetime(2030, 1, 7, 15, 0),
+        "3P.M.": datetime.datetime(2030, 1, 7, 15, 0),
+        "12 am": datetime.datetime(2030, 1, 7, 0, 0),
+        "12 PM": datetime.datetime(2030, 1, 7, 12, 0),
+        "tomorrow 3:30 pm": datetime.datetime(2030, 1, 8, 15, 30),
+        "Today at 15:00": datetime.datetime(2030, 1, 7, 15, 0),
+        "2030-02-01T10:30:00": datetime.datetime(2030, 2, 1, 10, 30)
+    }
+    for time_str, expected in expected_times.items():
+        parsed = parse_time_expression(time_str, reference)
+        check(f"'{time_str}' is parsed", parsed.value == expected, parsed)
+    
+    expected_errors = {
+        "13pm": "Invalid hour in '13pm'",
+        "0pm": "Invalid hour in '0pm'",
+        "25:00": "Invalid hour in '25:00'",
+        "3:75 pm": "Invalid minutes in '3:75 pm'",
+        "meet at 3": "No time found",
+        "2030-13-01T10:00": "Invalid ISO date and time"
+    }
+    for time_str, error in expected_errors.items():
+        parsed = parse_time_expression(time_str, reference)
+        check(f"'{time_str}' is rejected", parsed.value is None and (parsed.error or "").startswith(error), parsed)
+    check("a time that isn't a string is rejected", parse_time_expression(15, reference).value is None)
+    
+    print("\n===== ALL TIME PARSER TESTS COMPLETED =====\n")
+
+def run_llm_cache_tests():
+    """Check that cached LLM responses are kept and invalidated per user."""
+    print("\n===== RUNNING LLM CACHE TESTS =====\n")
+    
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            client = CountingLLMClient()
+            cache = CachingLLMClient(client, disk_path=os.path.join(tmp, "llm_cache.db"))
+            try:
+                def ask(tenant):
+                    with tenant_scope(tenant):
+                        return cache.generate_content("Am I free at 3 PM?")
+                
+                ask("alice")
+                ask("alice")
+                check("a repeated prompt is answered from the cache", client.calls == 1, client.calls)
+                ask("bob")
+                check("users don't share cached responses", client.calls == 2, client.calls)
+                
+                cache.invalidate_tenant("alice")
+                ask("alice")
+                ask("bob")
+                check("invalidating a user keeps other users' responses", client.calls == 3, client.calls)
+                
+                # A write to Bob's calendar drops only Bob's responses
+                notify_write(os.path.join(DATA_DIR, "tenants", "ab", "bob", "calendar.json"))
+                ask("bob")
+                ask("alice")
+                check("a calendar write invalidates its user's responses", client.calls == 4, client.calls)
+                
+                other_process = CachingLLMClient(client, disk_path=os.path.join(tmp, "llm_cache.db"))
+                with tenant_scope("alice"):
+                    other_process.generate_content("Am I free at 3 PM?")
+                with tenant_scope("carol"):
+                    other_process.generate_content("Am I free at 3 PM?")
+                check("the disk cache is shared per user", client.calls == 5 and other_process.stats()["disk_hits"] == 1,
+                      other_process.stats())
+                other_process.close()
+            finally:
+                cache.close()
+    except Exception as e:
+        print(f"Test FAILED: {e}")
+    
+    print("\n===== ALL LLM CACHE TESTS COMPLETED =====\n")
+
+def run_registry_tests():
+    """Check how registered tools split and convert their arguments."""
+    print("\n===== RUNNING REGISTRY TESTS =====\n")
+    
+    send_email = TOOLS["send_email"]
+    params = send_email.parse_params("John,Hello,Hi John, see you at 3, thanks")
+    check("a trailing string parameter keeps its commas",
+          params == (["John", "Hello", "Hi John, see you at 3, thanks"], {}), params)
+    params = send_email.parse_params("John,Hello,None")
+    check("'None' gives None for an optional parameter", params == (["John", "Hello", None], {}), params)
+    
+    batch = TOOLS["check_calendar_availability_batch"]
+    expected = ([["tomorrow 2 PM", "tomorrow 3 PM"]], {})
+    for params_str in ("tomorrow 2 PM, tomorrow 3 PM,", '["tomorrow 2 PM", "tomorrow 3 PM"]'):
+        params = batch.parse_params(params_str)
+        check(f"a list parameter is read from '{params_str}'", params == expected, params)
+    arguments = batch.coerce_arguments({"time_strs": ["tomorrow 2 PM", 3]})
+    check("JSON list items are converted to strings", arguments == {"time_strs": ["tomorrow 2 PM", "3"]}, arguments)
+    
+    get_sent_emails = TOOLS["get_sent_emails"]
+    params = get_sent_emails.parse_params("limit=3")
+    check("keyword parameters are converted", params == ([], {"limit": 3}), params)
+    try:
+        get_sent_emails.parse_params("lots")
+        check("an invalid integer is rejected", False, "no error")
+    except ValueError as e:
+        check("an invalid integer is rejected", str(e).startswith("Invalid value for limit"), e)
+    check("the JSON schema and the prompt describe a tool the same way",
+          get_sent_emails.schema["description"] == get_sent_emails.description, get_sent_emails.schema)
+    
+    def notify(urgent: bool, note: str = None):
+        return urgent
+    flag = Tool(notify, "notify", "Test tool", "test")
+    params = [flag.parse_params(value)[0][0] for value in ("yes", "True", "0", "false")]
+    check("booleans are read from words and digits", params == [True, True, False, False], params)
+    check("booleans get a boolean schema", flag.schema["parameters"]["properties"]["urgent"] == {"type": "boolean"},
+          flag.schema)
+    try:
+        flag.parse_params("maybe")
+        check("an invalid boolean is rejected", False, "no error")
+    except ValueError as e:
+        check("an invalid boolean is rejected", "expected true or false" in str(e), e)
+    
+    print("\n===== ALL REGISTRY TESTS COMPLETED =====\n")
+
+def run_tenant_tests():
+    """Check user id validation, the sharded user directories and that users' data is kept apart."""
+    print("\n===== RUNNING TENANT TESTS =====\n")
+    
+    for tenant in ("", "..", "../alice", "alice/bob", "a" * 129, None):
+        try:
+            validate_tenant(tenant)
+            check(f"user id {tenant!r:.20} is rejected", False, "no error")
+        except ValueError:
+            check(f"user id {tenant!r:.20} is rejected", True)
+    check("user ids with dots, dashes and @ are accepted",
+          validate_tenant("alice.smith-1@example.com") == "alice.smith-1@example.com")
+    
+    tenant = f"test-tenant-{os.getpid()}"
+    directory = tenant_dir(tenant)
+    try:
+        shard = os.path.relpath(os.path.dirname(directory), os.path.join(DATA_DIR, "tenants"))
+        check("users are sharded by a two-character hash prefix",
+              len(shard) == 2 and os.path.basename(directory) == tenant and os.path.isdir(directory), directory)
+        path = data_file("calendar", tenant=tenant)
+        check("a user's files map back to the user", path_tenant(path) == tenant and path_tenant(calendar_file()) is None,
+              path_tenant(path))
+        
+        shared_meetings = open_records(calendar_file()).count()
+        with tenant_scope(tenant):
+            result = schedule_meeting("John", "tomorrow 3 PM")
+            check("a scoped function writes the user's own calendar",
+                  result.get("success") and calendar_file() == path and open_records(path).count() == 1, result)
+        check("the shared calendar is left alone", open_records(calendar_file()).count() == shared_meetings)
+    except Exception as e:
+        print(f"Test FAILED: {e}")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    
+    print("\n===== ALL TENANT TESTS COMPLETED =====\n")
+
+def run_concurrent_write_tests(writers=8, records_per_writer=10):
+    """Check that concurrent writers to one record file never lose records or reuse ids."""
+    print("\n===== RUNNING CONCURRENT WRITE TESTS =====\n")
+    
+    record_types = {"json": JsonArrayFile, "jsonl": JsonlFile, "sqlite": SqliteRecords}
+    with tempfile.TemporaryDirectory() as tmp:
+        for backend, record_type in record_types.items():
+            try:
+                path = data_file("emails", backend=backend).replace(DATA_DIR, tmp, 1)
+                
+                def write(i):
+                    # Half the writers share the process-wide record file, the
+                    # others open their own, like separate processes would
+                    records = open_records(path) if i % 2 else record_type(path)
+                    for n in range(records_per_writer):
+                        records.append_new({"to": f"writer{i}@example.com", "subject": f"Email {n}"})
+                
+                threads = [threading.Thread(target=write, args=(i,)) for i in range(writers)]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+                
+                ids = sorted(record["id"] for record in open_records(path).load())
+                check(f"{backend}: concurrent append_new keeps every record with a unique id",
+                      ids == list(range(1, writers * records_per_writer + 1)), f"{len(ids)} records, {len(set(ids))} ids")
+            except Exception as e:
+                print(f"Test FAILED: {backend}: {e}")
+    
+    print("\n===== ALL CONCURRENT WRITE TESTS COMPLETED =====\n")
+
+def run_email_delivery_tests():
+    """Check how delivery failures are classified, retried and recorded."""
+    print("\n===== RUNNING EMAIL DELIVERY TESTS =====\n")
+    
+    check("4xx replies are temporary", not _is_permanent(smtplib.SMTPDataError(451, b"Try again later")))
+    check("5xx replies are permanent", _is_permanent(smtplib.SMTPDataError(554, b"Rejected")))
+    check("a recipient refused with 5xx is permanent",
+          _is_permanent(smtplib.SMTPRecipientsRefused({"a@example.com": (550, b"No such user")})))
+    check("a recipient refused with 4xx is temporary",
+          not _is_permanent(smtplib.SMTPRecipientsRefused({"a@example.com": (450, b"Mailbox busy"),
+                                                           "b@example.com": (550, b"No such user")})))
+    check("a lost connection is temporary", not _is_permanent(smtplib.SMTPServerDisconnected("Lost")))
+    
+    # Start a process and let it exit, so its pid is of a process that stopped
+    stopped = subprocess.Popen([sys.executable, "-c", "pass"])
+    stopped.wait()
+    
+    pool = ScriptedPool()
+    outbox = EmailQueue(pool, "assistant@example.com", workers=1, max_attempts=3, retry_delay=0.01)
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "emails.jsonl")
+            records = open_records(path)
+            for name in ("ok", "flaky", "busy", "unknown"):
+                # The first was queued by a process that stopped before sending it
+                queued_by = stopped.pid if name == "ok" else os.getpid()
+                email = records.append_new({"to": f"{name}@example.com", "subject": "Hello", "body": "Hi",
+                                            "message_id": f"<{name}@example.com>", "status": QUEUED,
+                                            "queued_at": "2030-01-07T09:00:00", "queued_by": queued_by})
+                if name != "ok":
+                    outbox.enqueue(path, email)
+            check("only emails left queued by a stopped process are requeued", outbox.requeue_pending(path) == 1)
+            check("the queue drains", outbox.wait(10))
+            
+            outcomes = {email["to"].split("@")[0]: email for email in records.load()}
+            summary = {name: (email["status"], email["attempts"]) for name, email in outcomes.items()}
+            check("delivered emails are sent", summary["ok"] == (SENT, 1) and "sent_at" in outcomes["ok"], summary)
+            check("a temporary failure is retried", summary["flaky"] == (SENT, 2) and "last_error" not in outcomes["flaky"],
+                  summary)
+            check("retries stop after max_attempts", summary["busy"] == (FAILED, 3), summary)
+            check("a permanent failure isn't retried",
+                  summary["unknown"] == (FAILED, 1) and "sent_at" not in outcomes["unknown"], summary)
+            check("each email is sent once", sorted(pool.smtp.sent) == ["flaky@example.com", "ok@example.com"],
+                  pool.smtp.sent)
+    except Exception as e:
+        print(f"Test FAILED: {e}")
+    finally:
+        outbox.close()
+    
+    real_pool = SMTPConnectionPool("localhost", 25)
+    smtp = ScriptedSMTP()
+    real_pool._checkout = lambda: smtp
+    try:
+        with real_pool.connection():
+            raise smtplib.SMTPNotSupportedError("SMTPUTF8 not supported")
+    except smtplib.SMTPNotSupportedError:
+        pass
+    check("a connection that raised is closed, not pooled", smtp.closed and real_pool._idle.empty())
+    
+    print("\n===== ALL EMAIL DELIVERY TESTS COMPLETED =====\n")
+
+def run_contacts_tests():
+    """Check exact, prefix and fuzzy contact lookups and how ambiguous names are reported."""
+    print("\n===== RUNNING CONTACTS TESTS =====\n")
+    
+    people = [
+        {"name": "John Smith", "email": "john.smith@example.com"},
+        {"name": "John Doe", "email": "jdoe@example.com"},
+        {"name": "José O'Neil", "email": "jose@example.com"},
+        {"name": "Sarah Connor", "email": "sarah@example.com"}
+    ]
+    directory = contacts.ContactDirectory(people)
+    expected_matches = {
+        "John Smith": ("exact", "john.smith@example.com"),
+        "smith": ("exact", "john.smith@example.com"),
+        "JDOE@example.com": ("exact", "jdoe@example.com"),
+        "jose oneil": ("exact", "jose@example.com"),
+        "john sm": ("prefix", "john.smith@example.com"),
+        "jonh smith": ("fuzzy", "john.smith@example.com"),
+        "Sarha": ("fuzzy", "sarah@example.com")
+    }
+    for name, (match, email) in expected_matches.items():
+        found = directory.find(name)
+        check(f"'{name}' is found ({match} match)", found[0] == match and [c["email"] for c in found[1]] == [email], found)
+    found = directory.find("Zebediah")
+    check("a name matching nobody finds nothing", found == (None, []), found)
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "contacts.csv")
+        with open(path, 'w') as f:
+            f.write("Name,Email\n" + "".join(f"{c['name']},{c['email']}\n" for c in people))
+        shared_file = contacts.CONTACTS_FILE
+        contacts.CONTACTS_FILE = path
+        try:
+            result = contacts.resolve_contact("John")
+            check("an ambiguous name lists the candidates",
+                  result.get("candidates") == ["John Smith <john.smith@example.com>", "John Doe <jdoe@example.com>"]
+                  and "matches several contacts" in result.get("error", ""), result)
+            result = contacts.resolve_contact("Zebediah")
+            check("an unknown name is an error", result == {"error": "No contact matches 'Zebediah'", "candidates": []},
+                  result)
+            result = contacts.resolve_contact("new.person@example.com")
+            check("an address outside the directory is used as is", result.get("match") == "address", result)
+            result = contacts.resolve_contact("Sarah")
+            check("a unique name resolves to its address", result.get("email") == "sarah@example.com", result)
+        except Exception as e:
+            print(f"Test FAILED: {e}")
+        finally:
+            contacts.CONTACTS_FILE = shared_file
+    
+    print("\n===== ALL CONTACTS TESTS COMPLETED =====\n")
+
 if __name__ == "__main__":
+    run_parser_tests()
+    run_calendar_cache_tests()
+    run_jsonl_tests()
+    run_sqlite_tests()
+    run_time_parser_tests()
+    run_llm_cache_tests()
+    run_registry_tests()
+    run_tenant_tests()
+    run_concurrent_write_tests()
+    run_email_delivery_tests()
+    run_contacts_tests()
     run_test_queries() 
\ No newline at end of file